@@ -0,0 +1,114 @@
+"""
+Throughput, latency and memory of the client against a local fake Shinobi
+
+    python -m benchmarks.bench_client [--requests N] [--concurrency N]
+        [--monitors N] [--videos N] [--latency SECONDS]
+"""
+
+import argparse
+import asyncio
+import tracemalloc
+from time import perf_counter
+from typing import Awaitable, Callable, List
+
+from pyshinobicctvapi import Client
+from pyshinobicctvapi.videos import async_all, async_iter
+from tests.fakeshinobi import FakeShinobi
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+async def run(
+    label: str, call: Callable[[], Awaitable], requests: int, concurrency: int
+):
+    """
+    Runs call requests times with at most concurrency in flight and prints the stats
+    """
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed():
+        async with semaphore:
+            started = perf_counter()
+            await call()
+            latencies.append(perf_counter() - started)
+
+    tracemalloc.start()
+    started = perf_counter()
+    await asyncio.gather(*(timed() for _ in range(requests)))
+    elapsed = perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"  {label:<32} {requests / elapsed:9.1f} req/s"
+        f"  p50 {percentile(latencies, 0.5) * 1000:8.2f} ms"
+        f"  p95 {percentile(latencies, 0.95) * 1000:8.2f} ms"
+        f"  p99 {percentile(latencies, 0.99) * 1000:8.2f} ms"
+        f"  peak {peak / 1048576:8.2f} MiB"
+    )
+
+
+async def main(args):
+    async with FakeShinobi(
+        monitors=args.monitors,
+        videos=args.videos,
+        latency=args.latency,
+        jitter=args.latency / 2,
+    ) as server:
+        print(
+            f"{args.monitors} monitors, {args.videos} videos, "
+            f"{args.latency * 1000:.0f} ms server latency"
+        )
+
+        for coalesce in (False, True):
+            async with server.connection(coalesce=coalesce) as connection:
+                url = connection.action_url("monitor")
+                await run(
+                    f"Connection.get coalesce={coalesce}",
+                    lambda: connection.get(url),
+                    args.requests,
+                    args.concurrency,
+                )
+
+        async with Client(server.connection()) as client:
+
+            async def monitors():
+                return list(await client.monitors.async_all())
+
+            await run(
+                "monitors.Manager.async_all", monitors, args.requests, args.concurrency
+            )
+            await run(
+                "api.Manager.all", client.api.all, args.requests, args.concurrency
+            )
+
+            listings = max(args.requests // 50, 1)
+            connection = client.connection
+            await run(
+                "videos.async_all",
+                lambda: async_all(connection),
+                listings,
+                1,
+            )
+
+            async def stream():
+                async for _ in async_iter(connection):
+                    pass
+
+            await run("videos.async_iter", stream, listings, 1)
+
+        print(f"  server handled {server.requests} requests")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--monitors", type=int, default=200)
+    parser.add_argument("--videos", type=int, default=20000)
+    parser.add_argument("--latency", type=float, default=0.005)
+    asyncio.run(main(parser.parse_args()))
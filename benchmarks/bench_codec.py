@@ -0,0 +1,40 @@
+"""
+Compares the installed JSON codecs on monitor and video payloads
+
+    python -m benchmarks.bench_codec [--monitors N] [--videos N]
+"""
+
+import argparse
+from timeit import Timer
+
+from pyshinobicctvapi.codec import available
+from tests.fakeshinobi import monitor, video
+
+
+def measure(label: str, func, number: int):
+    best = min(Timer(func).repeat(repeat=5, number=number)) / number
+    print(f"  {label:<28} {best * 1000:9.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--monitors", type=int, default=500)
+    parser.add_argument("--videos", type=int, default=20000)
+    args = parser.parse_args()
+
+    monitors = [monitor(i) for i in range(args.monitors)]
+    videos = {"total": args.videos, "videos": [video(i) for i in range(args.videos)]}
+    details = [m["details"] for m in monitors]
+
+    for name, codec in available().items():
+        monitor_body = codec.dumps(monitors)
+        video_body = codec.dumps(videos)
+        print(f"{name}:")
+        measure("decode monitor list", lambda: codec.loads(monitor_body), 10)
+        measure("decode monitor details", lambda: list(map(codec.loads, details)), 10)
+        measure("decode video listing", lambda: codec.loads(video_body), 3)
+        measure("encode video listing", lambda: codec.dumps(videos), 3)
+
+
+if __name__ == "__main__":
+    main()
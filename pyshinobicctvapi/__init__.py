@@ -1,6 +1,11 @@
+from typing import Iterable
+
 from .connection import Connection
 from .api import Manager as ApiManager
+from .events import EventSubscription
+from .logs import Manager as LogManager
 from .monitors import Manager as MonitorManager
+from .triggers import TriggerPipeline
 from .videos import Manager as VideoManager
 
 
@@ -13,6 +18,7 @@ class Client:
     def __init__(self, connection: Connection):
         self._connection = connection
         self._api: ApiManager = None
+        self._logs: LogManager = None
         self._monitors: MonitorManager = None
         self._videos: VideoManager = None
 
@@ -22,6 +28,12 @@ class Client:
             self._api = ApiManager(self._connection)
         return self._api
 
+    @property
+    def logs(self):
+        if self._logs is None:
+            self._logs = LogManager(self._connection)
+        return self._logs
+
     @property
     def monitors(self):
         if self._monitors is None:
@@ -38,5 +50,37 @@ class Client:
     def connection(self):
         return self._connection
 
+    def subscribe(
+        self, monitors: Iterable[str] = None, uid: str = None, **kwargs
+    ) -> EventSubscription:
+        """
+        Subscribes to pushed monitor status, detection and recording events
+
+        Parameters
+        ----------
+        monitors : iterable (optional)
+            Monitor ids to watch
+        uid : str (optional)
+            User id sent with the authentication
+        """
+        return EventSubscription(self._connection, monitors, uid, **kwargs)
+
+    def triggers(self, **kwargs) -> TriggerPipeline:
+        """
+        Creates a pipeline injecting motion triggers, see TriggerPipeline
+
+        e.g. ``async with client.triggers(window=2) as triggers: triggers.put(mid)``
+        """
+        return TriggerPipeline(self._connection, **kwargs)
+
     def close(self):
         self._connection.close()
+
+    async def async_close(self):
+        await self._connection.async_close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.async_close()
@@ -2,8 +2,12 @@
 Shinobi API key management
 """
 
-from typing import Optional, List, Union
+import asyncio
+from enum import IntFlag
+from typing import Iterable, Optional, List, Union
 
+from . import errors
+from .bulk import BulkResult, RateLimiter, async_bulk
 from .connection import Connection
 
 ACTION = "api"
@@ -23,120 +27,101 @@ DEFAULT = {
 }
 
 
-class Details:
-    def __init__(self, details: dict = None):
-        if details is None:
-            details = DEFAULT["details"].copy()
-        self._details = details
+class Permission(IntFlag):
+    """
+    Compact form of the key details, one bit per permission
+    """
 
-    @property
-    def auth_socket(self) -> bool:
-        return (
-            self._details.setdefault(
-                "auth_socket", DEFAULT["details"].get("auth_socket")
-            )
-            == "1"
-        )
+    NONE = 0
+    AUTH_SOCKET = 1
+    GET_MONITORS = 2
+    CONTROL_MONITORS = 4
+    GET_LOGS = 8
+    WATCH_STREAM = 16
+    WATCH_SNAPSHOT = 32
+    WATCH_VIDEOS = 64
+    DELETE_VIDEOS = 128
 
-    @auth_socket.setter
-    def auth_socket(self, value: bool):
-        self._details["auth_socket"] = "1" if value else "0"
+    @classmethod
+    def from_details(cls, details: dict = None) -> "Permission":
+        """
+        Converts the details wire format, missing permissions use DEFAULT
+        """
+        if not details:
+            return DEFAULT_PERMISSIONS
+        value = 0
+        for name, flag, default in _FIELDS:
+            if details.get(name, default) == "1":
+                value |= flag
+        return cls(value)
+
+    def to_details(self) -> dict:
+        """
+        Converts to the details wire format
+        """
+        return {name: "1" if self & flag else "0" for name, flag, _ in _FIELDS}
 
-    @property
-    def get_monitors(self) -> bool:
-        return (
-            self._details.setdefault(
-                "get_monitors", DEFAULT["details"].get("get_monitors")
-            )
-            == "1"
-        )
 
-    @get_monitors.setter
-    def get_monitors(self, value: bool):
-        self._details["get_monitors"] = "1" if value else "0"
+# (wire name, flag, default wire value)
+_FIELDS = tuple(
+    (name, Permission[name.upper()], value)
+    for name, value in DEFAULT["details"].items()
+)
 
-    @property
-    def control_monitors(self) -> bool:
-        return (
-            self._details.setdefault(
-                "control_monitors", DEFAULT["details"].get("control_monitors")
-            )
-            == "1"
-        )
+DEFAULT_PERMISSIONS = Permission(
+    sum(flag for _, flag, default in _FIELDS if default == "1")
+)
 
-    @control_monitors.setter
-    def control_monitors(self, value: bool):
-        self._details["control_monitors"] = "1" if value else "0"
 
-    @property
-    def get_logs(self) -> bool:
-        return (
-            self._details.setdefault("get_logs", DEFAULT["details"].get("get_logs"))
-            == "1"
-        )
+def _permission(name: str) -> property:
+    default = DEFAULT["details"][name]
 
-    @get_logs.setter
-    def get_logs(self, value: bool):
-        self._details["get_logs"] = "1" if value else "0"
+    def get(self) -> bool:
+        return self._details.get(name, default) == "1"
 
-    @property
-    def watch_stream(self) -> bool:
-        return (
-            self._details.setdefault(
-                "watch_stream", DEFAULT["details"].get("watch_stream")
-            )
-            == "1"
-        )
+    def set(self, value: bool):
+        self._details[name] = "1" if value else "0"
 
-    @watch_stream.setter
-    def watch_stream(self, value: bool):
-        self._details["watch_stream"] = "1" if value else "0"
+    return property(get, set)
 
-    @property
-    def watch_snapshot(self) -> bool:
-        return (
-            self._details.setdefault(
-                "watch_snapshot", DEFAULT["details"].get("watch_snapshot")
-            )
-            == "1"
-        )
 
-    @watch_snapshot.setter
-    def watch_snapshot(self, value: bool):
-        self._details["watch_snapshot"] = "1" if value else "0"
-
-    @property
-    def watch_videos(self) -> bool:
-        return (
-            self._details.setdefault(
-                "watch_videos", DEFAULT["details"].get("watch_videos")
-            )
-            == "1"
-        )
+class Details:
+    def __init__(self, details: dict = None):
+        if details is None:
+            details = DEFAULT["details"].copy()
+        self._details = details
 
-    @watch_videos.setter
-    def watch_videos(self, value: bool):
-        self._details["watch_videos"] = "1" if value else "0"
+    auth_socket = _permission("auth_socket")
+    get_monitors = _permission("get_monitors")
+    control_monitors = _permission("control_monitors")
+    get_logs = _permission("get_logs")
+    watch_stream = _permission("watch_stream")
+    watch_snapshot = _permission("watch_snapshot")
+    watch_videos = _permission("watch_videos")
+    delete_videos = _permission("delete_videos")
 
     @property
-    def delete_videos(self) -> bool:
-        return (
-            self._details.setdefault(
-                "delete_videos", DEFAULT["details"].get("delete_videos")
-            )
-            == "1"
-        )
+    def permissions(self) -> Permission:
+        return Permission.from_details(self._details)
 
-    @delete_videos.setter
-    def delete_videos(self, value: bool):
-        self._details["delete_videos"] = "1" if value else "0"
+    @permissions.setter
+    def permissions(self, value: Permission):
+        self._details.update(Permission(value).to_details())
 
 
 class Key:
+    """
+    Shinobi API key
+
+    The key dict may be shared with other callers of a cached or coalesced
+    request, it is copied before the first change.
+    """
+
     def __init__(self, key: dict = None):
         if key is None:
             key = {}
         self._dict = key
+        self._details: Optional[Details] = None
 
     @property
     def code(self) -> Optional[str]:
@@ -144,31 +129,50 @@ class Key:
 
     @property
     def ip(self) -> str:
-        return self._dict.setdefault("ip", "0.0.0.0")
+        return self._dict.get("ip", "0.0.0.0")
 
     @ip.setter
     def ip(self, value: str):
-        self._dict["ip"] = "0.0.0.0" if value is None else value
+        self._dict = {**self._dict, "ip": "0.0.0.0" if value is None else value}
 
     @property
     def details(self):
-        return Details(self._dict.setdefault("details", {}))
+        if self._details is None:
+            details = dict(self._dict.get("details") or {})
+            self._dict = {**self._dict, "details": details}
+            self._details = Details(details)
+        return self._details
+
+    @property
+    def permissions(self) -> Permission:
+        return Permission.from_details(self._dict.get("details"))
+
+
+def _key_dict(key: Union[Key, dict]) -> dict:
+    return key._dict if isinstance(key, Key) else key
 
 
 async def async_add(connection: Connection, key: dict) -> Key:
+    """
+    Adds a key, its details may be given as a Permission
+    """
+    details = key.get("details")
+    if not isinstance(details, Permission):
+        details = Permission.from_details(details)
     body = {
-        "data": {
-            "ip": key.get("ip", DEFAULT["ip"]),
-            "details": {
-                wk: key.get("details", {}).get(wk, DEFAULT["details"][wk])
-                for wk in DEFAULT["details"].keys()
-            },
-        }
+        "data": {"ip": key.get("ip", DEFAULT["ip"]), "details": details.to_details()}
     }
 
     return Key(await connection.post(connection.action_url(ACTION, "add"), body, "api"))
 
 
+async def async_delete(connection: Connection, key: dict):
+    await connection.post(
+        connection.action_url(ACTION, "delete"),
+        body={"data": {"code": key.get("code")}},
+    )
+
+
 class Manager:
     def __init__(self, connection: Connection):
         self._connection = connection
@@ -182,16 +186,87 @@ class Manager:
         return list(map(Key, json["list"]))
 
     async def add(self, key: Union[Key, dict]):
-        if isinstance(key, Key):
-            key = key._dict
-
-        return await async_add(self._connection, key)
+        return await async_add(self._connection, _key_dict(key))
 
     async def delete(self, key: Union[Key, dict]):
-        if isinstance(key, Key):
-            key = key._dict
+        await async_delete(self._connection, _key_dict(key))
+
+    async def rotate(self, key: Union[Key, dict]) -> Key:
+        """
+        Replaces a key by a new one with the same ip and permissions
 
-        await self._connection.post(
-            self._connection.action_url(ACTION, "delete"),
-            body={"data": {"code": key.get("code")}},
+        The new key is added before the old one is deleted so integrations
+        are never left without a valid key. When the old key cannot be
+        deleted errors.RotateFailed is raised, its new attribute holding
+        the added key.
+        """
+        key = _key_dict(key)
+        new = await async_add(self._connection, key)
+        try:
+            await async_delete(self._connection, key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            raise errors.RotateFailed(
+                f"Added {new.code} but could not delete {key.get('code')}: {err}",
+                new,
+            ) from err
+        return new
+
+    async def add_many(
+        self,
+        keys: Iterable[Union[Key, dict]],
+        concurrency: int = 8,
+        rate: float = None,
+        limiter: RateLimiter = None,
+    ) -> List[BulkResult]:
+        """
+        Adds several keys concurrently
+
+        Parameters
+        ----------
+        keys : iterable
+            Keys to add
+        concurrency : int
+            Maximum number of requests in flight
+        rate : float (optional)
+            Maximum requests started per second
+        limiter : RateLimiter (optional)
+            Limiter shared with other bulk operations
+
+        Returns a result per key, in order, holding the added Key or the error
+        """
+        return await async_bulk(
+            keys, self.add, concurrency=concurrency, rate=rate, limiter=limiter
+        )
+
+    async def delete_many(
+        self,
+        keys: Iterable[Union[Key, dict]],
+        concurrency: int = 8,
+        rate: float = None,
+        limiter: RateLimiter = None,
+    ) -> List[BulkResult]:
+        """
+        Deletes several keys concurrently, see add_many
+        """
+        return await async_bulk(
+            keys, self.delete, concurrency=concurrency, rate=rate, limiter=limiter
+        )
+
+    async def rotate_many(
+        self,
+        keys: Iterable[Union[Key, dict]],
+        concurrency: int = 8,
+        rate: float = None,
+        limiter: RateLimiter = None,
+    ) -> List[BulkResult]:
+        """
+        Rotates several keys concurrently, see add_many and rotate
+
+        The rate applies to rotations, each of which makes two requests.
+        Failed deletes leave an errors.RotateFailed holding the new key.
+        """
+        return await async_bulk(
+            keys, self.rotate, concurrency=concurrency, rate=rate, limiter=limiter
         )
@@ -0,0 +1,232 @@
+"""
+Fan out of one upstream MJPEG stream to many local consumers
+"""
+
+import asyncio
+import random
+from typing import Dict, Optional, Set, Union
+
+import aiohttp
+
+from . import errors
+from .connection import Connection
+from .const import STREAM_MJPEG
+from .mjpeg import DEFAULT_MAX_FRAME_SIZE
+from .monitors import Stream
+
+_END = object()
+
+
+class Subscription:
+    """
+    A consumer of a broadcast stream, iterate it to receive frames
+
+    Frames are kept in a bounded queue, when the consumer falls behind the
+    oldest queued frame is dropped so it always sees the most recent ones.
+    """
+
+    def __init__(self, broadcaster: "MjpegBroadcaster", url: str, queue_size: int):
+        self._broadcaster = broadcaster
+        self._url = url
+        self._queue: asyncio.Queue = asyncio.Queue(max(queue_size, 1))
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self.dropped = 0
+
+    @property
+    def url(self) -> str:
+        return self._url
+
+    def _offer(self, frame):
+        if self._queue.full():
+            self._queue.get_nowait()
+            if frame is not _END:
+                self.dropped += 1
+        self._queue.put_nowait(frame)
+
+    def _finish(self, error: BaseException = None):
+        self._error = error
+        self._offer(_END)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        if self._closed:
+            raise StopAsyncIteration
+        frame = await self._queue.get()
+        if frame is _END:
+            self._closed = True
+            if self._error is not None:
+                raise self._error
+            raise StopAsyncIteration
+        return frame
+
+    def close(self):
+        """
+        Stops receiving frames, the upstream is closed with the last subscriber
+        """
+        if not self._closed:
+            self._closed = True
+            self._broadcaster._unsubscribe(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class _Upstream:
+    __slots__ = ("stream", "task", "subscribers")
+
+    def __init__(self, stream: Stream):
+        self.stream = stream
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers: Set[Subscription] = set()
+
+
+class MjpegBroadcaster:
+    """
+    Shares one upstream connection per MJPEG stream between subscribers
+
+    An upstream that ends or fails (including after read_timeout seconds
+    without data) is reopened with jittered exponential backoff for as long
+    as it has subscribers; while a circuit breaker is open the upstream
+    waits until it lets a probe through. Subscriptions only end with an
+    error when the server refuses the stream (a 4xx answer).
+
+    Parameters
+    ----------
+    connection : Connection (optional)
+        Connection used for streams given as urls
+    max_fps : float (optional)
+        Upstream frames arriving faster than this rate are not forwarded
+    max_frame_size : int
+        Frames larger than this many bytes are dropped
+    read_timeout : float
+        Seconds without upstream data before it is reopened
+    reconnect_delay : float
+        First delay before reopening an upstream, doubled (with jitter) per failure
+    max_reconnect_delay : float
+        Largest delay between reopen attempts
+    """
+
+    def __init__(
+        self,
+        connection: Connection = None,
+        max_fps: float = None,
+        max_frame_size: int = DEFAULT_MAX_FRAME_SIZE,
+        read_timeout: float = 30.0,
+        reconnect_delay: float = 0.5,
+        max_reconnect_delay: float = 30.0,
+    ):
+        self._connection = connection
+        self._max_fps = max_fps
+        self._max_frame_size = max_frame_size
+        self._read_timeout = read_timeout
+        self._reconnect_delay = reconnect_delay
+        self._max_reconnect_delay = max_reconnect_delay
+        self.reconnects = 0
+        self._upstreams: Dict[str, _Upstream] = {}
+
+    @property
+    def active(self) -> int:
+        """
+        Number of open upstream connections
+        """
+        return len(self._upstreams)
+
+    def subscribe(
+        self, stream: Union[Stream, str], queue_size: int = 2
+    ) -> Subscription:
+        """
+        Subscribes to a stream, opening the upstream if this is the first subscriber
+
+        Parameters
+        ----------
+        stream : Stream or str
+            Stream (or stream url) to receive frames from
+        queue_size : int
+            Frames buffered for this subscriber before old ones are dropped
+        """
+        if isinstance(stream, str):
+            if self._connection is None:
+                raise RuntimeError("A connection is required to subscribe to urls")
+            stream = Stream("", stream, STREAM_MJPEG, self._connection)
+
+        upstream = self._upstreams.get(stream.url)
+        if upstream is None:
+            upstream = self._upstreams[stream.url] = _Upstream(stream)
+        subscription = Subscription(self, stream.url, queue_size)
+        upstream.subscribers.add(subscription)
+        if upstream.task is None:
+            upstream.task = asyncio.ensure_future(self._pump(upstream))
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription):
+        upstream = self._upstreams.get(subscription.url)
+        if upstream is None:
+            return
+        upstream.subscribers.discard(subscription)
+        if not upstream.subscribers:
+            del self._upstreams[subscription.url]
+            upstream.task.cancel()
+
+    async def _pump(self, upstream: _Upstream):
+        error = None
+        failures = 0
+        while upstream.subscribers:
+            try:
+                async for frame in upstream.stream.frames(
+                    self._max_fps,
+                    max_frame_size=self._max_frame_size,
+                    read_timeout=self._read_timeout,
+                ):
+                    failures = 0
+                    for subscription in upstream.subscribers:
+                        subscription._offer(frame)
+            except asyncio.CancelledError:
+                raise
+            except aiohttp.ClientResponseError as err:
+                if err.status < 500:
+                    error = err
+                    break
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            except errors.CircuitOpen as err:
+                # not attempted, wait for the breaker to let a probe through
+                self.reconnects += 1
+                await asyncio.sleep(
+                    max(err.retry_after or 0, self._reconnect_delay)
+                    * random.uniform(1.0, 1.5)
+                )
+                continue
+            except Exception as err:
+                error = err
+                break
+            failures += 1
+            self.reconnects += 1
+            delay = min(
+                self._reconnect_delay * 2 ** (failures - 1),
+                self._max_reconnect_delay,
+            )
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+        if self._upstreams.get(upstream.stream.url) is upstream:
+            del self._upstreams[upstream.stream.url]
+        for subscription in upstream.subscribers:
+            subscription._finish(error)
+        upstream.subscribers.clear()
+
+    async def async_close(self):
+        """
+        Closes every upstream and ends all subscriptions
+        """
+        upstreams = list(self._upstreams.values())
+        self._upstreams.clear()
+        for upstream in upstreams:
+            upstream.task.cancel()
+            for subscription in upstream.subscribers:
+                subscription._finish()
+        await asyncio.gather(*(u.task for u in upstreams), return_exceptions=True)
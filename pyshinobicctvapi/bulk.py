@@ -0,0 +1,122 @@
+"""
+Helpers for running many API calls concurrently under rate limits
+"""
+
+import asyncio
+from time import perf_counter
+from typing import Awaitable, Callable, Generic, Iterable, List, Optional, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class RateLimiter:
+    """
+    Token bucket allowing rate calls per second with bursts of up to burst calls
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Waits until a call is allowed
+        """
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            if self._updated is not None:
+                elapsed = now - self._updated
+                self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._updated = loop.time()
+                self._tokens = 1.0
+            self._tokens -= 1
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+
+class BulkResult(Generic[T, R]):
+    """
+    Outcome of one item of a bulk operation
+    """
+
+    __slots__ = ("item", "value", "error", "elapsed")
+
+    def __init__(
+        self,
+        item: T,
+        value: R = None,
+        error: BaseException = None,
+        elapsed: float = 0.0,
+    ):
+        self.item = item
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        state = "ok" if self.ok else f"error={self.error!r}"
+        return f"<BulkResult {self.item!r} {state} {self.elapsed * 1000:.1f}ms>"
+
+
+async def async_bulk(
+    items: Iterable[T],
+    call: Callable[[T], Awaitable[R]],
+    concurrency: int = 8,
+    rate: float = None,
+    limiter: RateLimiter = None,
+) -> List[BulkResult[T, R]]:
+    """
+    Runs call for every item concurrently, one failure does not stop the others
+
+    Parameters
+    ----------
+    items : iterable
+        Items to process
+    call : async def call(item) -> value
+        Operation run for every item
+    concurrency : int
+        Maximum number of calls in flight
+    rate : float (optional)
+        Maximum calls started per second
+    limiter : RateLimiter (optional)
+        Shared limiter to use instead of rate
+
+    Returns the results in the order of items
+    """
+    if limiter is None and rate is not None:
+        limiter = RateLimiter(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(item: T) -> BulkResult[T, R]:
+        async with semaphore:
+            if limiter is not None:
+                await limiter.acquire()
+            started = perf_counter()
+            try:
+                value = await call(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                return BulkResult(item, error=err, elapsed=perf_counter() - started)
+            return BulkResult(item, value, elapsed=perf_counter() - started)
+
+    return await asyncio.gather(*map(run, items))
@@ -0,0 +1,151 @@
+"""
+Response caching for Connection GET requests
+"""
+
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Callable, Dict, Optional
+
+
+class Entry:
+    """
+    Cached response body and its validators
+    """
+
+    __slots__ = ("value", "etag", "last_modified", "expires")
+
+    def __init__(
+        self,
+        value: Any,
+        etag: str = None,
+        last_modified: str = None,
+        expires: float = 0.0,
+    ):
+        self.value = value
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        """
+        Conditional request headers that revalidate this entry
+        """
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def _under(url: str, prefix: str) -> bool:
+    if not url.startswith(prefix):
+        return False
+    return len(url) == len(prefix) or prefix[-1] == "/" or url[len(prefix)] in "/?"
+
+
+class ResponseCache:
+    """
+    Size bounded LRU cache of parsed responses keyed by url
+
+    Values are returned as stored, shared by every caller, the entity
+    classes copy them before changing anything.
+
+    Parameters
+    ----------
+    ttl : float
+        Seconds an entry is served without contacting the server
+    max_entries : int
+        Maximum number of entries kept, least recently used are evicted first
+    clock : callable (optional)
+        Monotonic time source, mostly useful for tests
+    """
+
+    def __init__(
+        self,
+        ttl: float = 5.0,
+        max_entries: int = 256,
+        clock: Callable[[], float] = None,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock or monotonic
+        self._entries: "OrderedDict[str, Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, url: str):
+        return url in self._entries
+
+    def lookup(self, url: str) -> Optional[Entry]:
+        """
+        Returns the entry for url (fresh or stale) and records a hit when fresh
+        """
+        entry = self._entries.get(url)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(url)
+        if self._clock() < entry.expires:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return entry
+
+    def is_fresh(self, entry: Entry) -> bool:
+        return self._clock() < entry.expires
+
+    def store(
+        self, url: str, value: Any, etag: str = None, last_modified: str = None
+    ) -> Entry:
+        entry = Entry(value, etag, last_modified, self._clock() + self.ttl)
+        self._entries[url] = entry
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def revalidated(self, url: str, entry: Entry) -> Any:
+        """
+        Marks an entry as confirmed by the server (304) and returns its value
+        """
+        self.revalidations += 1
+        entry.expires = self._clock() + self.ttl
+        if url in self._entries:
+            self._entries.move_to_end(url)
+        return entry.value
+
+    def invalidate(self, prefix: str = None) -> int:
+        """
+        Removes the entry of prefix and the urls below it, or all entries
+
+        prefix matches whole path segments, /t/monitor/g does not match
+        /t/monitor/g2. Returns the number of removed entries
+        """
+        if prefix is None:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+
+        stale = [url for url in self._entries if _under(url, prefix)]
+        for url in stale:
+            del self._entries[url]
+        return len(stale)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "evictions": self.evictions,
+        }
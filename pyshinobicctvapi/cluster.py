@@ -0,0 +1,191 @@
+"""
+Fan-out client over many Shinobi servers/groups
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Generic, List, TypeVar
+
+from . import Client
+from .api import Key
+from .connection import Connection
+from .monitors import Monitor
+from .videos import Video, async_all as async_all_videos
+
+T = TypeVar("T")
+
+
+class ServerResult(Generic[T]):
+    """
+    Outcome of a call against a single server
+    """
+
+    __slots__ = ("server", "value", "error", "elapsed")
+
+    def __init__(
+        self,
+        server: str,
+        value: T = None,
+        error: BaseException = None,
+        elapsed: float = 0.0,
+    ):
+        self.server = server
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class ClusterResult(Generic[T]):
+    """
+    Per server results of a fan-out call, failures do not hide other servers results
+    """
+
+    def __init__(self, results: List[ServerResult[T]]):
+        self._results = {result.server: result for result in results}
+
+    def __iter__(self):
+        return iter(self._results.values())
+
+    def __getitem__(self, server: str) -> ServerResult[T]:
+        return self._results[server]
+
+    def __len__(self):
+        return len(self._results)
+
+    @property
+    def values(self) -> Dict[str, T]:
+        return {r.server: r.value for r in self._results.values() if r.ok}
+
+    @property
+    def errors(self) -> Dict[str, BaseException]:
+        return {r.server: r.error for r in self._results.values() if not r.ok}
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+class ClusterClient:
+    """
+    Shinobi API Client for many servers
+
+    Parameters
+    ----------
+    connections : dict
+        Connections keyed by a name used to tag results
+    concurrency : int
+        Maximum number of servers called at once
+    timeout : float (optional)
+        Seconds allowed per server call
+    """
+
+    def __init__(
+        self,
+        connections: Dict[str, Connection],
+        concurrency: int = 10,
+        timeout: float = None,
+    ):
+        self._clients = {name: Client(conn) for name, conn in connections.items()}
+        self._concurrency = concurrency
+        self.timeout = timeout
+
+    @property
+    def servers(self) -> List[str]:
+        return list(self._clients)
+
+    def __getitem__(self, server: str) -> Client:
+        return self._clients[server]
+
+    async def async_fan_out(
+        self,
+        call: Callable[[Client], Awaitable[T]],
+        servers: List[str] = None,
+        timeout: float = None,
+    ) -> ClusterResult[T]:
+        """
+        Runs call against every (or the given) server concurrently
+
+        Parameters
+        ----------
+        call : async def call(client) -> value
+            Coroutine function run once per server
+        servers : list (optional)
+            Names of the servers to call, defaults to all
+        timeout : float (optional)
+            Seconds allowed per server, defaults to the client timeout
+        """
+        if timeout is None:
+            timeout = self.timeout
+        semaphore = asyncio.Semaphore(self._concurrency)
+        loop = asyncio.get_running_loop()
+
+        async def run(server: str) -> ServerResult[T]:
+            async with semaphore:
+                started = loop.time()
+                try:
+                    value = await asyncio.wait_for(call(self._clients[server]), timeout)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as err:
+                    return ServerResult(
+                        server, error=err, elapsed=loop.time() - started
+                    )
+                return ServerResult(server, value, elapsed=loop.time() - started)
+
+        names = self.servers if servers is None else servers
+        return ClusterResult(await asyncio.gather(*map(run, names)))
+
+    async def async_monitors(self, **kwargs) -> ClusterResult[List[Monitor]]:
+        """
+        Get the monitors of every server
+        """
+
+        async def call(client: Client):
+            return list(await client.monitors.async_all())
+
+        return await self.async_fan_out(call, **kwargs)
+
+    async def async_started_monitors(self, **kwargs) -> ClusterResult[List[Monitor]]:
+        """
+        Get the started monitors of every server
+        """
+
+        async def call(client: Client):
+            return list(await client.monitors.async_started())
+
+        return await self.async_fan_out(call, **kwargs)
+
+    async def async_videos(
+        self, start: datetime = None, end: datetime = None, **kwargs
+    ) -> ClusterResult[List[Video]]:
+        """
+        Get the videos of every server
+        """
+
+        async def call(client: Client):
+            return await async_all_videos(client.connection, start, end)
+
+        return await self.async_fan_out(call, **kwargs)
+
+    async def async_api_keys(self, **kwargs) -> ClusterResult[List[Key]]:
+        """
+        Get the API keys of every server
+        """
+
+        async def call(client: Client):
+            return await client.api.all()
+
+        return await self.async_fan_out(call, **kwargs)
+
+    async def async_close(self):
+        await asyncio.gather(*(c.async_close() for c in self._clients.values()))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.async_close()
@@ -0,0 +1,113 @@
+"""
+Pluggable JSON encoding/decoding
+"""
+
+import json
+from importlib import import_module
+from typing import Any, Callable, Dict, Union
+
+
+class Codec:
+    """
+    JSON codec used for response bodies, request bodies and monitor details
+
+    Parameters
+    ----------
+    name : str
+        Name of the backend
+    loads : callable
+        Decodes bytes or str into python objects
+    dumps : callable
+        Encodes python objects into bytes
+    """
+
+    def __init__(
+        self,
+        name: str,
+        loads: Callable[[Union[bytes, str]], Any],
+        dumps: Callable[[Any], bytes],
+    ):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+    def __repr__(self):
+        return f"<Codec {self.name}>"
+
+
+def _stdlib() -> Codec:
+    return Codec(
+        "json",
+        json.loads,
+        lambda obj: json.dumps(obj, separators=(",", ":")).encode("utf-8"),
+    )
+
+
+def _orjson() -> Codec:
+    orjson = import_module("orjson")
+    return Codec("orjson", orjson.loads, orjson.dumps)
+
+
+def _ujson() -> Codec:
+    ujson = import_module("ujson")
+    return Codec("ujson", ujson.loads, lambda obj: ujson.dumps(obj).encode("utf-8"))
+
+
+def _simplejson() -> Codec:
+    simplejson = import_module("simplejson")
+    return Codec(
+        "simplejson",
+        simplejson.loads,
+        lambda obj: simplejson.dumps(obj, separators=(",", ":")).encode("utf-8"),
+    )
+
+
+_FACTORIES: Dict[str, Callable[[], Codec]] = {
+    "json": _stdlib,
+    "orjson": _orjson,
+    "ujson": _ujson,
+    "simplejson": _simplejson,
+}
+
+# fastest first
+_PREFERENCE = ("orjson", "ujson", "simplejson", "json")
+
+STDLIB = _stdlib()
+
+
+def get_codec(codec: Union[Codec, str, None] = None) -> Codec:
+    """
+    Resolves a codec by name, None gives the standard library codec
+
+    Raises ImportError when the backend is not installed
+    """
+    if codec is None:
+        return STDLIB
+    if isinstance(codec, Codec):
+        return codec
+    if codec == "fastest":
+        return fastest()
+    factory = _FACTORIES.get(codec)
+    if factory is None:
+        raise ValueError(f"Unknown codec {codec!r}")
+    return factory()
+
+
+def available() -> Dict[str, Codec]:
+    """
+    Codecs whose backend is installed, keyed by name
+    """
+    codecs = {}
+    for name in _PREFERENCE:
+        try:
+            codecs[name] = _FACTORIES[name]()
+        except ImportError:
+            pass
+    return codecs
+
+
+def fastest() -> Codec:
+    """
+    The fastest installed codec
+    """
+    return next(iter(available().values()))
@@ -1,9 +1,27 @@
 import aiohttp
-from typing import Callable, Optional
+import asyncio
+import codecs
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Optional,
+    Set,
+    Union,
+)
 from uuid import uuid1
 from yarl import URL
 
 from . import errors
+from .cache import Entry, ResponseCache
+from .codec import Codec, get_codec
+from .jsonstream import ArrayParser
+from .metrics import BODY, DECODE, TOTAL, Metrics, action_of
+from .retry import NO_RETRY, CircuitBreaker, RetryPolicy
+from .store import FileSessionStore
+from .transport import Pool, TransportConfig
 
 
 def base_url(info: dict) -> str:
@@ -38,6 +56,22 @@ def action_url(info: dict, action: str, command: str = None) -> str:
     return url
 
 
+# text kept from a streamed response before its first item, to recognise error objects
+_HEAD_SIZE = 1 << 16
+
+
+def _token_of(url: str) -> Optional[str]:
+    # action urls are /{token}/{action}/{group}/...
+    parts = URL(url).path.split("/")
+    return parts[1] if len(parts) > 2 and parts[1] else None
+
+
+def _select(json, property: str = None):
+    if property is not None:
+        return json.get(property)
+    return json
+
+
 class Info:
     """
     Connection Information
@@ -58,6 +92,10 @@ class Info:
     def group(self) -> Optional[str]:
         return self._info.get("group")
 
+    @property
+    def token(self) -> Optional[str]:
+        return self._info.get("token")
+
     @property
     def base_url(self) -> str:
         """
@@ -84,6 +122,15 @@ class Connection:
         apiKey: str = None,
         group: str = None,
         session: aiohttp.ClientSession = None,
+        cache: ResponseCache = None,
+        coalesce: bool = True,
+        transport: TransportConfig = None,
+        pool: Pool = None,
+        codec: Union[Codec, str] = None,
+        retry: RetryPolicy = None,
+        breaker: CircuitBreaker = None,
+        store: FileSessionStore = None,
+        metrics: Metrics = None,
     ):
         if host[:7].upper() == "HTTP://":
             host = host[7:]
@@ -100,6 +147,29 @@ class Connection:
             self._info["group"] = group
         self._ownsSession = False
         self._session = session
+        self._pool = pool
+        if transport is None:
+            transport = pool.config if pool is not None else TransportConfig()
+        self._transport = transport
+        self._cache = cache
+        self._coalesce = coalesce
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._codec = get_codec(codec)
+        self._retry = retry or RetryPolicy()
+        self._breaker = breaker
+        self._store = store
+        self._restored = None
+        self._relogin_task: Optional[asyncio.Future] = None
+        self._replaced: Set[str] = set()
+        self._metrics = metrics
+        if metrics is not None:
+            if session is not None:
+                if metrics.trace_config() not in session.trace_configs:
+                    raise ValueError(
+                        "Create the session with metrics.trace_config() to use metrics"
+                    )
+            elif pool is not None:
+                pool.add_trace_config(metrics.trace_config())
 
     @property
     def info(self):
@@ -125,6 +195,41 @@ class Connection:
 
         return url
 
+    @property
+    def cache(self) -> Optional[ResponseCache]:
+        return self._cache
+
+    def invalidate(self, action: str = None):
+        """
+        Drops cached responses for an action, or all cached responses
+
+        Parameters
+        ----------
+        action : str (optional)
+            Action (monitor, videos, api...) whose responses should be dropped
+        """
+        if self._cache is None:
+            return
+
+        if action is None:
+            self._cache.invalidate()
+            return
+
+        url = action_url(self._info, action)
+        if url:
+            self._cache.invalidate(self.base_url + url)
+
+    def _invalidate_url(self, url: str):
+        if self._cache is None:
+            return
+
+        # action urls are /{token}/{action}/{group}/..., drop everything cached for that action
+        parts = URL(url).path.split("/")
+        if len(parts) >= 4:
+            self._cache.invalidate(self.base_url + "/".join(parts[:4]))
+        else:
+            self._cache.invalidate()
+
     async def login(self, email: str, password: str, authKey: Callable[[], str] = None):
         """
         Load user information via login
@@ -143,6 +248,19 @@ class Connection:
         if "token" in self._info and "group" in self._info:
             return self
 
+        if self._store is not None:
+            session = self._store.load(self._info["host"], email)
+            if session is not None:
+                self._info.setdefault("port", session["port"])
+                self._info["token"] = session["token"]
+                self._info["group"] = session["group"]
+                # kept to log in again if the server rejects the saved token
+                self._restored = (email, password, authKey)
+                return self
+
+        return await self._login(email, password, authKey)
+
+    async def _login(self, email: str, password: str, authKey: Callable[[], str]):
         await self._ssl_check()
 
         body = {"mail": email, "pass": password}
@@ -157,8 +275,64 @@ class Connection:
 
         self._info["token"] = user["auth_token"]
         self._info["group"] = user["ke"]
+        if self._store is not None:
+            self._store.save(
+                self._info["host"],
+                email,
+                self._info.get("port"),
+                self._info["token"],
+                self._info["group"],
+            )
         return self
 
+    def _rejected(
+        self, json: Any = None, error: BaseException = None, url: str = None
+    ) -> bool:
+        """
+        Whether the server refused a restored, or since replaced, session token
+        """
+        token = _token_of(url) if url is not None else None
+        if token is None:
+            return False
+        if token not in self._replaced and not (
+            self._restored is not None and token == self._info.get("token")
+        ):
+            return False
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in (401, 403)
+        if isinstance(error, errors.NotOk):
+            message = error.message
+        elif isinstance(json, dict) and json.get("ok") is False:
+            message = json.get("msg")
+        else:
+            return False
+        return "authorized" in str(message).lower()
+
+    async def _relogin(self, url: str) -> str:
+        """
+        Replaces a rejected restored session with a fresh login, returns url using the new token
+
+        Concurrent rejected requests share one login.
+        """
+        token = _token_of(url)
+        task = self._relogin_task
+        if task is None and token == self._info.get("token"):
+            task = self._relogin_task = asyncio.ensure_future(self._login_again(token))
+        if task is not None:
+            await asyncio.shield(task)
+        return url.replace(f"/{token}/", f"/{self._info['token']}/", 1)
+
+    async def _login_again(self, token: str):
+        email, password, authKey = self._restored
+        try:
+            self._store.discard(self._info["host"], email)
+            self.invalidate()
+            await self._login(email, password, authKey)
+            self._replaced.add(token)
+        finally:
+            self._restored = None
+            self._relogin_task = None
+
     def _ensure_url(self, url: str) -> str:
         if url is None:
             return self.base_url
@@ -168,10 +342,27 @@ class Connection:
             return f"{self.base_url}/{url}"
         return url
 
+    @property
+    def metrics(self) -> Optional[Metrics]:
+        return self._metrics
+
+    @property
+    def codec(self) -> Codec:
+        return self._codec
+
+    @property
+    def transport(self) -> TransportConfig:
+        return self._transport
+
     def _ensure_session(self):
         if self._session is None:
             self._ownsSession = True
-            self._session = aiohttp.ClientSession()
+            if self._pool is not None:
+                self._session = self._pool.acquire()
+            else:
+                self._session = self._transport.create_session(
+                    None if self._metrics is None else [self._metrics.trace_config()]
+                )
 
     def _ssl_test(self, resp: aiohttp.ClientResponse):
         if "port" in self._info:
@@ -199,17 +390,39 @@ class Connection:
             resp.raise_for_status()
             self._ssl_test(resp)
 
+    async def async_close(self):
+        """
+        Closes the session (or releases the shared pool) if this connection created it
+        """
+        session, self._session = self._session, None
+        if session is None or not self._ownsSession:
+            return
+
+        self._ownsSession = False
+        if self._pool is not None:
+            await self._pool.release()
+        else:
+            await session.close()
+
     def close(self):
-        if not self._session is None and self._ownsSession:
-            self._ownsSession = False
-            self._session.close()
+        """
+        Schedules async_close on the running loop, prefer awaiting async_close
+        """
+        if self._session is None or not self._ownsSession:
+            self._session = None
+            return
 
-        self._session = None
+        try:
+            asyncio.get_running_loop().create_task(self.async_close())
+        except RuntimeError:
+            # no loop left to close the session on, just drop it
+            self._ownsSession = False
+            self._session = None
 
     async def _raise_for_not_json_ok(
         self, response: aiohttp.ClientResponse, property: str = None
     ):
-        json = await response.json()
+        json = await self._decode(response)
         if property is not None and property in json:
             json = json[property]
 
@@ -220,30 +433,311 @@ class Connection:
 
         return json
 
-    async def get(self, url: str, property: str = None):
+    async def get(
+        self, url: str, property: str = None, cache: bool = True, retry: bool = True
+    ):
         """
         Provides a wrapper arounf aiohttp for getting json
 
+        When a cache is configured fresh responses are served from it and
+        stale ones are revalidated with ETag/Last-Modified.
+
+        Concurrent calls for the same url share a single request unless the
+        connection was created with coalesce=False, every caller receives the
+        same result (or exception). The returned object is therefore shared
+        with the cache and other callers and must not be modified, the
+        entity classes wrapping it copy the data before changing it.
+
         Parameters
         ----------
         url : str
             Url to fetch will be prefixed with base_url if not absolute
+        property : str (optional)
+            Top level property of the response to return
+        cache : bool
+            False for commands, the response is neither cached nor coalesced
+        retry : bool
+            False to fail on the first transient error instead of applying the
+            retry policy, the request is then not coalesced
         """
 
         self._ensure_session()
         url = self._ensure_url(url)
+        if not cache or not retry:
+            return _select(await self._get(url, cache, retry), property)
+        if not self._coalesce:
+            return _select(await self._get(url), property)
+
+        fetch = self._inflight.get(url)
+        if fetch is None:
+            fetch = asyncio.ensure_future(self._get(url))
+            self._inflight[url] = fetch
+            fetch.add_done_callback(lambda f: self._fetched(url, f))
+
+        # shield so a cancelled caller does not cancel the request for the others
+        return _select(await asyncio.shield(fetch), property)
+
+    def _fetched(self, url: str, fetch: asyncio.Future):
+        if self._inflight.get(url) is fetch:
+            del self._inflight[url]
+        if not fetch.cancelled():
+            # retrieve the exception so abandoned requests do not log warnings
+            fetch.exception()
+
+    async def _get(self, url: str, cache: bool = True, retry: bool = True):
+        entry = None
+        if cache and self._cache is not None:
+            entry = self._cache.lookup(url)
+            if entry is not None and self._cache.is_fresh(entry):
+                return entry.value
+
+        try:
+            json = await self._call(lambda: self._fetch(url, entry, cache), retry, url)
+        except aiohttp.ClientResponseError as err:
+            if not self._rejected(error=err, url=url):
+                raise
+            json = None
+        else:
+            if not self._rejected(json, url=url):
+                return json
+
+        url = await self._relogin(url)
+        return await self._call(lambda: self._fetch(url, None, cache), retry, url)
+
+    async def _fetch(self, url: str, entry: Entry = None, cache: bool = True):
         headers = {"Accept": "application/json"}
+        if entry is not None:
+            headers.update(entry.validators)
 
         resp = await self._session.get(url, headers=headers)
         async with resp:
+            if resp.status == 304 and entry is not None:
+                return self._cache.revalidated(url, entry)
             resp.raise_for_status()
             self._ssl_test(resp)
-            json = await resp.json()
-            if property is not None:
-                return json.get(property)
+            json = await self._decode(resp)
+            if cache and self._cache is not None:
+                self._cache.store(
+                    url,
+                    json,
+                    resp.headers.get("ETag"),
+                    resp.headers.get("Last-Modified"),
+                )
             return json
 
-    async def post(self, url: str, body: dict = None, property: str = None):
+    async def ws_connect(self, url: str, **kwargs) -> aiohttp.ClientWebSocketResponse:
+        """
+        Opens a websocket, http(s) urls are switched to ws(s)
+
+        Parameters
+        ----------
+        url : str
+            Url to connect will be prefixed with base_url if not absolute
+        """
+
+        self._ensure_session()
+        url = self._ensure_url(url)
+        if url[:4].lower() == "http":
+            url = "ws" + url[4:]
+        return await self._session.ws_connect(url, **kwargs)
+
+    async def open(
+        self,
+        url: str,
+        headers: dict = None,
+        method: str = "GET",
+        timeout: aiohttp.ClientTimeout = None,
+    ) -> aiohttp.ClientResponse:
+        """
+        Starts a request and returns the response without reading the body
+
+        The caller owns the response and must release it, preferably with
+        ``async with await connection.open(url) as resp:``
+
+        Parameters
+        ----------
+        url : str
+            Url to fetch will be prefixed with base_url if not absolute
+        headers : dict (optional)
+            Extra request headers
+        method : str
+            HTTP method to use
+        timeout : aiohttp.ClientTimeout (optional)
+            Replaces the session timeout, e.g. ``ClientTimeout(total=None,
+            sock_read=30)`` for endless streams
+        """
+
+        self._ensure_session()
+        url = self._ensure_url(url)
+        try:
+            return await self._call(
+                lambda: self._request(method, url, headers, timeout), False, url
+            )
+        except aiohttp.ClientResponseError as err:
+            if not self._rejected(error=err, url=url):
+                raise
+
+        url = await self._relogin(url)
+        return await self._call(
+            lambda: self._request(method, url, headers, timeout), False, url
+        )
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        headers: dict = None,
+        timeout: aiohttp.ClientTimeout = None,
+    ):
+        kwargs = {} if timeout is None else {"timeout": timeout}
+        resp = await self._session.request(method, url, headers=headers, **kwargs)
+        try:
+            resp.raise_for_status()
+            self._ssl_test(resp)
+        except BaseException:
+            resp.release()
+            raise
+        return resp
+
+    async def iter_array(
+        self, url: str, property: str = None, chunk_size: int = 1 << 16
+    ) -> AsyncIterator[Any]:
+        """
+        Streams the items of a json array without buffering the whole response
+
+        Parameters
+        ----------
+        url : str
+            Url to fetch will be prefixed with base_url if not absolute
+        property : str (optional)
+            Top level property holding the array, None if the response is the array
+        chunk_size : int
+            Bytes read from the response at a time
+        """
+
+        url = self._ensure_url(url)
+        for attempt in range(2):
+            # text received before the first item, an error object has none
+            head = []
+            items = self._iter_array(url, property, chunk_size, head)
+            try:
+                async for item in items:
+                    head = None
+                    yield item
+            except ValueError:
+                if head is None or self._loads_head(head) is None:
+                    raise
+            finally:
+                await items.aclose()
+            if head is None:
+                return
+
+            json = self._loads_head(head)
+            if attempt == 0 and self._rejected(json, url=url):
+                url = await self._relogin(url)
+                continue
+            if isinstance(json, dict) and json.get("ok") is False:
+                raise errors.NotOk(json.get("msg"))
+            return
+
+    async def _iter_array(
+        self, url: str, property: Optional[str], chunk_size: int, head: list
+    ) -> AsyncIterator[Any]:
+        parser = ArrayParser(property)
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        size = 0
+        async with await self.open(url, {"Accept": "application/json"}) as resp:
+            async for chunk in resp.content.iter_chunked(chunk_size):
+                text = decoder.decode(chunk)
+                if size <= _HEAD_SIZE:
+                    head.append(text)
+                    size += len(text)
+                for item in parser.feed(text):
+                    yield item
+                if parser.done:
+                    return
+            for item in parser.feed(decoder.decode(b"", True), True):
+                yield item
+
+    def _loads_head(self, head: list) -> Any:
+        try:
+            return self._codec.loads("".join(head))
+        except ValueError:
+            return None
+
+    async def _decode(self, response: aiohttp.ClientResponse):
+        if self._metrics is None:
+            return self._codec.loads(await response.read())
+
+        action = action_of(response.url)
+        with self._metrics.timer(action, BODY):
+            body = await response.read()
+        with self._metrics.timer(action, DECODE):
+            return self._codec.loads(body)
+
+    async def _call(
+        self, request: Callable[[], Awaitable[Any]], retry: bool, url: str = None
+    ):
+        """
+        Runs request under the circuit breaker, retrying transient failures
+        """
+        if self._metrics is None:
+            return await self._attempts(request, retry)
+        with self._metrics.timer(action_of(url), TOTAL):
+            return await self._attempts(request, retry)
+
+    async def _attempts(self, request: Callable[[], Awaitable[Any]], retry: bool):
+        policy = self._retry if retry else NO_RETRY
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        attempt = 0
+        while True:
+            remaining = None
+            if policy.deadline is not None:
+                remaining = policy.deadline - (loop.time() - started)
+                if remaining <= 0:
+                    raise asyncio.TimeoutError("Retry deadline exceeded")
+
+            if self._breaker is not None:
+                self._breaker.before()
+            try:
+                result = await asyncio.wait_for(request(), remaining)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                transient = policy.is_transient(err)
+                if self._breaker is not None:
+                    if transient:
+                        self._breaker.failure()
+                    else:
+                        self._breaker.success()
+                attempt += 1
+                if not transient or attempt >= policy.attempts:
+                    raise
+                delay = policy.delay(attempt)
+                if remaining is not None and delay >= remaining:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except asyncio.CancelledError:
+                if self._breaker is not None:
+                    self._breaker.release()
+                raise
+            except BaseException:
+                # the server answered, just not with what was expected
+                if self._breaker is not None:
+                    self._breaker.success()
+                raise
+
+            if self._breaker is not None:
+                self._breaker.success()
+            return result
+
+    async def post(
+        self,
+        url: str,
+        body: dict = None,
+        property: str = None,
+        idempotent: bool = False,
+    ):
         """
         Provides a wrapper around aiohttp for posting json
 
@@ -253,21 +747,46 @@ class Connection:
             Url to fetch will be prefixed with base_url if not absolute
         body : dict
             JSON to post
+        property : str (optional)
+            Top level property of the response to return
+        idempotent : bool
+            Allow retrying the post on transient failures
         """
 
         self._ensure_session()
         url = self._ensure_url(url)
         headers = {"Accept": "application/json"}
+        data = None
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+            data = self._codec.dumps(body)
+
+        async def send():
+            resp = await self._session.post(
+                url,
+                data=data,
+                headers=headers,
+                compress="deflate" if self._transport.compress else None,
+            )
+            async with resp:
+                self._invalidate_url(url)
+                resp.raise_for_status()
+                self._ssl_test(resp)
+                return await self._raise_for_not_json_ok(resp, property)
 
-        resp = await self._session.post(url, json=body, headers=headers)
-        async with resp:
-            resp.raise_for_status()
-            self._ssl_test(resp)
-            return await self._raise_for_not_json_ok(resp, property)
+        retry = idempotent or self._retry.retry_post
+        try:
+            return await self._call(send, retry, url)
+        except (aiohttp.ClientResponseError, errors.NotOk) as err:
+            if not self._rejected(error=err, url=url):
+                raise
+
+        url = await self._relogin(url)
+        return await self._call(send, retry, url)
 
     async def __aenter__(self):
         self._ensure_session()
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
-        self.close()
+        await self.async_close()
@@ -1 +1,2 @@
 STREAM_MJPEG = "mjpeg"
+STREAM_HLS = "hls"
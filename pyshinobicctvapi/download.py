@@ -0,0 +1,343 @@
+"""
+Resumable, optionally segmented file downloads
+"""
+
+import asyncio
+import json
+import os
+from typing import Callable, List, Optional, Tuple
+
+import aiohttp
+
+from .connection import Connection
+
+Progress = Callable[[int, Optional[int]], None]
+
+PARTIAL = ".part"
+STATE = ".part.json"
+
+
+def _content_total(resp: aiohttp.ClientResponse) -> Optional[int]:
+    content_range = resp.headers.get("Content-Range")
+    if content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        if total.isdigit():
+            return int(total)
+    if resp.status == 200 and resp.content_length is not None:
+        return resp.content_length
+    return None
+
+
+def _unsatisfiable_total(err: aiohttp.ClientResponseError) -> Optional[int]:
+    """
+    Size reported by a 416 answer (Content-Range: bytes */size)
+    """
+    content_range = (err.headers or {}).get("Content-Range", "")
+    total = content_range.rpartition("*/")[2]
+    return (
+        int(total) if content_range.startswith("bytes */") and total.isdigit() else None
+    )
+
+
+def _discard(*paths: str):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _validator(resp: aiohttp.ClientResponse) -> Optional[str]:
+    """
+    Strong ETag, or else Last-Modified, identifying the version of the file
+    """
+    etag = resp.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return resp.headers.get("Last-Modified")
+
+
+def _range(start: int, end: int = None, validator: str = None) -> dict:
+    headers = {"Range": f"bytes={start}-{'' if end is None else end}"}
+    if validator:
+        # a changed file is sent whole (200) instead of the range
+        headers["If-Range"] = validator
+    return headers
+
+
+async def _backoff(attempt: int):
+    await asyncio.sleep(min(2**attempt, 30) / 10)
+
+
+def _load_state(state: str) -> dict:
+    try:
+        with open(state) as file:
+            saved = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return saved if isinstance(saved, dict) else {}
+
+
+def _save_state(state: str, saved: dict):
+    with open(state, "w") as file:
+        json.dump(saved, file)
+
+
+class _Changed(Exception):
+    """
+    The file changed on the server since the partial download started
+    """
+
+
+class _Transfer:
+    """
+    Shared byte counter reporting progress for all segments of a download
+    """
+
+    def __init__(self, total: Optional[int], done: int, progress: Progress):
+        self.total = total
+        self.done = done
+        self._progress = progress
+
+    def advance(self, count: int):
+        self.done += count
+        if self._progress is not None:
+            self._progress(self.done, self.total)
+
+
+async def _download_stream(
+    connection: Connection,
+    url: str,
+    partial: str,
+    chunk_size: int,
+    retries: int,
+    progress: Progress,
+) -> int:
+    state = partial[: -len(PARTIAL)] + STATE
+    saved = _load_state(state)
+    validator = saved.get("validator")
+    if "segments" in saved:
+        # left by a segmented download, the file is sparse and cannot be appended to
+        _discard(partial, state)
+        validator = None
+
+    attempt = 0
+    transfer = None
+    while True:
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        headers = _range(offset, validator=validator) if offset else None
+        try:
+            resp = await connection.open(url, headers)
+        except aiohttp.ClientResponseError as err:
+            if err.status == 416 and offset:
+                if _unsatisfiable_total(err) == offset:
+                    # already have every byte
+                    return offset
+                # the partial file does not match the remote one, start over
+                _discard(partial)
+                continue
+            if err.status < 500 or attempt >= retries:
+                raise
+            attempt += 1
+            await _backoff(attempt)
+            continue
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt >= retries:
+                raise
+            attempt += 1
+            await _backoff(attempt)
+            continue
+
+        try:
+            async with resp:
+                if resp.status != 206:
+                    # whole file, either first request or changed on the server
+                    offset = 0
+                    validator = _validator(resp)
+                    if validator:
+                        _save_state(state, {"validator": validator})
+                    else:
+                        _discard(state)
+                if transfer is None:
+                    transfer = _Transfer(_content_total(resp), offset, progress)
+                else:
+                    transfer.done = offset
+                with open(partial, "ab" if offset else "wb") as file:
+                    async for chunk in resp.content.iter_chunked(chunk_size):
+                        file.write(chunk)
+                        transfer.advance(len(chunk))
+            return transfer.done
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt >= retries:
+                raise
+            attempt += 1
+            await _backoff(attempt)
+
+
+async def _probe(
+    connection: Connection, url: str
+) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Returns the size of url if the server accepts range requests, and its validator
+    """
+    async with await connection.open(url, _range(0, 0)) as resp:
+        if resp.status != 206:
+            return None, None
+        return _content_total(resp), _validator(resp)
+
+
+def _new_segments(size: int, segments: int) -> List[List[int]]:
+    step = -(-size // segments)
+    return [[start, min(start + step, size), 0] for start in range(0, size, step)]
+
+
+async def _download_segments(
+    connection: Connection,
+    url: str,
+    partial: str,
+    size: int,
+    validator: Optional[str],
+    segments: int,
+    chunk_size: int,
+    retries: int,
+    progress: Progress,
+) -> bool:
+    """
+    Fetches the missing ranges of partial in parallel
+
+    Returns False, with the partial download discarded, when the file
+    changed on the server.
+    """
+    state = partial[: -len(PARTIAL)] + STATE
+    saved = _load_state(state)
+    parts = saved.get("segments")
+    if not parts or not os.path.exists(partial):
+        parts = _new_segments(size, segments)
+    with open(partial, "ab") as file:
+        file.truncate(size)
+    transfer = _Transfer(size, sum(part[2] for part in parts), progress)
+
+    async def fetch(part: List[int]):
+        attempt = 0
+        while part[0] + part[2] < part[1]:
+            position = part[0] + part[2]
+            headers = _range(position, part[1] - 1, validator)
+            try:
+                async with await connection.open(url, headers) as resp:
+                    if resp.status != 206:
+                        raise _Changed()
+                    with open(partial, "r+b") as file:
+                        file.seek(position)
+                        async for chunk in resp.content.iter_chunked(chunk_size):
+                            chunk = chunk[: part[1] - part[0] - part[2]]
+                            file.write(chunk)
+                            part[2] += len(chunk)
+                            transfer.advance(len(chunk))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                client_error = isinstance(err, aiohttp.ClientResponseError) and (
+                    err.status < 500
+                )
+                if client_error or attempt >= retries:
+                    raise
+                attempt += 1
+                await _backoff(attempt)
+
+    tasks = [asyncio.ensure_future(fetch(part)) for part in parts]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException as err:
+        # stop every segment before recording how far each one got
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if isinstance(err, _Changed):
+            _discard(partial, state)
+            return False
+        _save_state(state, {"size": size, "validator": validator, "segments": parts})
+        raise
+
+    _discard(state)
+    return True
+
+
+async def async_download(
+    connection: Connection,
+    url: str,
+    path: str,
+    segments: int = 1,
+    chunk_size: int = 1 << 16,
+    retries: int = 3,
+    progress: Progress = None,
+    min_segment_size: int = 8 << 20,
+) -> str:
+    """
+    Downloads url to path in chunks, resuming a previous partial download
+
+    Data is written to ``path + ".part"`` which is renamed when complete,
+    a failed download is resumed with a range request on the next call.
+    An interrupted segmented download is resumed segmented, whatever
+    segments is, as long as the remote file did not change. Resumed ranges
+    are sent with If-Range so a file changed on the server is fetched again
+    from the start rather than stitched to the old bytes.
+
+    Parameters
+    ----------
+    connection : Connection
+        The connection object to use
+    url : str
+        Url to fetch will be prefixed with base_url if not absolute
+    path : str
+        Destination file
+    segments : int
+        Number of ranges fetched in parallel for large files
+    chunk_size : int
+        Bytes read and written at a time
+    retries : int
+        Attempts to resume after a transfer error
+    progress : def callback(done, total) (optional)
+        Called as bytes are written, total is None when unknown
+    min_segment_size : int
+        Files are only split when each segment would be at least this big
+    """
+
+    partial = path + PARTIAL
+    state = path + STATE
+    while True:
+        saved = _load_state(state)
+        size = validator = None
+        if segments > 1 or "segments" in saved:
+            size, validator = await _probe(connection, url)
+
+        if "segments" in saved and (
+            size is None
+            or size != saved.get("size")
+            or validator != saved.get("validator")
+            or not os.path.exists(partial)
+        ):
+            _discard(partial, state)
+            saved = {}
+
+        if "segments" in saved or (
+            segments > 1 and size is not None and size >= segments * min_segment_size
+        ):
+            if not await _download_segments(
+                connection,
+                url,
+                partial,
+                size,
+                validator,
+                segments,
+                chunk_size,
+                retries,
+                progress,
+            ):
+                # changed while downloading, start over without segments
+                segments = 1
+                continue
+        else:
+            await _download_stream(
+                connection, url, partial, chunk_size, retries, progress
+            )
+        break
+
+    _discard(state)
+    os.replace(partial, path)
+    return path
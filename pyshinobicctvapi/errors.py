@@ -13,3 +13,20 @@ class NotOk(Error):
 class Unauthorized(Error):
     def __init__(self, message: str = ""):
         super().__init__(message, type="Unauthorized")
+
+
+class CircuitOpen(Error):
+    def __init__(self, message: str = "", retry_after: float = None):
+        super().__init__(message, type="CircuitOpen")
+        # seconds until the circuit lets a probe through, None when unknown
+        self.retry_after = retry_after
+
+
+class RotateFailed(Error):
+    """
+    The new key was added but the old one could not be deleted, new holds it
+    """
+
+    def __init__(self, message: str = "", new=None):
+        super().__init__(message, type="RotateFailed")
+        self.new = new
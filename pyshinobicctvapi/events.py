@@ -0,0 +1,283 @@
+"""
+Push based monitor events over Shinobi's websocket (socket.io) channel
+"""
+
+import asyncio
+import json
+import random
+from typing import Any, Dict, Iterable, List, Optional, Type
+
+import aiohttp
+
+from .connection import Connection
+from .videos import Video
+
+SOCKET_PATH = "/socket.io/?EIO=3&transport=websocket"
+
+MONITOR_STATUS = "monitor_status"
+DETECTOR_TRIGGER = "detector_trigger"
+VIDEO_BUILD_SUCCESS = "video_build_success"
+
+_END = object()
+
+
+class Event:
+    """
+    An event pushed by Shinobi
+    """
+
+    __slots__ = ("type", "data")
+
+    def __init__(self, type: str, data: dict):
+        self.type = type
+        self.data = data
+
+    @property
+    def monitor_id(self) -> Optional[str]:
+        return self.data.get("id") or self.data.get("mid")
+
+    @property
+    def group(self) -> Optional[str]:
+        return self.data.get("ke")
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.type} {self.monitor_id}>"
+
+
+class MonitorStatusEvent(Event):
+    __slots__ = ()
+
+    @property
+    def status(self) -> Optional[str]:
+        return self.data.get("status")
+
+    @property
+    def code(self) -> Optional[int]:
+        return self.data.get("code")
+
+
+class DetectionEvent(Event):
+    __slots__ = ()
+
+    @property
+    def details(self) -> dict:
+        return self.data.get("details") or {}
+
+    @property
+    def plug(self) -> Optional[str]:
+        return self.details.get("plug")
+
+    @property
+    def reason(self) -> Optional[str]:
+        return self.details.get("reason")
+
+    @property
+    def confidence(self) -> Optional[float]:
+        return self.details.get("confidence")
+
+
+class RecordingEvent(Event):
+    __slots__ = ()
+
+    @property
+    def video(self) -> Video:
+        return Video(self.data)
+
+
+EVENT_TYPES: Dict[str, Type[Event]] = {
+    MONITOR_STATUS: MonitorStatusEvent,
+    DETECTOR_TRIGGER: DetectionEvent,
+    VIDEO_BUILD_SUCCESS: RecordingEvent,
+}
+
+
+def parse_event(data: dict) -> Event:
+    """
+    Creates the typed event for a socket "f" payload
+    """
+    kind = data.get("f")
+    return EVENT_TYPES.get(kind, Event)(kind, data)
+
+
+class EventSubscription:
+    """
+    Async iterator of events, reconnecting and resubscribing automatically
+
+    Connection errors are retried; any other error, such as a malformed
+    payload, ends the iteration and is raised to the consumer.
+
+    Parameters
+    ----------
+    connection : Connection
+        Connection whose token and group authenticate the socket
+    monitors : iterable (optional)
+        Monitor ids to watch, events for the whole group are still received
+    uid : str (optional)
+        User id sent with the authentication
+    types : iterable (optional)
+        Event types to deliver, all events by default
+    queue_size : int
+        Events buffered before the oldest is dropped
+    reconnect_delay : float
+        First delay before reconnecting, doubled (with jitter) per failure
+    max_reconnect_delay : float
+        Largest delay between reconnect attempts
+    """
+
+    def __init__(
+        self,
+        connection: Connection,
+        monitors: Iterable[str] = None,
+        uid: str = None,
+        types: Iterable[str] = None,
+        queue_size: int = 1000,
+        reconnect_delay: float = 0.5,
+        max_reconnect_delay: float = 30.0,
+    ):
+        self._connection = connection
+        self._monitors: List[str] = list(monitors or [])
+        self._uid = uid
+        self._types = set(types) if types is not None else None
+        self._queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self._reconnect_delay = reconnect_delay
+        self._max_reconnect_delay = max_reconnect_delay
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self.connects = 0
+        self.dropped = 0
+
+    def _start(self):
+        if self._task is None and not self._closed:
+            self._task = asyncio.ensure_future(self._run())
+
+    def __aiter__(self):
+        self._start()
+        return self
+
+    async def __anext__(self) -> Event:
+        self._start()
+        if self._closed and self._queue.empty():
+            raise StopAsyncIteration
+        event = await self._queue.get()
+        if event is _END:
+            self._closed = True
+            error, self._error = self._error, None
+            if error is not None:
+                raise error
+            raise StopAsyncIteration
+        return event
+
+    async def watch(self, monitor_id: str):
+        """
+        Adds a monitor to the watched monitors
+        """
+        if monitor_id not in self._monitors:
+            self._monitors.append(monitor_id)
+            if self._ws is not None and not self._ws.closed:
+                await self._emit(self._ws, self._watch(monitor_id))
+
+    def _auth(self) -> dict:
+        info = self._connection.info
+        auth = {"ke": info.group, "auth": info.token}
+        if self._uid is not None:
+            auth["uid"] = self._uid
+        return auth
+
+    def _watch(self, monitor_id: str) -> dict:
+        return {"f": "monitor", "ff": "watch_on", "id": monitor_id, **self._auth()}
+
+    async def _emit(self, ws: aiohttp.ClientWebSocketResponse, data: Any):
+        await ws.send_str("42" + json.dumps(["f", data]))
+
+    def _put(self, event: Any):
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(event)
+
+    async def _run(self):
+        failures = 0
+        try:
+            while not self._closed:
+                try:
+                    await self._session()
+                    failures = 0
+                except asyncio.CancelledError:
+                    raise
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                    failures += 1
+                except Exception as err:
+                    # not a connection problem, reconnecting would not help
+                    self._error = err
+                    break
+                if self._closed:
+                    break
+                delay = min(
+                    self._reconnect_delay * 2 ** max(failures - 1, 0),
+                    self._max_reconnect_delay,
+                )
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+        finally:
+            self._put(_END)
+
+    async def _session(self):
+        ping = None
+        async with await self._connection.ws_connect(SOCKET_PATH) as ws:
+            self._ws = ws
+            try:
+                async for msg in ws:
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        if msg.type == aiohttp.WSMsgType.ERROR:
+                            raise ws.exception() or aiohttp.ClientError()
+                        continue
+                    packet = msg.data
+                    if packet[:1] == "0":
+                        # engine.io open, the client keeps the connection alive
+                        handshake = json.loads(packet[1:] or "{}")
+                        interval = handshake.get("pingInterval", 25000) / 1000
+                        ping = asyncio.ensure_future(self._ping(ws, interval))
+                    elif packet == "40":
+                        self.connects += 1
+                        await self._emit(ws, {"f": "init", **self._auth()})
+                        for monitor_id in self._monitors:
+                            await self._emit(ws, self._watch(monitor_id))
+                    elif packet == "2":
+                        await ws.send_str("3")
+                    elif packet[:2] == "42":
+                        self._dispatch(json.loads(packet[2:]))
+            finally:
+                self._ws = None
+                if ping is not None:
+                    ping.cancel()
+
+    async def _ping(self, ws: aiohttp.ClientWebSocketResponse, interval: float):
+        while not ws.closed:
+            await asyncio.sleep(interval)
+            await ws.send_str("2")
+
+    def _dispatch(self, message: list):
+        if len(message) < 2 or not isinstance(message[1], dict):
+            return
+        event = parse_event(message[1])
+        if self._types is None or event.type in self._types:
+            self._put(event)
+
+    async def async_close(self):
+        """
+        Disconnects and ends the iteration
+        """
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        else:
+            self._put(_END)
+
+    async def __aenter__(self):
+        self._start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.async_close()
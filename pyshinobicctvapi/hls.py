@@ -0,0 +1,294 @@
+"""
+HLS playlist following with concurrent segment prefetching
+"""
+
+import asyncio
+from typing import List, Optional, Tuple
+
+import aiohttp
+from yarl import URL
+
+from . import errors
+from .connection import Connection
+
+
+class Playlist:
+    """
+    Parsed m3u8 playlist
+
+    Media playlists have segments as (sequence, uri, duration) tuples,
+    master playlists only have variants as (bandwidth, uri) tuples.
+    """
+
+    __slots__ = ("target_duration", "media_sequence", "segments", "ended", "variants")
+
+    def __init__(self):
+        self.target_duration = 0.0
+        self.media_sequence = 0
+        self.segments: List[Tuple[int, str, float]] = []
+        self.ended = False
+        self.variants: List[Tuple[int, str]] = []
+
+
+def _attribute(attributes: str, name: str) -> Optional[str]:
+    for attribute in attributes.split(","):
+        key, _, value = attribute.partition("=")
+        if key.strip() == name:
+            return value.strip('"')
+    return None
+
+
+def parse_playlist(text: str) -> Playlist:
+    """
+    Parses the tags of an m3u8 playlist needed to follow it
+    """
+    playlist = Playlist()
+    duration = 0.0
+    bandwidth = None
+    sequence = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line[0] != "#":
+            if bandwidth is not None:
+                playlist.variants.append((bandwidth, line))
+                bandwidth = None
+                continue
+            if sequence is None:
+                sequence = playlist.media_sequence
+            playlist.segments.append((sequence, line, duration))
+            sequence += 1
+            duration = 0.0
+            continue
+        tag, _, value = line.partition(":")
+        if tag == "#EXTINF":
+            duration = float(value.split(",", 1)[0] or 0)
+        elif tag == "#EXT-X-TARGETDURATION":
+            playlist.target_duration = float(value)
+        elif tag == "#EXT-X-MEDIA-SEQUENCE":
+            playlist.media_sequence = int(value)
+        elif tag == "#EXT-X-ENDLIST":
+            playlist.ended = True
+        elif tag == "#EXT-X-STREAM-INF":
+            bandwidth = int(_attribute(value, "BANDWIDTH") or 0)
+    return playlist
+
+
+class Segment:
+    __slots__ = ("sequence", "url", "duration", "data")
+
+    def __init__(self, sequence: int, url: str, duration: float, data: bytes):
+        self.sequence = sequence
+        self.url = url
+        self.duration = duration
+        self.data = data
+
+    def __repr__(self):
+        return f"<Segment {self.sequence} {len(self.data)} bytes>"
+
+
+class HlsFollower:
+    """
+    Follows an HLS playlist and yields its segments in order
+
+    The playlist is polled with conditional requests, every target duration
+    after it changed and every half target duration otherwise. New segments
+    are fetched concurrently as soon as they are listed and held in a
+    bounded buffer until consumed; when the buffer is full polling waits
+    for the consumer. Segments that left the playlist, or the server,
+    before they could be fetched are counted in skipped. A media sequence
+    going back, as after a restart of the stream, is followed from its
+    first segment.
+
+    Parameters
+    ----------
+    connection : Connection
+        Connection used for the playlist and the segments
+    url : str
+        Playlist url, master playlists follow their highest bandwidth variant
+    buffer_size : int
+        Maximum number of segments fetched ahead of the consumer
+    prefetch : int
+        Maximum number of segments fetched at once
+    live_edge : int (optional)
+        Number of segments from the end of a live playlist to start at,
+        None to start at the first listed segment
+    interval : float (optional)
+        Seconds between playlist polls, defaults to the target duration
+    retries : int
+        Extra attempts made, with backoff, for a segment failing with a
+        connection or server error
+    """
+
+    def __init__(
+        self,
+        connection: Connection,
+        url: str,
+        buffer_size: int = 6,
+        prefetch: int = 3,
+        live_edge: Optional[int] = 3,
+        interval: float = None,
+        retries: int = 2,
+    ):
+        self._connection = connection
+        self._url = url
+        self.live_edge = live_edge
+        self.interval = interval
+        self.retries = retries
+        self.skipped = 0
+        self._buffer_size = buffer_size
+        self._prefetch = asyncio.Semaphore(prefetch)
+        self._queue: Optional[asyncio.Queue] = None
+        self._producer: Optional[asyncio.Task] = None
+        self._next: Optional[int] = None
+        self._validators = {}
+        self._target = 1.0
+        self._error: Optional[BaseException] = None
+        self._finished = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Segment:
+        if self._finished:
+            raise StopAsyncIteration
+        if self._producer is None:
+            self._queue = asyncio.Queue(self._buffer_size)
+            self._producer = asyncio.ensure_future(self._produce())
+        while True:
+            fetch = await self._queue.get()
+            if fetch is None:
+                self._finished = True
+                if self._error is not None:
+                    raise self._error
+                raise StopAsyncIteration
+            try:
+                segment = await fetch
+            except BaseException:
+                await self.async_close()
+                raise
+            if segment is not None:
+                return segment
+
+    async def _playlist(self) -> Optional[Playlist]:
+        """
+        The playlist, None when it did not change since the last poll
+        """
+        resp = await self._connection.open(self._url, self._validators)
+        async with resp:
+            if resp.status == 304:
+                return None
+            text = await resp.text()
+            validators = {}
+            if resp.headers.get("ETag"):
+                validators["If-None-Match"] = resp.headers["ETag"]
+            if resp.headers.get("Last-Modified"):
+                validators["If-Modified-Since"] = resp.headers["Last-Modified"]
+            self._validators = validators
+        return parse_playlist(text)
+
+    async def _media_playlist(self) -> Optional[Playlist]:
+        playlist = await self._playlist()
+        if playlist is not None and playlist.variants and not playlist.segments:
+            _, uri = max(playlist.variants)
+            self._url = str(URL(self._url).join(URL(uri)))
+            self._validators = {}
+            playlist = await self._playlist()
+            if playlist is None or playlist.variants:
+                raise errors.Error(f"No media playlist at {self._url}")
+        return playlist
+
+    async def _produce(self):
+        try:
+            while True:
+                playlist = await self._media_playlist()
+                if playlist is not None:
+                    await self._schedule(playlist)
+                    if playlist.ended:
+                        break
+                    self._target = playlist.target_duration or self._target
+                interval = self.interval
+                if interval is None:
+                    interval = self._target if playlist else self._target / 2
+                await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            self._error = err
+        # end marker, queued after the segments already scheduled
+        await self._queue.put(None)
+
+    async def _schedule(self, playlist: Playlist):
+        segments = playlist.segments
+        if self._next is not None and (
+            playlist.media_sequence + len(segments) < self._next
+        ):
+            # the sequence went back, the stream was restarted on the server
+            self._next = playlist.media_sequence
+        if self._next is None:
+            if self.live_edge is not None and not playlist.ended:
+                segments = segments[-self.live_edge :] if self.live_edge else []
+            if segments:
+                self._next = segments[0][0]
+            else:
+                self._next = playlist.media_sequence + len(playlist.segments)
+        for sequence, uri, duration in segments:
+            if sequence < self._next:
+                continue
+            self.skipped += sequence - self._next
+            url = str(URL(self._url).join(URL(uri)))
+            fetch = asyncio.ensure_future(self._fetch(sequence, url, duration))
+            try:
+                await self._queue.put(fetch)
+            except asyncio.CancelledError:
+                fetch.cancel()
+                raise
+            self._next = sequence + 1
+
+    async def _fetch(
+        self, sequence: int, url: str, duration: float
+    ) -> Optional[Segment]:
+        """
+        The segment, None when it left the server before it could be fetched
+        """
+        async with self._prefetch:
+            attempt = 0
+            while True:
+                try:
+                    async with await self._connection.open(url) as resp:
+                        return Segment(sequence, url, duration, await resp.read())
+                except aiohttp.ClientResponseError as err:
+                    if err.status in (404, 410):
+                        self.skipped += 1
+                        return None
+                    if err.status < 500 or attempt >= self.retries:
+                        raise
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if attempt >= self.retries:
+                        raise
+                attempt += 1
+                await asyncio.sleep(min(2**attempt, 30) / 10)
+
+    async def async_close(self):
+        """
+        Stops polling and drops the buffered segments
+        """
+        self._finished = True
+        if self._producer is None:
+            return
+        self._producer.cancel()
+        await asyncio.gather(self._producer, return_exceptions=True)
+        while not self._queue.empty():
+            fetch = self._queue.get_nowait()
+            if fetch is not None:
+                fetch.cancel()
+                await asyncio.gather(fetch, return_exceptions=True)
+        # wake a consumer waiting for the next segment
+        self._queue.put_nowait(None)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.async_close()
@@ -0,0 +1,255 @@
+"""
+Interval index answering which recordings cover a time
+"""
+
+from array import array
+from bisect import bisect_right
+from math import inf, isnan
+from typing import Any, AsyncIterable, Dict, Iterable, List, Tuple, Union
+
+from .videos import Video, parse_time
+from .videotable import Time, VideoRow, VideoTable, _timestamp
+
+Recording = Union[Video, dict, VideoRow]
+
+
+class _Track:
+    """
+    Recordings of one monitor sorted by start, as an implicit interval tree
+
+    The recordings between lo and hi form a subtree rooted at their middle
+    one, reach[mid] is the latest end within that subtree. A query skips
+    every subtree ending before it or starting after it, so one long
+    recording does not make later queries scan the recordings it overlaps.
+    reach is rebuilt on the first query after recordings were added.
+    """
+
+    __slots__ = ("start", "end", "reach", "items")
+
+    def __init__(self):
+        self.start = array("d")
+        self.end = array("d")
+        self.reach = None
+        self.items: List[Recording] = []
+
+    def add(self, start: float, end: float, item: Recording):
+        index = bisect_right(self.start, start)
+        if index == len(self.start):
+            # recordings usually arrive in time order
+            self.start.append(start)
+            self.end.append(end)
+            self.items.append(item)
+        else:
+            self.start.insert(index, start)
+            self.end.insert(index, end)
+            self.items.insert(index, item)
+        self.reach = None
+
+    def _build(self, lo: int, hi: int) -> float:
+        if lo >= hi:
+            return -inf
+        mid = (lo + hi) // 2
+        reach = max(self.end[mid], self._build(lo, mid), self._build(mid + 1, hi))
+        self.reach[mid] = reach
+        return reach
+
+    def _find(self, lo: int, hi: int, start: float, end: float, found: List[int]):
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.reach[mid] < start or self.start[lo] > end:
+                return
+            self._find(lo, mid, start, end, found)
+            if self.start[mid] > end:
+                return
+            if self.end[mid] >= start:
+                found.append(mid)
+            lo = mid + 1
+
+    def overlapping(self, start: float, end: float) -> List[int]:
+        """
+        Indexes of the recordings overlapping start..end, in start order
+        """
+        if self.reach is None:
+            self.reach = array("d", bytes(8 * len(self.start)))
+            self._build(0, len(self.start))
+        found = []
+        self._find(0, len(self.start), start, end, found)
+        return found
+
+    def between(self, start: float, end: float) -> List[Recording]:
+        return [self.items[i] for i in self.overlapping(start, end)]
+
+    def gaps(self, start: float, end: float, min_gap: float) -> List[tuple]:
+        gaps = []
+        cursor = start
+        for i in self.overlapping(start, end):
+            if self.start[i] - cursor > min_gap:
+                gaps.append((cursor, self.start[i]))
+            cursor = max(cursor, self.end[i])
+        if end - cursor > min_gap:
+            gaps.append((cursor, end))
+        return gaps
+
+
+def _bounds(recording: Recording) -> Tuple[str, float, float]:
+    if isinstance(recording, VideoRow):
+        return recording.monitor_id, recording.start_timestamp, recording.end_timestamp
+    if isinstance(recording, Video):
+        recording = recording._video
+    return (
+        recording.get("mid") or "",
+        _timestamp(parse_time(recording.get("time"))),
+        _timestamp(parse_time(recording.get("end"))),
+    )
+
+
+class RecordingIndex:
+    """
+    Recordings per monitor, indexed for point, range and gap queries
+
+    Each monitor's recordings form an interval tree, a query takes
+    logarithmic time per recording returned (and logarithmic time when
+    none is), however many other recordings overlap them.
+    Recordings without a start time are ignored, without an end time they
+    are treated as covering their start only. Times are datetimes or
+    timestamps; gaps are returned as (start, end) timestamps.
+
+    Parameters
+    ----------
+    recordings : iterable (optional)
+        Videos, video dicts or VideoTable rows to index
+    """
+
+    def __init__(self, recordings: Iterable[Recording] = None):
+        self._tracks: Dict[str, _Track] = {}
+        self._count = 0
+        if recordings is not None:
+            self.extend(recordings)
+
+    @classmethod
+    async def async_from_videos(
+        cls, videos: AsyncIterable[Union[Video, dict]]
+    ) -> "RecordingIndex":
+        """
+        Builds an index from an async iterator such as videos.async_iter
+        """
+        index = cls()
+        async for video in videos:
+            index.add(video)
+        return index
+
+    @classmethod
+    def from_table(cls, table: VideoTable) -> "RecordingIndex":
+        """
+        Builds an index of the rows of a VideoTable, reading its columns directly
+        """
+        index = cls()
+        monitors = table._monitors
+        for i, (code, start, end) in enumerate(
+            zip(table._monitor, table._start, table._end)
+        ):
+            index._add(monitors[code], start, end, VideoRow(table, i))
+        return index
+
+    def add(self, recording: Recording):
+        self._add(*_bounds(recording), recording)
+
+    def _add(self, monitor_id: str, start: float, end: float, item: Recording):
+        if isnan(start):
+            return
+        if isnan(end) or end < start:
+            end = start
+        track = self._tracks.get(monitor_id)
+        if track is None:
+            track = self._tracks[monitor_id] = _Track()
+        track.add(start, end, item)
+        self._count += 1
+
+    def extend(self, recordings: Iterable[Recording]):
+        for recording in recordings:
+            self.add(recording)
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def monitor_ids(self) -> List[str]:
+        return list(self._tracks)
+
+    def _selected(self, monitors: Iterable[str] = None) -> Iterable[str]:
+        return self._tracks if monitors is None else monitors
+
+    def at(self, time: Time, monitors: Iterable[str] = None) -> Dict[str, List[Any]]:
+        """
+        Recordings covering time, by monitor
+
+        Parameters
+        ----------
+        time : datetime or timestamp
+            Time to look up
+        monitors : iterable (optional)
+            Monitor ids to look in, all when not given
+        """
+        return self.between(time, time, monitors)
+
+    def between(
+        self, start: Time, end: Time, monitors: Iterable[str] = None
+    ) -> Dict[str, List[Any]]:
+        """
+        Recordings overlapping start..end, by monitor, in start order
+
+        Monitors without such recordings are left out.
+        """
+        start, end = _timestamp(start), _timestamp(end)
+        found = {}
+        for monitor_id in self._selected(monitors):
+            track = self._tracks.get(monitor_id)
+            if track is not None:
+                items = track.between(start, end)
+                if items:
+                    found[monitor_id] = items
+        return found
+
+    def covers(self, time: Time, monitors: Iterable[str] = None) -> Dict[str, bool]:
+        """
+        Whether each monitor has a recording covering time
+        """
+        time = _timestamp(time)
+        covered = {}
+        for monitor_id in self._selected(monitors):
+            track = self._tracks.get(monitor_id)
+            covered[monitor_id] = bool(track is not None and track.between(time, time))
+        return covered
+
+    def gaps(
+        self,
+        start: Time,
+        end: Time,
+        monitors: Iterable[str] = None,
+        min_gap: float = 0.0,
+    ) -> Dict[str, List[tuple]]:
+        """
+        Parts of start..end not covered by any recording, by monitor
+
+        Parameters
+        ----------
+        start : datetime or timestamp
+            Start of the range
+        end : datetime or timestamp
+            End of the range
+        monitors : iterable (optional)
+            Monitor ids to check, all when not given; unknown monitors have
+            the whole range as a gap
+        min_gap : float
+            Seconds a gap must exceed to be reported, e.g. to ignore the
+            small holes between consecutive recordings
+        """
+        start, end = _timestamp(start), _timestamp(end)
+        gaps = {}
+        for monitor_id in self._selected(monitors):
+            track = self._tracks.get(monitor_id)
+            if track is None:
+                gaps[monitor_id] = [(start, end)] if end - start > min_gap else []
+            else:
+                gaps[monitor_id] = track.gaps(start, end, min_gap)
+        return gaps
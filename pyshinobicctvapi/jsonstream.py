@@ -0,0 +1,152 @@
+"""
+Incremental extraction of json array items from a streamed response
+"""
+
+import json
+from typing import Any, List
+
+_WHITESPACE = " \t\n\r"
+_COMPACT_AT = 1 << 16
+
+
+class ArrayParser:
+    """
+    Extracts the items of a json array as text is fed in
+
+    Only the item being decoded is buffered, so memory use is bounded by the
+    largest item rather than by the length of the array.
+
+    Parameters
+    ----------
+    property : str (optional)
+        Top level object property holding the array, None if the document
+        itself is the array
+    """
+
+    def __init__(self, property: str = None):
+        self._property = property
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._state = "start"
+        self._key = None
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, text: str, final: bool = False) -> List[Any]:
+        """
+        Adds text to the buffer and returns the items completed by it
+
+        Parameters
+        ----------
+        text : str
+            Next piece of the document
+        final : bool
+            True when no more text will follow
+        """
+        if self._pos > _COMPACT_AT:
+            self._buf = self._buf[self._pos :]
+            self._pos = 0
+        self._buf += text
+
+        items = []
+        while self._state != "done":
+            if not self._skip_whitespace():
+                break
+
+            char = self._buf[self._pos]
+            state = self._state
+            if state == "start":
+                if self._property is None:
+                    self._expect(char, "[", "item")
+                else:
+                    self._expect(char, "{", "key")
+            elif state == "key":
+                if char == "}":
+                    self._pos += 1
+                    self._state = "done"
+                    continue
+                key = self._decode(final)
+                if key is self:
+                    break
+                self._key = key
+                self._state = "colon"
+            elif state == "colon":
+                self._expect(
+                    char, ":", "array" if self._key == self._property else "value"
+                )
+            elif state == "value":
+                if self._decode(final) is self:
+                    break
+                self._state = "next_key"
+            elif state == "next_key":
+                if char == "}":
+                    self._pos += 1
+                    self._state = "done"
+                else:
+                    self._expect(char, ",", "key")
+            elif state == "array":
+                if char != "[":
+                    # null or any other non array value holds no items
+                    if self._decode(final) is self:
+                        break
+                    self._state = "done"
+                    continue
+                self._pos += 1
+                self._state = "item"
+            elif state == "item":
+                if char == "]":
+                    self._pos += 1
+                    self._state = "done"
+                    continue
+                item = self._decode(final)
+                if item is self:
+                    break
+                items.append(item)
+                self._state = "next_item"
+            elif state == "next_item":
+                if char == "]":
+                    self._pos += 1
+                    self._state = "done"
+                else:
+                    self._expect(char, ",", "item")
+
+        if final and self._state != "done":
+            raise ValueError("Incomplete json document")
+        return items
+
+    def _skip_whitespace(self) -> bool:
+        buf = self._buf
+        pos = self._pos
+        end = len(buf)
+        while pos < end and buf[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        return pos < end
+
+    def _expect(self, char: str, expected: str, state: str):
+        if char != expected:
+            raise ValueError(
+                f"Expected {expected!r} at position {self._pos} but found {char!r}"
+            )
+        self._pos += 1
+        self._state = state
+
+    def _decode(self, final: bool):
+        """
+        Decodes the value at the current position, returns self when more text is needed
+        """
+        try:
+            value, end = self._decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return self
+
+        # a number or literal ending the buffer may continue in the next piece
+        if end == len(self._buf) and not final:
+            return self
+        self._pos = end
+        return value
@@ -0,0 +1,257 @@
+"""
+Shinobi log retrieval
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Any, AsyncIterator, List, Optional
+from urllib.parse import urlencode
+
+from . import errors
+from .codec import Codec, get_codec
+from .connection import Connection
+from .videos import _utc, parse_time
+
+ACTION = "logs"
+
+
+class Log:
+    """
+    Shinobi Log entry
+    """
+
+    __slots__ = ("_log", "_codec", "_info")
+
+    def __init__(self, log: dict = None, codec: Codec = None):
+        self._log = log or {}
+        self._codec = codec
+        self._info = None
+
+    @property
+    def monitor_id(self) -> Optional[str]:
+        return self._log.get("mid")
+
+    @property
+    def group(self) -> Optional[str]:
+        return self._log.get("ke")
+
+    @property
+    def time(self) -> Optional[datetime]:
+        return parse_time(self._log.get("time"))
+
+    @property
+    def info(self) -> Any:
+        """
+        Log details, decoded on first access when sent as a json string
+        """
+        if self._info is None:
+            info = self._log.get("info")
+            if isinstance(info, str) and info[:1] in ("{", "["):
+                info = get_codec(self._codec).loads(info)
+            self._info = info
+        return self._info
+
+    @property
+    def key(self) -> tuple:
+        """
+        Identity of the entry, used to skip entries already seen
+        """
+        info = self._log.get("info")
+        if not isinstance(info, str):
+            info = repr(info)
+        return (self._log.get("mid"), self._log.get("time"), info)
+
+    def __repr__(self):
+        return f"<Log {self.monitor_id} {self._log.get('time')}>"
+
+
+def _url(
+    connection: Connection,
+    monitor_id: str = None,
+    start: datetime = None,
+    end: datetime = None,
+    limit: int = None,
+) -> str:
+    url = connection.action_url(ACTION, monitor_id)
+    query = {}
+    if start is not None:
+        query["start"] = _utc(start).isoformat()
+    if end is not None:
+        query["end"] = _utc(end).isoformat()
+    if limit is not None:
+        query["limit"] = limit
+    if query:
+        url += "?" + urlencode(query)
+    return url
+
+
+async def async_all(
+    connection: Connection,
+    monitor_id: str = None,
+    start: datetime = None,
+    end: datetime = None,
+    limit: int = None,
+) -> List[Log]:
+    """
+    Get the logs of the group, or of one monitor, for the specified connection
+
+    Parameters
+    ----------
+    connection : Connection
+        The connection object to use
+    monitor_id : str (optional)
+        Monitor whose logs are returned, all monitors when not given
+    start : datetime (optional)
+        Oldest entry time, naive times are local time
+    end : datetime (optional)
+        Newest entry time, naive times are local time
+    limit : int (optional)
+        Maximum number of entries, the server returns the newest first
+    """
+
+    json = await connection.get(
+        _url(connection, monitor_id, start, end, limit), cache=False
+    )
+    if isinstance(json, dict) and json.get("ok") is False:
+        raise errors.NotOk(json.get("msg"))
+    return [Log(log, connection.codec) for log in json]
+
+
+async def async_iter(
+    connection: Connection,
+    monitor_id: str = None,
+    start: datetime = None,
+    end: datetime = None,
+    limit: int = None,
+) -> AsyncIterator[Log]:
+    """
+    Iterate the logs as they are received, see async_all
+
+    The response is parsed incrementally so memory use does not grow with
+    the number of entries.
+    """
+
+    url = _url(connection, monitor_id, start, end, limit)
+    async for log in connection.iter_array(url):
+        yield Log(log, connection.codec)
+
+
+async def _async_since(
+    connection: Connection,
+    monitor_id: Optional[str],
+    start: Optional[datetime],
+    limit: int,
+) -> List[Log]:
+    """
+    Every entry newer than start, paging back from the newest while pages are full
+    """
+    start = _utc(start)
+    logs = []
+    seen = set()
+    end = None
+    while True:
+        page = await async_all(connection, monitor_id, start, end, limit)
+        for log in page:
+            key = log.key
+            if key not in seen:
+                seen.add(key)
+                logs.append(log)
+        if len(page) < limit:
+            return logs
+        times = [_utc(log.time) for log in page if log.time]
+        if not times:
+            return logs
+        oldest = min(times)
+        if oldest == end or (start is not None and oldest <= start):
+            # a full page sharing one timestamp, nothing older can be reached
+            return logs
+        end = oldest
+
+
+async def async_tail(
+    connection: Connection,
+    monitor_id: str = None,
+    start: datetime = None,
+    interval: float = 10.0,
+    limit: int = 500,
+) -> AsyncIterator[Log]:
+    """
+    Follows the logs, yielding new entries oldest first as they appear
+
+    Each poll only asks for entries from the newest time already seen, the
+    entries sharing that time are remembered so none is yielded twice.
+
+    Parameters
+    ----------
+    connection : Connection
+        The connection object to use
+    monitor_id : str (optional)
+        Monitor whose logs are followed, all monitors when not given
+    start : datetime (optional)
+        Time to follow from, defaults to the entries currently on the server;
+        naive times are local time
+    interval : float
+        Seconds between polls
+    limit : int
+        Entries requested per page
+    """
+
+    cursor = start
+    boundary = set()
+    while True:
+        logs = await _async_since(connection, monitor_id, cursor, limit)
+        logs = [log for log in logs if log.key not in boundary and log.time]
+        logs.sort(key=lambda log: log.time)
+        for log in logs:
+            yield log
+        if logs:
+            newest = logs[-1].time
+            if newest != cursor:
+                boundary = set()
+                cursor = newest
+            boundary.update(log.key for log in logs if log.time == newest)
+        await asyncio.sleep(interval)
+
+
+class Manager:
+    def __init__(self, connection: Connection):
+        self._connection = connection
+
+    async def all(
+        self,
+        monitor_id: str = None,
+        start: datetime = None,
+        end: datetime = None,
+        limit: int = None,
+    ) -> List[Log]:
+        """
+        Get the logs of the group, or of one monitor, for the current connection
+        """
+
+        return await async_all(self._connection, monitor_id, start, end, limit)
+
+    def iter(
+        self,
+        monitor_id: str = None,
+        start: datetime = None,
+        end: datetime = None,
+        limit: int = None,
+    ) -> AsyncIterator[Log]:
+        """
+        Iterate the logs for the current connection as they are received
+        """
+
+        return async_iter(self._connection, monitor_id, start, end, limit)
+
+    def tail(
+        self,
+        monitor_id: str = None,
+        start: datetime = None,
+        interval: float = 10.0,
+        limit: int = 500,
+    ) -> AsyncIterator[Log]:
+        """
+        Follows the logs for the current connection, see async_tail
+        """
+
+        return async_tail(self._connection, monitor_id, start, interval, limit)
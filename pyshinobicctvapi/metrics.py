@@ -0,0 +1,252 @@
+"""
+Request timing and size instrumentation for Connection
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+from functools import partial
+from time import perf_counter
+from types import SimpleNamespace
+from typing import Callable, Dict, Sequence
+
+import aiohttp
+from yarl import URL
+
+# seconds
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+DNS = "dns"
+CONNECT = "connect"
+FIRST_BYTE = "first_byte"
+BODY = "body"
+DECODE = "decode"
+TOTAL = "total"
+
+
+def action_of(url) -> str:
+    """
+    The api action (monitor, videos, api...) of an action url, "other" for the rest
+    """
+    parts = URL(str(url)).path.split("/")
+    # /{token}/{action}/{group}/...
+    if len(parts) >= 4 and parts[2]:
+        return parts[2]
+    return "other"
+
+
+class Histogram:
+    """
+    Cumulative bucket histogram (prometheus style)
+    """
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q quantile
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+Observer = Callable[[str, str, float], None]
+
+
+class Metrics:
+    """
+    Per action latency histograms, payload sizes, error counts and in-flight gauges
+
+    Pass to Connection(metrics=...) so its session is traced, with a Pool
+    every connection of the pool is traced and a session passed to the
+    connection must be created with trace_configs=[trace_config()]. Phases are
+    dns, connect (including TLS), first_byte (request start to response
+    headers), body, decode and total. A request stays in flight until its
+    body is read or its response closed.
+
+    Parameters
+    ----------
+    buckets : sequence
+        Histogram bucket upper bounds in seconds
+    callback : def callback(action, phase, seconds) (optional)
+        Called for every observation
+    """
+
+    def __init__(
+        self, buckets: Sequence[float] = DEFAULT_BUCKETS, callback: Observer = None
+    ):
+        self._buckets = tuple(buckets)
+        self._callback = callback
+        self._trace_config = None
+        self.reset()
+
+    def reset(self):
+        self._latency: Dict[tuple, Histogram] = {}
+        self._bytes_received: Dict[str, int] = defaultdict(int)
+        self._bytes_sent: Dict[str, int] = defaultdict(int)
+        self._requests: Dict[str, int] = defaultdict(int)
+        self._errors: Dict[tuple, int] = defaultdict(int)
+        self._in_flight: Dict[str, int] = defaultdict(int)
+
+    def observe(self, action: str, phase: str, seconds: float):
+        histogram = self._latency.get((action, phase))
+        if histogram is None:
+            histogram = self._latency[(action, phase)] = Histogram(self._buckets)
+        histogram.observe(seconds)
+        if self._callback is not None:
+            self._callback(action, phase, seconds)
+
+    def error(self, action: str, kind: str):
+        self._errors[(action, kind)] += 1
+
+    def timer(self, action: str, phase: str) -> "_Timer":
+        """
+        Context manager observing the duration of its block
+        """
+        return _Timer(self, action, phase)
+
+    def histogram(self, action: str, phase: str) -> Histogram:
+        return self._latency.get((action, phase)) or Histogram(self._buckets)
+
+    def snapshot(self) -> dict:
+        """
+        Current values, keyed by action, suitable for scraping
+        """
+        actions = defaultdict(
+            lambda: {
+                "requests": 0,
+                "in_flight": 0,
+                "bytes_received": 0,
+                "bytes_sent": 0,
+                "errors": {},
+                "latency": {},
+            }
+        )
+        for action, count in self._requests.items():
+            actions[action]["requests"] = count
+        for action, count in self._in_flight.items():
+            actions[action]["in_flight"] = count
+        for action, size in self._bytes_received.items():
+            actions[action]["bytes_received"] = size
+        for action, size in self._bytes_sent.items():
+            actions[action]["bytes_sent"] = size
+        for (action, kind), count in self._errors.items():
+            actions[action]["errors"][kind] = count
+        for (action, phase), histogram in self._latency.items():
+            actions[action]["latency"][phase] = histogram.snapshot()
+        return dict(actions)
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """
+        aiohttp trace config feeding these metrics, the same one on every call
+        """
+        if self._trace_config is not None:
+            return self._trace_config
+        config = self._trace_config = aiohttp.TraceConfig()
+        config.on_request_start.append(self._on_request_start)
+        config.on_dns_resolvehost_start.append(self._on_dns_start)
+        config.on_dns_resolvehost_end.append(self._on_dns_end)
+        config.on_connection_create_start.append(self._on_connect_start)
+        config.on_connection_create_end.append(self._on_connect_end)
+        config.on_request_chunk_sent.append(self._on_chunk_sent)
+        config.on_response_chunk_received.append(self._on_chunk_received)
+        config.on_request_end.append(self._on_request_end)
+        config.on_request_exception.append(self._on_request_exception)
+        return config
+
+    async def _on_request_start(self, session, ctx: SimpleNamespace, params):
+        ctx.action = action_of(params.url)
+        ctx.start = perf_counter()
+        self._requests[ctx.action] += 1
+        self._in_flight[ctx.action] += 1
+
+    async def _on_dns_start(self, session, ctx: SimpleNamespace, params):
+        ctx.dns_start = perf_counter()
+
+    async def _on_dns_end(self, session, ctx: SimpleNamespace, params):
+        self.observe(ctx.action, DNS, perf_counter() - ctx.dns_start)
+
+    async def _on_connect_start(self, session, ctx: SimpleNamespace, params):
+        ctx.connect_start = perf_counter()
+
+    async def _on_connect_end(self, session, ctx: SimpleNamespace, params):
+        self.observe(ctx.action, CONNECT, perf_counter() - ctx.connect_start)
+
+    async def _on_chunk_sent(self, session, ctx: SimpleNamespace, params):
+        self._bytes_sent[ctx.action] += len(params.chunk)
+
+    async def _on_chunk_received(self, session, ctx: SimpleNamespace, params):
+        self._bytes_received[ctx.action] += len(params.chunk)
+
+    async def _on_request_end(self, session, ctx: SimpleNamespace, params):
+        # the connection is released once the body is read or the response closed
+        connection = params.response.connection
+        if connection is None:
+            self._in_flight[ctx.action] -= 1
+        else:
+            connection.add_callback(partial(self._on_released, ctx.action))
+        self.observe(ctx.action, FIRST_BYTE, perf_counter() - ctx.start)
+        if params.response.status >= 400:
+            self.error(ctx.action, str(params.response.status))
+
+    def _on_released(self, action: str):
+        self._in_flight[action] -= 1
+
+    async def _on_request_exception(self, session, ctx: SimpleNamespace, params):
+        self._in_flight[ctx.action] -= 1
+        self.error(ctx.action, type(params.exception).__name__)
+
+
+class _Timer:
+    __slots__ = ("_metrics", "_action", "_phase", "_start")
+
+    def __init__(self, metrics: Metrics, action: str, phase: str):
+        self._metrics = metrics
+        self._action = action
+        self._phase = phase
+
+    def __enter__(self):
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._metrics.observe(self._action, self._phase, perf_counter() - self._start)
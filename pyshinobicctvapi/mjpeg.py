@@ -0,0 +1,213 @@
+"""
+MJPEG (multipart/x-mixed-replace) frame parsing
+"""
+
+import asyncio
+from typing import AsyncIterator, Optional
+
+from aiohttp import StreamReader
+
+SOI = b"\xff\xd8"
+EOI = b"\xff\xd9"
+
+DEFAULT_MAX_FRAME_SIZE = 8 << 20
+# room for part headers on top of the frame size limit
+_HEADER_ROOM = 1 << 16
+
+
+def boundary_from_content_type(content_type: Optional[str]) -> Optional[bytes]:
+    """
+    Extracts the multipart boundary from a Content-Type header
+    """
+    if not content_type:
+        return None
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.strip().partition("=")
+        if name.lower() == "boundary" and value:
+            return value.strip('"').lstrip("-").encode("latin-1")
+    return None
+
+
+class FrameParser:
+    """
+    Splits a multipart MJPEG byte stream into JPEG frames
+
+    Bytes are accumulated in one reusable buffer, parts are located by
+    their boundary (or by JPEG start/end markers when the boundary is
+    unknown) and frames are copied out exactly once through a memoryview.
+
+    Parameters
+    ----------
+    boundary : bytes (optional)
+        Multipart boundary without leading dashes
+    max_frame_size : int
+        Frames larger than this are dropped
+    every : int
+        Only every n-th frame is returned, others are skipped without copying
+    """
+
+    def __init__(
+        self,
+        boundary: bytes = None,
+        max_frame_size: int = DEFAULT_MAX_FRAME_SIZE,
+        every: int = 1,
+    ):
+        self._boundary = boundary
+        self._max = max_frame_size
+        self._every = max(every, 1)
+        self._buf = bytearray()
+        self._count = 0
+        self._skip = 0
+        self.dropped = 0
+
+    def feed(self, data: bytes):
+        """
+        Appends data received from the stream
+        """
+        if self._skip:
+            # remainder of an oversized part announced by Content-Length
+            skipped = min(self._skip, len(data))
+            self._skip -= skipped
+            data = data[skipped:]
+        self._buf += data
+
+    def frames(self):
+        """
+        Yields the complete frames currently buffered
+        """
+        while True:
+            span = self._next_span()
+            if span is None:
+                return
+            start, end, consumed = span
+            if start is not None:
+                self._count += 1
+                if self._count % self._every == 0:
+                    with memoryview(self._buf) as view:
+                        frame = bytes(view[start:end])
+                    del self._buf[:consumed]
+                    yield frame
+                    continue
+            del self._buf[:consumed]
+
+    def _next_span(self):
+        """
+        Returns (start, end, consumed) of the next part, start is None for dropped parts
+        """
+        if self._boundary is None:
+            return self._next_marked()
+
+        buf = self._buf
+        delimiter = buf.find(self._boundary)
+        if delimiter < 0:
+            self._limit(len(self._boundary))
+            return None
+
+        header_end = buf.find(b"\r\n\r\n", delimiter)
+        if header_end < 0:
+            self._limit(0)
+            return None
+        body = header_end + 4
+
+        length = _content_length(bytes(buf[delimiter:header_end]))
+        if length is not None:
+            if length > self._max:
+                self.dropped += 1
+                available = len(buf) - body
+                if available >= length:
+                    return None, None, body + length
+                self._skip = length - available
+                return None, None, len(buf)
+            if len(buf) < body + length:
+                return None
+            return body, body + length, body + length
+
+        following = buf.find(self._boundary, body)
+        if following < 0:
+            if len(buf) - body > self._max:
+                self.dropped += 1
+                return None, None, max(len(buf) - len(self._boundary), body)
+            return None
+        end = following
+        # strip the dashes and line break that introduce the next boundary
+        while end > body and buf[end - 1] in b"-\r\n":
+            end -= 1
+        if end - body > self._max:
+            self.dropped += 1
+            return None, None, following
+        return body, end, following
+
+    def _next_marked(self):
+        buf = self._buf
+        start = buf.find(SOI)
+        if start < 0:
+            self._limit(1)
+            return None
+        end = buf.find(EOI, start + 2)
+        if end < 0:
+            if len(buf) - start > self._max:
+                self.dropped += 1
+                return None, None, len(buf) - 1
+            return None
+        end += 2
+        if end - start > self._max:
+            self.dropped += 1
+            return None, None, end
+        return start, end, end
+
+    def _limit(self, keep: int):
+        # nothing useful found, bound the buffer while waiting for more data
+        if len(self._buf) > self._max + _HEADER_ROOM:
+            del self._buf[: len(self._buf) - keep]
+
+
+def _content_length(headers: bytes) -> Optional[int]:
+    for line in headers.split(b"\r\n"):
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            try:
+                return int(value.strip())
+            except ValueError:
+                return None
+    return None
+
+
+async def iter_frames(
+    content: StreamReader,
+    boundary: bytes = None,
+    max_frame_size: int = DEFAULT_MAX_FRAME_SIZE,
+    max_fps: float = None,
+    every: int = 1,
+) -> AsyncIterator[bytes]:
+    """
+    Yields JPEG frames read from a multipart MJPEG stream
+
+    Parameters
+    ----------
+    content : StreamReader
+        Body of the MJPEG response
+    boundary : bytes (optional)
+        Multipart boundary, frames are found by JPEG markers if not given
+    max_frame_size : int
+        Frames larger than this are dropped
+    max_fps : float (optional)
+        Frames arriving faster than this rate are skipped
+    every : int
+        Only every n-th frame is considered
+    """
+    parser = FrameParser(boundary, max_frame_size, every)
+    interval = 1 / max_fps if max_fps else 0
+    loop = asyncio.get_running_loop()
+    last = None
+    while True:
+        data = await content.readany()
+        if not data:
+            return
+        parser.feed(data)
+        for frame in parser.frames():
+            if interval:
+                now = loop.time()
+                if last is not None and now - last < interval:
+                    continue
+                last = now
+            yield frame
@@ -2,15 +2,40 @@
 Shinobi API key management
 """
 
-import json
+import aiohttp
+
+from .codec import Codec, get_codec
+from .const import STREAM_HLS, STREAM_MJPEG
 from .entity import Entity
+from .hls import HlsFollower
+from .mjpeg import DEFAULT_MAX_FRAME_SIZE, boundary_from_content_type, iter_frames
 from .manager import Manager as EntityManager
-from typing import Dict, Iterable, Optional, List, Type, Mapping, Container, Iterator
-
+from typing import (
+    AsyncIterator,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Optional,
+    List,
+    Type,
+    Mapping,
+    Container,
+    Iterator,
+    Union,
+)
+
+from . import errors
+from .bulk import BulkResult, RateLimiter, async_bulk
 from .connection import Connection
 
 ACTION = "monitor"
 
+MODE_START = "start"
+MODE_STOP = "stop"
+MODE_RECORD = "record"
+MODES = (MODE_START, MODE_STOP, MODE_RECORD)
+
 DEFAULT = {"details": {}}
 
 
@@ -22,10 +47,13 @@ class Details:
 
 
 class Stream:
-    def __init__(self, base_url: str, url: str, typ: str):
+    def __init__(
+        self, base_url: str, url: str, typ: str, connection: Connection = None
+    ):
         self._base = base_url
         self._url = url
         self._type = typ
+        self._connection = connection
 
     @property
     def url(self):
@@ -35,18 +63,67 @@ class Stream:
     def type(self):
         return self._type
 
+    async def frames(
+        self,
+        max_fps: float = None,
+        every: int = 1,
+        max_frame_size: int = DEFAULT_MAX_FRAME_SIZE,
+        read_timeout: float = 30.0,
+    ) -> AsyncIterator[bytes]:
+        """
+        Opens the (MJPEG) stream and yields its JPEG frames
+
+        The stream is not bound by the session total timeout, it only fails
+        when no data arrives for read_timeout seconds.
+
+        Parameters
+        ----------
+        max_fps : float (optional)
+            Frames arriving faster than this rate are skipped
+        every : int
+            Only every n-th frame is considered
+        max_frame_size : int
+            Frames larger than this many bytes are dropped
+        read_timeout : float (optional)
+            Seconds without data before the stream fails, None to wait forever
+        """
+        if self._connection is None:
+            raise RuntimeError("Stream is not bound to a connection")
+
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=read_timeout)
+        async with await self._connection.open(self.url, timeout=timeout) as resp:
+            boundary = boundary_from_content_type(resp.headers.get("Content-Type"))
+            async for frame in iter_frames(
+                resp.content, boundary, max_frame_size, max_fps, every
+            ):
+                yield frame
+
+    def hls(self, **kwargs) -> HlsFollower:
+        """
+        Follows the (HLS) stream, see HlsFollower for the options
+        """
+        if self._connection is None:
+            raise RuntimeError("Stream is not bound to a connection")
+
+        return HlsFollower(self._connection, self.url, **kwargs)
+
 
 class StreamCollection(Iterable[Stream]):
     def __init__(
-        self, streams: Dict[str, List[str]], base_url: str = None, typ: str = None
+        self,
+        streams: Dict[str, List[str]],
+        base_url: str = None,
+        typ: str = None,
+        connection: Connection = None,
     ):
         self._streams = streams
         self._base_url = base_url
         self._type = typ
+        self._connection = connection
 
     def _iterateType(self, typ: str) -> Iterator[Stream]:
         for stm in self._streams[typ]:
-            yield Stream(self._base_url, stm, typ)
+            yield Stream(self._base_url, stm, typ, self._connection)
 
     def __iter__(self) -> Iterator[Stream]:
         if self._type is not None:
@@ -78,8 +155,9 @@ class TypedStreamCollection(
         streams: Dict[str, List[str]],
         order: List[str],
         base_url: str = None,
+        connection: Connection = None,
     ):
-        super().__init__(streams, base_url)
+        super().__init__(streams, base_url, connection=connection)
 
     def __len__(self):
         return 0
@@ -88,13 +166,21 @@ class TypedStreamCollection(
         if typ not in self._streams:
             return None
 
-        return StreamCollection(self._streams, self._base_url, typ)
+        return StreamCollection(self._streams, self._base_url, typ, self._connection)
 
 
 class Monitor(Entity):
-    def __init__(self, data: dict = None, base_url: str = None):
+    def __init__(
+        self,
+        data: dict = None,
+        base_url: str = None,
+        codec: Codec = None,
+        connection: Connection = None,
+    ):
         super().__init__("mid", data)
         self._base_url = base_url
+        self._codec = get_codec(codec)
+        self._connection = connection
 
     @property
     def name(self) -> Optional[str]:
@@ -135,7 +221,7 @@ class Monitor(Entity):
     @property
     def details(self):
         if not hasattr(self, "_details"):
-            self._details = json.loads(self._data.setdefault("details", "{}"))
+            self._details = self._codec.loads(self._data.get("details") or "{}")
         return Details(self._details)
 
     @property
@@ -151,15 +237,247 @@ class Monitor(Entity):
             self._data.get("streamsSortedByType", {}),
             self._data.get("streams"),
             self._base_url,
+            self._connection,
         )
 
+    def frames(
+        self,
+        max_fps: float = None,
+        every: int = 1,
+        max_frame_size: int = DEFAULT_MAX_FRAME_SIZE,
+        read_timeout: float = 30.0,
+    ) -> AsyncIterator[bytes]:
+        """
+        Yields JPEG frames from the first MJPEG stream of the monitor, see Stream.frames
+        """
+        streams = self.streams[STREAM_MJPEG]
+        stream = next(iter(streams), None) if streams is not None else None
+        if stream is None:
+            raise errors.Error(f"Monitor {self.id} has no MJPEG stream")
+        return stream.frames(max_fps, every, max_frame_size, read_timeout)
+
+    def hls(self, **kwargs) -> HlsFollower:
+        """
+        Follows the first HLS stream of the monitor, see HlsFollower
+        """
+        streams = self.streams[STREAM_HLS]
+        stream = next(iter(streams), None) if streams is not None else None
+        if stream is None:
+            raise errors.Error(f"Monitor {self.id} has no HLS stream")
+        return stream.hls(**kwargs)
+
 
 class Manager(EntityManager[Monitor]):
     def __init__(self, connection: Connection):
         super().__init__(connection, ACTION, Monitor)
 
+    def _create(self, data: dict) -> Monitor:
+        return Monitor(
+            data=data,
+            base_url=self._connection.base_url,
+            codec=self._connection.codec,
+            connection=self._connection,
+        )
+
     async def async_started(self) -> Iterable[Monitor]:
         """
         Get a list of monitors for the current connection
         """
         return map(self._create, await self._async_action_get(f"s{ACTION}"))
+
+    async def _async_set_mode(self, monitor: Union[Monitor, str], mode: str) -> dict:
+        mid = monitor.id if isinstance(monitor, Monitor) else monitor
+        json = await self._connection.get(
+            self._connection.action_url(ACTION, f"{mid}/{mode}"), cache=False
+        )
+        if isinstance(json, dict) and json.get("ok") is False:
+            raise errors.NotOk(json.get("msg"))
+        return json
+
+    def _invalidate(self):
+        self._connection.invalidate(ACTION)
+        self._connection.invalidate(f"s{ACTION}")
+
+    async def async_set_mode(self, monitor: Union[Monitor, str], mode: str) -> dict:
+        """
+        Changes the mode (start, stop or record) of a monitor
+
+        Parameters
+        ----------
+        monitor : Monitor or str
+            Monitor or monitor id
+        mode : str
+            One of MODES
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown monitor mode {mode!r}")
+        try:
+            return await self._async_set_mode(monitor, mode)
+        finally:
+            self._invalidate()
+
+    async def async_set_modes(
+        self,
+        monitors: Iterable[Union[Monitor, str]],
+        mode: str,
+        concurrency: int = 16,
+        rate: float = None,
+        limiter: RateLimiter = None,
+    ) -> List[BulkResult]:
+        """
+        Changes the mode of several monitors concurrently
+
+        Parameters
+        ----------
+        monitors : iterable
+            Monitors or monitor ids
+        mode : str
+            One of MODES
+        concurrency : int
+            Maximum number of requests in flight
+        rate : float (optional)
+            Maximum requests started per second
+        limiter : RateLimiter (optional)
+            Limiter shared with other bulk operations
+
+        Returns a result per monitor, in order, holding the response or the error
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown monitor mode {mode!r}")
+        try:
+            return await async_bulk(
+                monitors,
+                lambda monitor: self._async_set_mode(monitor, mode),
+                concurrency=concurrency,
+                rate=rate,
+                limiter=limiter,
+            )
+        finally:
+            self._invalidate()
+
+    async def async_start_many(
+        self, monitors: Iterable[Union[Monitor, str]], **kwargs
+    ) -> List[BulkResult]:
+        return await self.async_set_modes(monitors, MODE_START, **kwargs)
+
+    async def async_stop_many(
+        self, monitors: Iterable[Union[Monitor, str]], **kwargs
+    ) -> List[BulkResult]:
+        return await self.async_set_modes(monitors, MODE_STOP, **kwargs)
+
+    async def async_record_many(
+        self, monitors: Iterable[Union[Monitor, str]], **kwargs
+    ) -> List[BulkResult]:
+        return await self.async_set_modes(monitors, MODE_RECORD, **kwargs)
+
+    def registry(self, started: bool = False) -> "MonitorRegistry":
+        """
+        Creates a registry tracking the monitors of the current connection
+        """
+        return MonitorRegistry(self, started)
+
+
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+
+class MonitorEvent:
+    """
+    A change detected by MonitorRegistry
+    """
+
+    __slots__ = ("type", "monitor", "changed")
+
+    def __init__(self, type: str, monitor: Monitor, changed: FrozenSet[str] = None):
+        self.type = type
+        self.monitor = monitor
+        self.changed = changed or frozenset()
+
+    def __repr__(self):
+        return f"<MonitorEvent {self.type} {self.monitor.id} {sorted(self.changed)}>"
+
+
+class MonitorRegistry(Mapping[str, Monitor]):
+    """
+    Identity map of monitors kept current by refresh
+
+    Monitor objects are created once per mid and updated in place, so
+    references held by callers stay valid. Each refresh reports only the
+    monitors that were added, removed or changed.
+
+    Parameters
+    ----------
+    manager : Manager
+        Manager used to fetch monitors
+    started : bool
+        Track only started monitors
+    """
+
+    def __init__(self, manager: "Manager", started: bool = False):
+        self._manager = manager
+        self._started = started
+        self._monitors: Dict[str, Monitor] = {}
+        self._listeners: List[Callable[[MonitorEvent], None]] = []
+
+    def __getitem__(self, mid: str) -> Monitor:
+        return self._monitors[mid]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._monitors)
+
+    def __len__(self):
+        return len(self._monitors)
+
+    def add_listener(
+        self, listener: Callable[[MonitorEvent], None]
+    ) -> Callable[[], None]:
+        """
+        Registers a callback for change events, returns a function removing it
+        """
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    def apply(self, monitors: Iterable[dict]) -> List[MonitorEvent]:
+        """
+        Applies a raw monitor listing and returns the resulting events
+        """
+        events = []
+        seen = set()
+        for data in monitors:
+            mid = data.get("mid")
+            seen.add(mid)
+            monitor = self._monitors.get(mid)
+            if monitor is None:
+                monitor = self._monitors[mid] = self._manager._create(data)
+                events.append(MonitorEvent(ADDED, monitor))
+                continue
+
+            old = monitor._data
+            if old == data:
+                continue
+            changed = frozenset(
+                key for key in old.keys() | data.keys() if old.get(key) != data.get(key)
+            )
+            if "details" in changed and hasattr(monitor, "_details"):
+                del monitor._details
+            monitor._data = data
+            events.append(MonitorEvent(CHANGED, monitor, changed))
+
+        for mid in [mid for mid in self._monitors if mid not in seen]:
+            events.append(MonitorEvent(REMOVED, self._monitors.pop(mid)))
+
+        for event in events:
+            for listener in list(self._listeners):
+                listener(event)
+        return events
+
+    async def async_refresh(self) -> List[MonitorEvent]:
+        """
+        Fetches the monitors and applies the differences
+        """
+        if self._started:
+            data = await self._manager._async_action_get(f"s{ACTION}")
+        else:
+            data = await self._manager._async_all()
+        return self.apply(data)
@@ -0,0 +1,150 @@
+"""
+Retry policies and circuit breaking for Connection requests
+"""
+
+import asyncio
+import random
+from time import monotonic
+from typing import Callable, Iterable
+
+import aiohttp
+
+from . import errors
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class RetryPolicy:
+    """
+    When and how often failed requests are retried
+
+    Parameters
+    ----------
+    attempts : int
+        Total attempts including the first one
+    backoff : float
+        Base delay in seconds, doubled for every further attempt
+    max_backoff : float
+        Largest delay between attempts
+    jitter : bool
+        Randomize delays (full jitter) so clients do not retry in lockstep
+    deadline : float (optional)
+        Seconds allowed for all attempts together
+    statuses : iterable
+        HTTP statuses considered transient
+    retry_post : bool
+        Also retry POST requests, they are only retried when marked idempotent otherwise
+    """
+
+    def __init__(
+        self,
+        attempts: int = 3,
+        backoff: float = 0.2,
+        max_backoff: float = 5.0,
+        jitter: bool = True,
+        deadline: float = None,
+        statuses: Iterable[int] = (500, 502, 503, 504),
+        retry_post: bool = False,
+    ):
+        self.attempts = max(attempts, 1)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.deadline = deadline
+        self.statuses = frozenset(statuses)
+        self.retry_post = retry_post
+
+    def delay(self, attempt: int) -> float:
+        """
+        Seconds to wait before the given (1 based) retry
+        """
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        if self.jitter:
+            return random.uniform(0, delay)
+        return delay
+
+    def is_transient(self, error: BaseException) -> bool:
+        """
+        Whether error is a server or transport failure worth retrying
+        """
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in self.statuses
+        return isinstance(
+            error,
+            (
+                aiohttp.ClientConnectionError,
+                aiohttp.ClientPayloadError,
+                asyncio.TimeoutError,
+            ),
+        )
+
+
+NO_RETRY = RetryPolicy(attempts=1)
+
+
+class CircuitBreaker:
+    """
+    Fails fast while a server keeps failing, probing it again after a pause
+
+    After failure_threshold consecutive transient failures the circuit opens
+    and requests raise errors.CircuitOpen without being sent. Once
+    recovery_time has passed a single probe request is let through, its
+    success closes the circuit and its failure opens it again.
+
+    Share one breaker between the connections of the same server.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_time: float = 30.0,
+        clock: Callable[[], float] = None,
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self._clock = clock or monotonic
+        self._state = CLOSED
+        self._failures = 0
+        self._opened = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def before(self):
+        """
+        Raises errors.CircuitOpen if a request may not be sent now
+        """
+        if self._state == CLOSED:
+            return
+        if self._state == OPEN:
+            remaining = self.recovery_time - (self._clock() - self._opened)
+            if remaining > 0:
+                raise errors.CircuitOpen(
+                    "Server is failing, circuit is open", remaining
+                )
+            self._state = HALF_OPEN
+        if self._probing:
+            raise errors.CircuitOpen("Server is being probed, circuit is half open")
+        self._probing = True
+
+    def success(self):
+        self._state = CLOSED
+        self._failures = 0
+        self._probing = False
+
+    def release(self):
+        """
+        Ends a request whose outcome is unknown (cancelled) without changing state
+        """
+        self._probing = False
+
+    def failure(self):
+        self._probing = False
+        self._failures += 1
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            self._state = OPEN
+            self._opened = self._clock()
@@ -0,0 +1,184 @@
+"""
+Concurrent snapshot polling for many monitors
+"""
+
+import asyncio
+import hashlib
+import inspect
+import os
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Union
+
+from .connection import Connection
+from .monitors import Manager, Monitor
+
+Callback = Callable[[Monitor, bytes], Union[None, Awaitable[None]]]
+
+
+class _State:
+    __slots__ = ("monitor", "etag", "last_modified", "digest", "due", "error")
+
+    def __init__(self, monitor: Monitor):
+        self.monitor = monitor
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.digest: Optional[bytes] = None
+        self.due = 0.0
+        self.error: Optional[BaseException] = None
+
+
+def _write(path: str, data: bytes):
+    partial = path + ".part"
+    try:
+        with open(partial, "wb") as file:
+            file.write(data)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+
+class SnapshotPoller:
+    """
+    Fetches monitor snapshots concurrently, skipping unchanged images
+
+    Unchanged images are detected with conditional requests when the
+    server supports them and by content hash otherwise. New images are
+    passed to callback and/or written to directory as ``{mid}.jpg``, the
+    file is written off the event loop. When running, every monitor is
+    polled on its own schedule so a slow camera does not delay the others.
+
+    Parameters
+    ----------
+    monitors : iterable
+        Monitors to poll
+    interval : float
+        Seconds between polls of each monitor
+    concurrency : int
+        Maximum number of snapshots fetched at once
+    callback : callable (optional)
+        Called (or awaited) with the monitor and image bytes of new snapshots
+    directory : str (optional)
+        Directory new snapshots are written to
+    connection : Connection (optional)
+        Connection used for monitors not bound to one
+    timeout : float (optional)
+        Seconds allowed for one snapshot, None for the session timeout
+    """
+
+    def __init__(
+        self,
+        monitors: Iterable[Monitor],
+        interval: float = 5.0,
+        concurrency: int = 8,
+        callback: Callback = None,
+        directory: str = None,
+        connection: Connection = None,
+        timeout: Optional[float] = 10.0,
+    ):
+        self._states = {m.id: _State(m) for m in monitors if m.snapshot}
+        self.interval = interval
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._callback = callback
+        self._directory = directory
+        self._connection = connection
+        self.timeout = timeout
+
+    @classmethod
+    async def async_from_manager(cls, manager: Manager, **kwargs) -> "SnapshotPoller":
+        """
+        Creates a poller for every monitor of a manager
+        """
+        return cls(await manager.async_all(), **kwargs)
+
+    @property
+    def errors(self) -> Dict[str, BaseException]:
+        """
+        Last error of monitors whose latest poll failed
+        """
+        return {
+            mid: state.error
+            for mid, state in self._states.items()
+            if state.error is not None
+        }
+
+    async def async_poll_once(self, mids: Iterable[str] = None) -> Dict[str, bool]:
+        """
+        Polls the monitors (all by default) once
+
+        Returns whether a new image was received, keyed by monitor id
+        """
+        if mids is None:
+            states = list(self._states.values())
+        else:
+            states = [self._states[mid] for mid in mids]
+        results = await asyncio.gather(*map(self._poll, states))
+        return {state.monitor.id: changed for state, changed in zip(states, results)}
+
+    async def run(self):
+        """
+        Polls every monitor at its interval until cancelled
+        """
+        tasks = [asyncio.ensure_future(self._follow(s)) for s in self._states.values()]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _follow(self, state: _State):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(max(state.due - loop.time(), 0))
+            await self._poll(state)
+
+    async def _poll(self, state: _State) -> bool:
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            state.due = loop.time() + self.interval
+            try:
+                changed = await asyncio.wait_for(self._fetch(state), self.timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                state.error = err
+                return False
+            state.error = None
+            return changed
+
+    async def _fetch(self, state: _State) -> bool:
+        monitor = state.monitor
+        connection = monitor._connection or self._connection
+        if connection is None:
+            raise RuntimeError(f"Monitor {monitor.id} is not bound to a connection")
+
+        headers = {}
+        if state.etag is not None:
+            headers["If-None-Match"] = state.etag
+        if state.last_modified is not None:
+            headers["If-Modified-Since"] = state.last_modified
+
+        async with await connection.open(monitor.snapshot, headers) as resp:
+            if resp.status == 304:
+                return False
+            state.etag = resp.headers.get("ETag")
+            state.last_modified = resp.headers.get("Last-Modified")
+            data = await resp.read()
+
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        if digest == state.digest:
+            return False
+        if self._directory is not None:
+            path = os.path.join(self._directory, f"{monitor.id}.jpg")
+            await asyncio.get_running_loop().run_in_executor(None, _write, path, data)
+        state.digest = digest
+        await self._deliver(monitor, data)
+        return True
+
+    async def _deliver(self, monitor: Monitor, data: bytes):
+        if self._callback is None:
+            return
+        result = self._callback(monitor, data)
+        if inspect.isawaitable(result):
+            await result
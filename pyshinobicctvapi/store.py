@@ -0,0 +1,75 @@
+"""
+Persisted login sessions so short lived processes can skip logging in
+"""
+
+import json
+import os
+import time
+from typing import Dict, Optional
+
+
+class FileSessionStore:
+    """
+    Keeps discovered port, auth token and group per host and user in a json file
+
+    The file is only readable by its owner and never holds passwords.
+
+    Parameters
+    ----------
+    path : str
+        File holding the sessions
+    ttl : float
+        Seconds a saved session is reused before logging in again
+    """
+
+    def __init__(self, path: str, ttl: float = 12 * 60 * 60):
+        self.path = os.path.expanduser(path)
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(host: str, email: str) -> str:
+        return f"{email}@{host}"
+
+    def _read(self) -> Dict[str, dict]:
+        try:
+            with open(self.path) as file:
+                sessions = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        return sessions if isinstance(sessions, dict) else {}
+
+    def _write(self, sessions: Dict[str, dict]):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        partial = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as file:
+            json.dump(sessions, file)
+        os.replace(partial, self.path)
+
+    def load(self, host: str, email: str) -> Optional[dict]:
+        """
+        Returns the saved session (port, token, group) if it has not expired
+        """
+        session = self._read().get(self._key(host, email))
+        if session is None or session.get("expires", 0) < time.time():
+            return None
+        return session
+
+    def save(self, host: str, email: str, port: int, token: str, group: str):
+        sessions = self._read()
+        now = time.time()
+        sessions = {k: v for k, v in sessions.items() if v.get("expires", 0) >= now}
+        sessions[self._key(host, email)] = {
+            "port": port,
+            "token": token,
+            "group": group,
+            "expires": now + self.ttl,
+        }
+        self._write(sessions)
+
+    def discard(self, host: str, email: str):
+        sessions = self._read()
+        if sessions.pop(self._key(host, email), None) is not None:
+            self._write(sessions)
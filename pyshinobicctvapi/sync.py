@@ -0,0 +1,188 @@
+"""
+Blocking facade running the async client on a persistent background loop
+"""
+
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Coroutine, Iterable, List, Union
+
+from . import Client
+from .api import Key
+from .connection import Connection
+from .monitors import Monitor
+from .videos import Video
+
+
+class _SyncManager:
+    def __init__(self, client: "SyncClient"):
+        self._client = client
+
+    def _run(self, coro: Coroutine):
+        return self._client.run(coro)
+
+
+class SyncMonitors(_SyncManager):
+    def all(self) -> List[Monitor]:
+        async def call():
+            return list(await self._client.client.monitors.async_all())
+
+        return self._run(call())
+
+    def started(self) -> List[Monitor]:
+        async def call():
+            return list(await self._client.client.monitors.async_started())
+
+        return self._run(call())
+
+    def get(self, id: str) -> Monitor:
+        return self._run(self._client.client.monitors.async_get(id))
+
+    def get_many(self, ids: Iterable[str]) -> List[Monitor]:
+        """
+        Gets several monitors concurrently
+        """
+        return self._client.batch(
+            *(lambda client, id=id: client.monitors.async_get(id) for id in ids)
+        )
+
+
+class SyncVideos(_SyncManager):
+    def all(self, start: datetime = None, end: datetime = None) -> List[Video]:
+        return self._run(self._client.client.videos.all(start, end))
+
+    def all_chunked(
+        self, start: datetime, end: datetime, window: timedelta = None, **kwargs
+    ) -> List[Video]:
+        return self._run(
+            self._client.client.videos.all_chunked(start, end, window, **kwargs)
+        )
+
+    def download(self, video: Video, path: str = None, **kwargs) -> str:
+        return self._run(self._client.client.videos.download(video, path, **kwargs))
+
+    def download_many(
+        self, videos: Iterable[Video], directory: str = ".", **kwargs
+    ) -> List[Union[str, BaseException]]:
+        return self._run(
+            self._client.client.videos.download_many(videos, directory, **kwargs)
+        )
+
+
+class SyncApi(_SyncManager):
+    def all(self) -> List[Key]:
+        return self._run(self._client.client.api.all())
+
+    def add(self, key: Union[Key, dict]) -> Key:
+        return self._run(self._client.client.api.add(key))
+
+    def delete(self, key: Union[Key, dict]):
+        return self._run(self._client.client.api.delete(key))
+
+
+class SyncClient:
+    """
+    Thread safe blocking Shinobi API Client
+
+    One event loop runs in a background thread for the life of the client,
+    so every call reuses the same session, pooled sockets and TLS sessions
+    instead of paying for a new loop and session per call.
+
+    Parameters
+    ----------
+    connection : Connection
+        Connection used by the client, it is closed with the client
+    timeout : float (optional)
+        Seconds a blocking call waits for its result
+    """
+
+    def __init__(self, connection: Connection, timeout: float = None):
+        self.timeout = timeout
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="pyshinobicctvapi", daemon=True
+        )
+        self._thread.start()
+        self._client = Client(connection)
+        self._monitors = SyncMonitors(self)
+        self._videos = SyncVideos(self)
+        self._api = SyncApi(self)
+
+    @property
+    def client(self) -> Client:
+        """
+        The async client, only use it from coroutines run by this client
+        """
+        return self._client
+
+    @property
+    def connection(self) -> Connection:
+        return self._client.connection
+
+    @property
+    def monitors(self) -> SyncMonitors:
+        return self._monitors
+
+    @property
+    def videos(self) -> SyncVideos:
+        return self._videos
+
+    @property
+    def api(self) -> SyncApi:
+        return self._api
+
+    def run(self, coro: Coroutine, timeout: float = None) -> Any:
+        """
+        Runs a coroutine on the background loop and waits for its result
+        """
+        if self._loop.is_closed():
+            coro.close()
+            raise RuntimeError("SyncClient is closed")
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(self.timeout if timeout is None else timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def login(self, email: str, password: str) -> "SyncClient":
+        self.run(self.connection.login(email, password))
+        return self
+
+    def batch(
+        self,
+        *calls: Callable[[Client], Awaitable[Any]],
+        return_exceptions: bool = False,
+    ) -> List[Any]:
+        """
+        Runs several calls concurrently, each receives the async client
+
+        e.g. ``client.batch(lambda c: c.monitors.async_get("a"), lambda c: c.api.all())``
+        """
+
+        async def gather():
+            return await asyncio.gather(
+                *(call(self._client) for call in calls),
+                return_exceptions=return_exceptions,
+            )
+
+        return self.run(gather())
+
+    def close(self):
+        """
+        Closes the connection and stops the background loop
+        """
+        if self._loop.is_closed():
+            return
+        try:
+            self.run(self._client.async_close())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
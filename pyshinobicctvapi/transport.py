@@ -0,0 +1,132 @@
+"""
+HTTP transport (connection pool) configuration
+"""
+
+import aiohttp
+from typing import Iterable, Optional
+
+
+class TransportConfig:
+    """
+    Tuning for the aiohttp session a Connection creates
+
+    Parameters
+    ----------
+    limit : int
+        Total simultaneous sockets, 0 for unlimited
+    limit_per_host : int
+        Simultaneous sockets per server, 0 for unlimited
+    keepalive_timeout : float
+        Seconds an idle socket is kept open for reuse
+    dns_cache_ttl : int
+        Seconds resolved addresses are cached, None caches forever
+    connect_timeout : float (optional)
+        Seconds allowed to establish a connection (including TLS)
+    read_timeout : float (optional)
+        Seconds allowed between reads of a response body
+    total_timeout : float (optional)
+        Seconds allowed for a whole request
+    compress : bool
+        Compress request bodies (deflate), responses are always decompressed
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 0,
+        keepalive_timeout: float = 15.0,
+        dns_cache_ttl: Optional[int] = 10,
+        connect_timeout: float = None,
+        read_timeout: float = None,
+        total_timeout: float = 300.0,
+        compress: bool = False,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.compress = compress
+
+    def create_connector(self) -> aiohttp.TCPConnector:
+        return aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=self.dns_cache_ttl != 0,
+            ttl_dns_cache=self.dns_cache_ttl,
+        )
+
+    def create_timeout(self) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(
+            total=self.total_timeout,
+            sock_connect=self.connect_timeout,
+            sock_read=self.read_timeout,
+        )
+
+    def create_session(
+        self, trace_configs: Iterable[aiohttp.TraceConfig] = None
+    ) -> aiohttp.ClientSession:
+        return aiohttp.ClientSession(
+            connector=self.create_connector(),
+            timeout=self.create_timeout(),
+            auto_decompress=True,
+            trace_configs=list(trace_configs) if trace_configs else None,
+        )
+
+
+class Pool:
+    """
+    A tuned session shared by many Connection objects
+
+    The session is created on first use and closed when the last
+    connection using it is closed.
+    """
+
+    def __init__(
+        self,
+        config: TransportConfig = None,
+        trace_configs: Iterable[aiohttp.TraceConfig] = None,
+    ):
+        self._config = config or TransportConfig()
+        self._trace_configs = list(trace_configs or ())
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._users = 0
+
+    @property
+    def config(self) -> TransportConfig:
+        return self._config
+
+    def add_trace_config(self, trace_config: aiohttp.TraceConfig):
+        """
+        Traces the pool session, must be called before the session is opened
+        """
+        if trace_config in self._trace_configs:
+            return
+        if self._session is not None and not self._session.closed:
+            raise RuntimeError("Trace configs must be added before the pool is used")
+        self._trace_configs.append(trace_config)
+
+    def acquire(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = self._config.create_session(self._trace_configs)
+        self._users += 1
+        return self._session
+
+    async def release(self):
+        self._users = max(self._users - 1, 0)
+        if self._users == 0:
+            await self.close()
+
+    async def close(self):
+        session, self._session = self._session, None
+        if session is not None and not session.closed:
+            await session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
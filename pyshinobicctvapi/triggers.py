@@ -0,0 +1,216 @@
+"""
+Queued injection of motion triggers with per monitor coalescing
+"""
+
+import asyncio
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+from . import errors
+from .bulk import RateLimiter
+from .connection import Connection
+from .metrics import Histogram
+
+ACTION = "motion"
+
+DEFAULT_DATA = {"plug": "pyshinobicctvapi", "name": "trigger", "reason": "motion"}
+
+
+class Trigger:
+    __slots__ = ("monitor_id", "data", "created")
+
+    def __init__(self, monitor_id: str, data: dict, created: float):
+        self.monitor_id = monitor_id
+        self.data = data
+        self.created = created
+
+    def __repr__(self):
+        return f"<Trigger {self.monitor_id} {self.data!r}>"
+
+
+class TriggerPipeline:
+    """
+    Dispatches motion triggers to the server through a bounded queue
+
+    A monitor has at most one trigger queued: triggers arriving while one
+    is queued replace its data, and triggers arriving within window seconds
+    of the last accepted one are dropped as duplicates. Queued triggers are
+    sent by concurrency workers over the connection; when the queue is full
+    put drops the trigger and async_put waits for room. Triggers are sent
+    once, ignoring the connection retry policy, and counted as failed when
+    the request fails or the server answers ok: false.
+
+    Parameters
+    ----------
+    connection : Connection
+        Connection triggers are sent with
+    window : float
+        Seconds during which repeated triggers of a monitor are coalesced
+    concurrency : int
+        Maximum number of triggers in flight
+    queue_size : int
+        Maximum number of monitors with a queued trigger
+    rate : float (optional)
+        Maximum triggers sent per second
+    """
+
+    def __init__(
+        self,
+        connection: Connection,
+        window: float = 1.0,
+        concurrency: int = 4,
+        queue_size: int = 1000,
+        rate: float = None,
+    ):
+        self._connection = connection
+        self.window = window
+        self.concurrency = concurrency
+        self._limiter = RateLimiter(rate, concurrency) if rate else None
+        self._queue: Optional[asyncio.Queue] = None
+        self._queue_size = queue_size
+        self._pending: Dict[str, Trigger] = {}
+        self._accepted: Dict[str, float] = {}
+        self._workers: List[asyncio.Task] = []
+        self._closed = False
+        self.latency = Histogram()
+        self.error: Optional[BaseException] = None
+        self._counts = dict.fromkeys(
+            ("accepted", "coalesced", "dropped", "sent", "failed"), 0
+        )
+
+    @property
+    def stats(self) -> dict:
+        """
+        Counters, queue depth and the send latency (queued to answered) histogram
+        """
+        return {
+            **self._counts,
+            "queued": len(self._pending),
+            "latency": self.latency.snapshot(),
+        }
+
+    def _start(self):
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(self._queue_size)
+        self._workers = [
+            asyncio.ensure_future(self._work()) for _ in range(self.concurrency)
+        ]
+
+    def _coalesce(self, mid: str, data: dict, now: float) -> bool:
+        pending = self._pending.get(mid)
+        if pending is not None:
+            pending.data = data
+            self._counts["coalesced"] += 1
+            return True
+        accepted = self._accepted.get(mid)
+        if accepted is not None and now - accepted < self.window:
+            self._counts["coalesced"] += 1
+            return True
+        return False
+
+    def put(self, monitor_id: str, data: dict = None) -> bool:
+        """
+        Queues a trigger without waiting, returns False when it was dropped
+
+        Parameters
+        ----------
+        monitor_id : str
+            Monitor to trigger
+        data : dict (optional)
+            Trigger details (plug, name, reason, confidence...)
+        """
+        if self._closed:
+            raise RuntimeError("TriggerPipeline is closed")
+        self._start()
+        data = {**DEFAULT_DATA, **(data or {})}
+        now = asyncio.get_running_loop().time()
+        if self._coalesce(monitor_id, data, now):
+            return True
+        if self._queue.full():
+            self._counts["dropped"] += 1
+            return False
+        self._accept(monitor_id, data, now)
+        self._queue.put_nowait(monitor_id)
+        return True
+
+    async def async_put(self, monitor_id: str, data: dict = None):
+        """
+        Queues a trigger, waiting for room in the queue
+        """
+        if self._closed:
+            raise RuntimeError("TriggerPipeline is closed")
+        self._start()
+        data = {**DEFAULT_DATA, **(data or {})}
+        now = asyncio.get_running_loop().time()
+        if self._coalesce(monitor_id, data, now):
+            return
+        # registered before waiting so later triggers coalesce into this one
+        self._accept(monitor_id, data, now)
+        try:
+            await self._queue.put(monitor_id)
+        except asyncio.CancelledError:
+            self._pending.pop(monitor_id, None)
+            raise
+
+    def _accept(self, mid: str, data: dict, now: float):
+        self._pending[mid] = Trigger(mid, data, now)
+        self._accepted[mid] = now
+        self._counts["accepted"] += 1
+
+    def url(self, monitor_id: str, data: dict) -> str:
+        query = quote(self._connection.codec.dumps(data), safe="")
+        return self._connection.action_url(ACTION, monitor_id) + "?data=" + query
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            mid = await self._queue.get()
+            try:
+                trigger = self._pending.pop(mid)
+                if self._limiter is not None:
+                    await self._limiter.acquire()
+                try:
+                    # never retried, a struggling server must not get more load
+                    json = await self._connection.get(
+                        self.url(mid, trigger.data), cache=False, retry=False
+                    )
+                    if isinstance(json, dict) and json.get("ok") is False:
+                        raise errors.NotOk(json.get("msg"))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as err:
+                    self.error = err
+                    self._counts["failed"] += 1
+                else:
+                    self._counts["sent"] += 1
+                self.latency.observe(loop.time() - trigger.created)
+            finally:
+                self._queue.task_done()
+
+    async def async_flush(self):
+        """
+        Waits until every queued trigger was sent
+        """
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def async_close(self, flush: bool = True):
+        """
+        Stops the workers, sending the queued triggers first unless flush is False
+        """
+        self._closed = True
+        if flush:
+            await self.async_flush()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._counts["dropped"] += len(self._pending)
+        self._pending.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.async_close()
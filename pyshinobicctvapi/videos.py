@@ -1,12 +1,37 @@
-from typing import List
+import asyncio
+import os
+from typing import AsyncIterator, Callable, Iterable, List, Optional, Union
 
 from .connection import Connection
+from .download import async_download
 
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 ACTION = "videos"
 
 
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parses the ISO 8601 timestamps Shinobi uses for video times
+    """
+    if not value:
+        return None
+    if value[-1] in "zZ":
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value)
+
+
+def _utc(time: Optional[datetime]) -> Optional[datetime]:
+    """
+    time as an aware UTC datetime, naive times are taken as local time
+    """
+    return None if time is None else time.astimezone(timezone.utc)
+
+
+# sorts videos without a start time first
+_NO_TIME = datetime.min.replace(tzinfo=timezone.utc)
+
+
 class Video:
     """
     Shinobi Video API
@@ -15,14 +40,54 @@ class Video:
     def __init__(self, video: dict = None):
         self._video = video or {}
 
+    @property
+    def monitor_id(self) -> Optional[str]:
+        return self._video.get("mid")
 
-async def async_all(
-    connection: Connection, start: datetime = None, end: datetime = None
-) -> List[Video]:
-    """
-    Get a list of videos for the specified connection
-    """
+    @property
+    def group(self) -> Optional[str]:
+        return self._video.get("ke")
+
+    @property
+    def filename(self) -> Optional[str]:
+        return self._video.get("filename")
+
+    @property
+    def ext(self) -> Optional[str]:
+        return self._video.get("ext")
+
+    @property
+    def size(self) -> Optional[int]:
+        return self._video.get("size")
+
+    @property
+    def status(self) -> Optional[int]:
+        return self._video.get("status")
+
+    @property
+    def href(self) -> Optional[str]:
+        return self._video.get("href")
 
+    @property
+    def download_name(self) -> str:
+        """
+        File name used when downloading the video
+        """
+        filename = self.filename or os.path.basename(self.href or "")
+        if self.ext and not filename.endswith("." + self.ext):
+            filename += "." + self.ext
+        return f"{self.monitor_id}_{filename}" if self.monitor_id else filename
+
+    @property
+    def start(self) -> Optional[datetime]:
+        return parse_time(self._video.get("time"))
+
+    @property
+    def end(self) -> Optional[datetime]:
+        return parse_time(self._video.get("end"))
+
+
+def _url(connection: Connection, start: datetime = None, end: datetime = None) -> str:
     url = connection.action_url(ACTION)
     if start is not None:
         url += "?start=%s" % start.isoformat()
@@ -30,10 +95,138 @@ async def async_all(
     if end is not None:
         url += ("?" if url.find("?") < 0 else "&") + ("end=%s" % end.isoformat())
 
-    json = await connection.get(url)
+    return url
+
+
+async def async_all(
+    connection: Connection, start: datetime = None, end: datetime = None
+) -> List[Video]:
+    """
+    Get a list of videos for the specified connection
+    """
+
+    json = await connection.get(_url(connection, start, end))
     return list(map(Video, json["videos"]))
 
 
+async def async_iter(
+    connection: Connection, start: datetime = None, end: datetime = None
+) -> AsyncIterator[Video]:
+    """
+    Iterate the videos for the specified connection as they are received
+
+    The listing is parsed incrementally so memory use does not grow with
+    the number of videos.
+    """
+
+    async for video in connection.iter_array(_url(connection, start, end), "videos"):
+        yield Video(video)
+
+
+def windows(
+    start: datetime,
+    end: datetime,
+    window: timedelta = None,
+    chunks: int = None,
+    expected: int = None,
+    per_window: int = 1000,
+) -> List[tuple]:
+    """
+    Splits start..end into consecutive (start, end) windows
+
+    The window length, the number of chunks, or the expected number of
+    videos in the range (split into windows of about per_window videos,
+    assuming they are evenly spread) is used, defaulting to one hour windows.
+    """
+    if window is not None and window <= timedelta(0):
+        raise ValueError("window must be positive")
+    if chunks is not None and chunks < 1:
+        raise ValueError("chunks must be at least 1")
+    if expected is not None:
+        if per_window < 1:
+            raise ValueError("per_window must be at least 1")
+        chunks = max(-(-expected // per_window), 1)
+    if end <= start:
+        return [(start, end)]
+    if window is None:
+        if chunks:
+            window = (end - start) / chunks
+            if window <= timedelta(0):
+                raise ValueError("Too many chunks for the time range")
+        else:
+            window = timedelta(hours=1)
+
+    bounds = []
+    current = start
+    while current < end:
+        upper = min(current + window, end)
+        bounds.append((current, upper))
+        current = upper
+    return bounds
+
+
+async def async_all_chunked(
+    connection: Connection,
+    start: datetime,
+    end: datetime,
+    window: timedelta = None,
+    chunks: int = None,
+    concurrency: int = 4,
+    expected: int = None,
+    per_window: int = 1000,
+) -> List[Video]:
+    """
+    Get a list of videos for a long time range using many smaller requests
+
+    The range is split into windows (by length, into a number of chunks, or
+    by the expected number of videos) fetched concurrently, results are
+    merged in start time order and videos returned by two adjacent windows
+    are only kept once.
+
+    Parameters
+    ----------
+    connection : Connection
+        The connection object to use
+    start : datetime
+        Start of the range
+    end : datetime
+        End of the range
+    window : timedelta (optional)
+        Length of each window, defaults to one hour unless chunks is given
+    chunks : int (optional)
+        Number of windows to split the range into
+    concurrency : int
+        Maximum number of windows fetched at once
+    expected : int (optional)
+        Expected number of videos in the range, e.g. from a previous listing
+        total, used to size windows of about per_window videos
+    per_window : int
+        Videos wanted per request when expected is given
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(bounds):
+        async with semaphore:
+            return await async_all(connection, *bounds)
+
+    bounds = windows(start, end, window, chunks, expected, per_window)
+    results = await asyncio.gather(*map(fetch, bounds))
+
+    seen = set()
+    merged = []
+    for videos in results:
+        for video in videos:
+            key = (video.monitor_id, video.filename or video._video.get("time"))
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(video)
+
+    merged.sort(key=lambda v: (_utc(v.start) or _NO_TIME, v.monitor_id or ""))
+    return merged
+
+
 class Manager:
     def __init__(self, connection: Connection):
         self._connection = connection
@@ -43,4 +236,106 @@ class Manager:
         Get a list of videos for the current connection
         """
 
-        return async_all(self._connection, start, end)
+        return await async_all(self._connection, start, end)
+
+    async def all_chunked(
+        self,
+        start: datetime,
+        end: datetime,
+        window: timedelta = None,
+        chunks: int = None,
+        concurrency: int = 4,
+        expected: int = None,
+        per_window: int = 1000,
+    ) -> List[Video]:
+        """
+        Get a list of videos for a long time range using concurrent windowed requests
+        """
+
+        return await async_all_chunked(
+            self._connection,
+            start,
+            end,
+            window,
+            chunks,
+            concurrency,
+            expected,
+            per_window,
+        )
+
+    def iter(
+        self, start: datetime = None, end: datetime = None
+    ) -> AsyncIterator[Video]:
+        """
+        Iterate the videos for the current connection as they are received
+        """
+
+        return async_iter(self._connection, start, end)
+
+    async def download(
+        self,
+        video: Video,
+        path: str = None,
+        directory: str = ".",
+        segments: int = 1,
+        progress: Callable[[int, Optional[int]], None] = None,
+        **kwargs,
+    ) -> str:
+        """
+        Downloads a video, resuming a previous partial download
+
+        Parameters
+        ----------
+        video : Video
+            Video to download
+        path : str (optional)
+            Destination file, defaults to the video name inside directory
+        directory : str
+            Directory used when path is not given
+        segments : int
+            Number of ranges fetched in parallel for large files
+        progress : def callback(done, total) (optional)
+            Called as bytes are written
+        """
+
+        if video.href is None:
+            raise ValueError("Video has no download url")
+        if path is None:
+            path = os.path.join(directory, video.download_name)
+
+        return await async_download(
+            self._connection, video.href, path, segments, progress=progress, **kwargs
+        )
+
+    async def download_many(
+        self,
+        videos: Iterable[Video],
+        directory: str = ".",
+        concurrency: int = 4,
+        segments: int = 1,
+        progress: Callable[[Video, int, Optional[int]], None] = None,
+        **kwargs,
+    ) -> List[Union[str, BaseException]]:
+        """
+        Downloads many videos with bounded concurrency
+
+        Returns the path of each downloaded video or the error that stopped it,
+        in the order the videos were given.
+        """
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(video: Video):
+            report = None
+            if progress is not None:
+                report = lambda done, total: progress(video, done, total)
+            async with semaphore:
+                return await self.download(
+                    video,
+                    directory=directory,
+                    segments=segments,
+                    progress=report,
+                    **kwargs,
+                )
+
+        return await asyncio.gather(*map(fetch, videos), return_exceptions=True)
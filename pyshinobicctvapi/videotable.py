@@ -0,0 +1,260 @@
+"""
+Compact column oriented storage for large video listings
+"""
+
+from array import array
+from datetime import datetime, timezone
+from math import isnan, nan
+from typing import (
+    AsyncIterable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Union,
+)
+
+from .videos import Video, parse_time
+
+Time = Union[datetime, float, None]
+
+
+def _timestamp(value: Time) -> float:
+    if value is None:
+        return nan
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+class VideoRow:
+    """
+    Read only view of one video stored in a VideoTable
+    """
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: "VideoTable", index: int):
+        self._table = table
+        self._index = index
+
+    @property
+    def monitor_id(self) -> str:
+        table = self._table
+        return table._monitors[table._monitor[self._index]]
+
+    @property
+    def filename(self) -> str:
+        return self._table._filename[self._index]
+
+    @property
+    def size(self) -> int:
+        return self._table._size[self._index]
+
+    @property
+    def status(self) -> int:
+        return self._table._status[self._index]
+
+    @property
+    def start_timestamp(self) -> float:
+        return self._table._start[self._index]
+
+    @property
+    def end_timestamp(self) -> float:
+        return self._table._end[self._index]
+
+    @property
+    def start(self) -> Optional[datetime]:
+        value = self.start_timestamp
+        return None if isnan(value) else datetime.fromtimestamp(value, timezone.utc)
+
+    @property
+    def end(self) -> Optional[datetime]:
+        value = self.end_timestamp
+        return None if isnan(value) else datetime.fromtimestamp(value, timezone.utc)
+
+    def __repr__(self):
+        return f"<VideoRow {self.monitor_id} {self.filename}>"
+
+
+class VideoTable(Sequence[VideoRow]):
+    """
+    Video listing stored as typed columns
+
+    Monitor ids are stored once and referenced by index, times as float
+    timestamps (nan when unknown), which keeps a listing several times
+    smaller than the equivalent list of dicts and fast to scan.
+    """
+
+    def __init__(self):
+        self._monitors: List[str] = []
+        self._monitor_codes: Dict[str, int] = {}
+        self._monitor = array("I")
+        self._start = array("d")
+        self._end = array("d")
+        self._size = array("q")
+        self._status = array("b")
+        self._filename: List[str] = []
+
+    @classmethod
+    def from_videos(cls, videos: Iterable[Union[Video, dict]]) -> "VideoTable":
+        table = cls()
+        table.extend(videos)
+        return table
+
+    @classmethod
+    async def async_from_videos(
+        cls, videos: AsyncIterable[Union[Video, dict]]
+    ) -> "VideoTable":
+        """
+        Builds a table from an async iterator such as videos.async_iter
+        """
+        table = cls()
+        async for video in videos:
+            table.append(video)
+        return table
+
+    def _code(self, monitor_id: str) -> int:
+        code = self._monitor_codes.get(monitor_id)
+        if code is None:
+            code = self._monitor_codes[monitor_id] = len(self._monitors)
+            self._monitors.append(monitor_id)
+        return code
+
+    def append(self, video: Union[Video, dict]):
+        if isinstance(video, Video):
+            video = video._video
+        self._monitor.append(self._code(video.get("mid") or ""))
+        self._start.append(_timestamp(parse_time(video.get("time"))))
+        self._end.append(_timestamp(parse_time(video.get("end"))))
+        self._size.append(int(video.get("size") or 0))
+        self._status.append(int(video.get("status") or 0))
+        self._filename.append(video.get("filename") or "")
+
+    def extend(self, videos: Iterable[Union[Video, dict]]):
+        for video in videos:
+            self.append(video)
+
+    def __len__(self):
+        return len(self._monitor)
+
+    def __getitem__(self, index: int) -> VideoRow:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("VideoTable index out of range")
+        return VideoRow(self, index)
+
+    def __iter__(self) -> Iterator[VideoRow]:
+        for index in range(len(self)):
+            yield VideoRow(self, index)
+
+    @property
+    def monitor_ids(self) -> List[str]:
+        return list(self._monitors)
+
+    def take(self, indexes: Iterable[int]) -> "VideoTable":
+        """
+        Returns a new table holding the rows at indexes
+        """
+        table = VideoTable()
+        table._monitors = list(self._monitors)
+        table._monitor_codes = dict(self._monitor_codes)
+        indexes = list(indexes)
+        table._monitor = array("I", [self._monitor[i] for i in indexes])
+        table._start = array("d", [self._start[i] for i in indexes])
+        table._end = array("d", [self._end[i] for i in indexes])
+        table._size = array("q", [self._size[i] for i in indexes])
+        table._status = array("b", [self._status[i] for i in indexes])
+        table._filename = [self._filename[i] for i in indexes]
+        return table
+
+    def where(
+        self,
+        monitors: Iterable[str] = None,
+        start: Time = None,
+        end: Time = None,
+        min_size: int = None,
+        max_size: int = None,
+    ) -> List[int]:
+        """
+        Returns the indexes of rows matching all the given conditions
+
+        Parameters
+        ----------
+        monitors : iterable (optional)
+            Monitor ids to keep
+        start : datetime or timestamp (optional)
+            Keep videos ending at or after start
+        end : datetime or timestamp (optional)
+            Keep videos starting at or before end
+        min_size : int (optional)
+            Smallest size to keep
+        max_size : int (optional)
+            Largest size to keep
+        """
+        selected = range(len(self))
+        if monitors is not None:
+            codes = {
+                self._monitor_codes[m] for m in monitors if m in self._monitor_codes
+            }
+            column = self._monitor
+            selected = [i for i in selected if column[i] in codes]
+        if start is not None:
+            bound = _timestamp(start)
+            column = self._end
+            selected = [i for i in selected if column[i] >= bound]
+        if end is not None:
+            bound = _timestamp(end)
+            column = self._start
+            selected = [i for i in selected if column[i] <= bound]
+        if min_size is not None:
+            column = self._size
+            selected = [i for i in selected if column[i] >= min_size]
+        if max_size is not None:
+            column = self._size
+            selected = [i for i in selected if column[i] <= max_size]
+        return list(selected)
+
+    def filter(self, **conditions) -> "VideoTable":
+        """
+        Returns a new table with the rows matching conditions, see where
+        """
+        return self.take(self.where(**conditions))
+
+    def total_size(self) -> int:
+        return sum(self._size)
+
+    def total_duration(self) -> float:
+        """
+        Sum of the recorded seconds of videos with known start and end
+        """
+        return sum(
+            end - start
+            for start, end in zip(self._start, self._end)
+            if not (isnan(start) or isnan(end))
+        )
+
+    def count_by_monitor(self) -> Dict[str, int]:
+        counts = [0] * len(self._monitors)
+        for code in self._monitor:
+            counts[code] += 1
+        return {m: c for m, c in zip(self._monitors, counts) if c}
+
+    def size_by_monitor(self) -> Dict[str, int]:
+        sizes = [0] * len(self._monitors)
+        for code, size in zip(self._monitor, self._size):
+            sizes[code] += size
+        return {m: s for m, s in zip(self._monitors, sizes) if s}
+
+    def time_span(self) -> Optional[tuple]:
+        """
+        Earliest start and latest end timestamps, None if no times are known
+        """
+        starts = [t for t in self._start if not isnan(t)]
+        ends = [t for t in self._end if not isnan(t)]
+        if not starts or not ends:
+            return None
+        return min(starts), max(ends)
@@ -7,6 +7,7 @@ setup(
     description="Python Library for Shinobi CCTV API",
     author="Xannor Archouse",
     install_requires=["aiohttp"],
+    extras_require={"fast": ["orjson"]},
     setup_requires=["pytest-runner"],
     test_requires=["pytest"],
     test_suite="tests",
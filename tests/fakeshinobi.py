@@ -0,0 +1,317 @@
+"""
+Local stand-in Shinobi server for tests and benchmarks
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from itertools import count
+
+from aiohttp import web
+
+from pyshinobicctvapi.connection import Connection
+from pyshinobicctvapi.videos import parse_time
+
+from .server import serve
+
+JPEG = b"\xff\xd8" + bytes(range(256)) * 16 + b"\xff\xd9"
+
+
+def monitor(index: int, token: str = "t", group: str = "g") -> dict:
+    mid = f"m{index:05d}"
+    details = {
+        "auto_host": f"rtsp://10.0.{index // 250}.{index % 250}:554/stream1",
+        "detector": "1",
+        "detector_sensitivity": "10",
+        "stream_type": "mjpeg",
+        "groups": "[]",
+        **{f"setting_{n}": str(n) for n in range(120)},
+    }
+    return {
+        "mid": mid,
+        "ke": group,
+        "name": f"Camera {index}",
+        "type": "h264",
+        "ext": "mp4",
+        "protocol": "rtsp",
+        "host": f"10.0.{index // 250}.{index % 250}",
+        "port": 554,
+        "fps": 15,
+        "mode": "record",
+        "width": 1920,
+        "height": 1080,
+        "details": json.dumps(details),
+        "status": "Recording",
+        "snapshot": f"/{token}/jpeg/{group}/{mid}/s.jpg",
+        "streams": [
+            f"/{token}/mjpeg/{group}/{mid}",
+            f"/{token}/hls/{group}/{mid}/s.m3u8",
+        ],
+        "streamsSortedByType": {
+            "mjpeg": [f"/{token}/mjpeg/{group}/{mid}"],
+            "hls": [f"/{token}/hls/{group}/{mid}/s.m3u8"],
+        },
+    }
+
+
+def _aware(time: datetime) -> datetime:
+    # naive times are the server's local time
+    return None if time is None else time.astimezone(timezone.utc)
+
+
+def video(index: int, monitors: int = 200, token: str = "t", group: str = "g") -> dict:
+    mid = f"m{index % max(monitors, 1):05d}"
+    minute, second = divmod(index % 3600, 60)
+    return {
+        "mid": mid,
+        "ke": group,
+        "ext": "mp4",
+        "time": "2021-01-01T10:%02d:%02d.000Z" % (minute, second),
+        "end": "2021-01-01T10:%02d:%02d.000Z" % (minute, (second + 1) % 60),
+        "size": 1048576 + index,
+        "status": 1,
+        "filename": f"2021-01-01T10-00-{index:06d}.mp4",
+        "href": f"/{token}/videos/{group}/{mid}/{index:06d}.mp4",
+        "details": "{}",
+    }
+
+
+class FakeShinobi:
+    """
+    aiohttp application answering the Shinobi endpoints used by this library
+
+    Parameters
+    ----------
+    monitors : int
+        Number of monitors served
+    videos : int
+        Number of videos in the listing
+    keys : int
+        Number of API keys in the listing
+    latency : float
+        Seconds added to every response
+    jitter : float
+        Random extra seconds (uniform) added to every response
+    error_rate : float
+        Fraction of requests answered with 503
+    frame_rate : float
+        Frames per second sent on MJPEG streams
+    hls_segments : int
+        Number of segments of the HLS streams, a new one is listed every
+        second playlist request
+    """
+
+    def __init__(
+        self,
+        monitors: int = 10,
+        videos: int = 100,
+        keys: int = 5,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        frame_rate: float = 25.0,
+        hls_segments: int = 8,
+        token: str = "t",
+        group: str = "g",
+        seed: int = None,
+    ):
+        self.token = token
+        self.group = group
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.frame_rate = frame_rate
+        self.hls_segments = hls_segments
+        self.hls_polls = 0
+        self.monitors = [monitor(i, token, group) for i in range(monitors)]
+        self.video_count = videos
+        self.keys = [
+            {"code": f"key{i}", "ke": group, "ip": "0.0.0.0", "details": {}}
+            for i in range(keys)
+        ]
+        self.requests = 0
+        self.triggers = []
+        self.logs = []
+        self._codes = count(keys)
+        self.port = None
+        self._random = random.Random(seed)
+        self._stack = None
+
+    @property
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/{token}/monitor/{group}", self._monitors)
+        app.router.add_get("/{token}/smonitor/{group}", self._monitors)
+        app.router.add_get("/{token}/monitor/{group}/{mid}", self._monitor)
+        app.router.add_get("/{token}/monitor/{group}/{mid}/{mode}", self._mode)
+        app.router.add_get("/{token}/videos/{group}", self._videos)
+        app.router.add_get("/{token}/api/{group}/list", self._keys)
+        app.router.add_post("/{token}/api/{group}/add", self._add_key)
+        app.router.add_post("/{token}/api/{group}/delete", self._delete_key)
+        app.router.add_get("/{token}/logs/{group}", self._logs)
+        app.router.add_get("/{token}/logs/{group}/{mid}", self._logs)
+        app.router.add_get("/{token}/motion/{group}/{mid}", self._motion)
+        app.router.add_get("/{token}/jpeg/{group}/{mid}/s.jpg", self._snapshot)
+        app.router.add_get("/{token}/mjpeg/{group}/{mid}", self._mjpeg)
+        app.router.add_get("/{token}/hls/{group}/{mid}/s.m3u8", self._playlist)
+        app.router.add_get("/{token}/hls/{group}/{mid}/{sequence}.ts", self._segment)
+        return app
+
+    def connection(self, **kwargs) -> Connection:
+        """
+        A connection to the running server
+        """
+        return Connection("127.0.0.1", self.port, self.token, self.group, **kwargs)
+
+    async def __aenter__(self):
+        self._stack = AsyncExitStack()
+        self.port = await self._stack.enter_async_context(serve(self.app))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._stack.aclose()
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        self.requests += 1
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._random.random() < self.error_rate:
+            return web.Response(status=503)
+        if request.match_info.get("token") != self.token:
+            return web.json_response({"ok": False, "msg": "Not Authorized"})
+        return await handler(request)
+
+    async def _monitors(self, request: web.Request):
+        return web.json_response(self.monitors)
+
+    async def _monitor(self, request: web.Request):
+        mid = request.match_info["mid"]
+        return web.json_response([m for m in self.monitors if m["mid"] == mid])
+
+    async def _mode(self, request: web.Request):
+        mid = request.match_info["mid"]
+        mode = request.match_info["mode"]
+        for data in self.monitors:
+            if data["mid"] == mid:
+                data["mode"] = mode
+                return web.json_response({"ok": True, "cmd_at": mode})
+        return web.json_response({"ok": False, "msg": "Monitor not found"})
+
+    async def _videos(self, request: web.Request):
+        resp = web.StreamResponse(headers={"Content-Type": "application/json"})
+        await resp.prepare(request)
+        await resp.write(b'{"isUTC":true,"total":%d,"videos":[' % self.video_count)
+        batch = []
+        for index in range(self.video_count):
+            batch.append(
+                json.dumps(video(index, len(self.monitors), self.token, self.group))
+            )
+            if len(batch) == 500:
+                await resp.write(self._join(batch, index))
+                batch = []
+        if batch:
+            await resp.write(self._join(batch, self.video_count - 1))
+        await resp.write(b"]}")
+        return resp
+
+    def _join(self, batch, last: int) -> bytes:
+        first = last - len(batch) + 1
+        return (("," if first else "") + ",".join(batch)).encode()
+
+    async def _keys(self, request: web.Request):
+        return web.json_response({"ok": True, "list": self.keys})
+
+    async def _add_key(self, request: web.Request):
+        body = await request.json()
+        key = {"code": f"key{next(self._codes)}", "ke": self.group, **body["data"]}
+        self.keys.append(key)
+        return web.json_response({"ok": True, "api": key})
+
+    async def _delete_key(self, request: web.Request):
+        code = (await request.json())["data"]["code"]
+        self.keys = [k for k in self.keys if k["code"] != code]
+        return web.json_response({"ok": True})
+
+    async def _logs(self, request: web.Request):
+        mid = request.match_info.get("mid")
+        start = _aware(parse_time(request.query.get("start")))
+        end = _aware(parse_time(request.query.get("end")))
+        logs = [
+            log
+            for log in self.logs
+            if (mid is None or log["mid"] == mid)
+            and (start is None or _aware(parse_time(log["time"])) >= start)
+            and (end is None or _aware(parse_time(log["time"])) <= end)
+        ]
+        logs.sort(key=lambda log: log["time"], reverse=True)
+        if "limit" in request.query:
+            logs = logs[: int(request.query["limit"])]
+        return web.json_response(logs)
+
+    async def _motion(self, request: web.Request):
+        data = json.loads(request.query["data"])
+        self.triggers.append((request.match_info["mid"], data))
+        return web.json_response({"ok": True})
+
+    async def _snapshot(self, request: web.Request):
+        etag = '"%s"' % hashlib.md5(JPEG).hexdigest()
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304)
+        return web.Response(
+            body=JPEG, content_type="image/jpeg", headers={"ETag": etag}
+        )
+
+    async def _mjpeg(self, request: web.Request):
+        resp = web.StreamResponse(
+            headers={"Content-Type": "multipart/x-mixed-replace; boundary=shinobi"}
+        )
+        await resp.prepare(request)
+        part = (
+            (
+                b"--shinobi\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n"
+                % len(JPEG)
+            )
+            + JPEG
+            + b"\r\n"
+        )
+        try:
+            while True:
+                await resp.write(part)
+                await asyncio.sleep(1 / self.frame_rate)
+        except ConnectionResetError:
+            pass
+        return resp
+
+    async def _playlist(self, request: web.Request):
+        window = 3
+        last = min(window + self.hls_polls // 2, self.hls_segments)
+        self.hls_polls += 1
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-TARGETDURATION:2",
+            "#EXT-X-MEDIA-SEQUENCE:%d" % (last - window),
+        ]
+        for sequence in range(last - window, last):
+            lines += ["#EXTINF:2.000,", "%d.ts" % sequence]
+        if last == self.hls_segments:
+            lines.append("#EXT-X-ENDLIST")
+        body = "\n".join(lines) + "\n"
+        etag = '"%s"' % hashlib.md5(body.encode()).hexdigest()
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304)
+        return web.Response(
+            text=body,
+            content_type="application/vnd.apple.mpegurl",
+            headers={"ETag": etag},
+        )
+
+    async def _segment(self, request: web.Request):
+        return web.Response(
+            body=b"segment %s" % request.match_info["sequence"].encode()
+        )
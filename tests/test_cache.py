@@ -0,0 +1,56 @@
+from pyshinobicctvapi.cache import ResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_and_revalidate():
+    clock = Clock()
+    cache = ResponseCache(ttl=5, clock=clock)
+    cache.store("http://h/a", {"ok": True}, etag='"1"')
+
+    entry = cache.lookup("http://h/a")
+    assert cache.is_fresh(entry)
+    assert cache.hits == 1
+
+    clock.now = 10
+    entry = cache.lookup("http://h/a")
+    assert not cache.is_fresh(entry)
+    assert entry.validators == {"If-None-Match": '"1"'}
+    assert cache.revalidated("http://h/a", entry) == {"ok": True}
+    assert cache.is_fresh(entry)
+
+
+def test_lru_eviction_and_invalidate():
+    cache = ResponseCache(max_entries=2)
+    cache.store("http://h/t/monitor/g", 1)
+    cache.store("http://h/t/videos/g", 2)
+    cache.lookup("http://h/t/monitor/g")
+    cache.store("http://h/t/api/g/list", 3)
+
+    assert "http://h/t/videos/g" not in cache
+    assert cache.evictions == 1
+    assert cache.invalidate("http://h/t/api/g") == 1
+    assert len(cache) == 1
+
+
+def test_invalidate_matches_whole_segments():
+    cache = ResponseCache()
+    for url in (
+        "http://h/t/monitor/g",
+        "http://h/t/monitor/g/m1",
+        "http://h/t/monitor/g/m10",
+        "http://h/t/monitor/g/m1?json=true",
+        "http://h/t/monitor/g2",
+    ):
+        cache.store(url, url)
+
+    assert cache.invalidate("http://h/t/monitor/g/m1") == 2
+    assert "http://h/t/monitor/g/m10" in cache
+    assert cache.invalidate("http://h/t/monitor/g") == 2
+    assert list(cache._entries) == ["http://h/t/monitor/g2"]
@@ -1 +1,361 @@
-from pyshinobicctvapi import Client
+import asyncio
+import json
+import threading
+from datetime import datetime, timezone
+
+import pytest
+from aiohttp import web
+
+from pyshinobicctvapi import Client, errors
+from pyshinobicctvapi.api import Permission
+from pyshinobicctvapi.cache import ResponseCache
+from pyshinobicctvapi.cluster import ClusterClient
+from pyshinobicctvapi.connection import Connection
+from pyshinobicctvapi.events import DetectionEvent, MonitorStatusEvent
+from pyshinobicctvapi.sync import SyncClient
+
+from .fakeshinobi import FakeShinobi
+from .server import serve
+
+
+def test_cluster_keeps_partial_results():
+    async def run():
+        async def monitors(request):
+            return web.json_response([{"mid": "a", "ke": "g"}, {"mid": "b", "ke": "g"}])
+
+        app = web.Application()
+        app.router.add_get("/t/monitor/g", monitors)
+        async with serve(app) as port:
+            cluster = ClusterClient(
+                {
+                    "up": Connection("127.0.0.1", port, "t", "g"),
+                    "down": Connection("127.0.0.1", port, "t", "missing"),
+                },
+                timeout=5,
+            )
+            async with cluster:
+                result = await cluster.async_monitors()
+
+        assert [m.id for m in result["up"].value] == ["a", "b"]
+        assert not result.ok
+        assert list(result.errors) == ["down"]
+
+    asyncio.run(run())
+
+
+def test_videos_are_streamed():
+    async def run():
+        async def videos(request):
+            resp = web.StreamResponse(headers={"Content-Type": "application/json"})
+            await resp.prepare(request)
+            await resp.write(b'{"total": 2, "videos": [{"mid": "a"},')
+            await resp.write(b' {"mid": "b"}]}')
+            return resp
+
+        app = web.Application()
+        app.router.add_get("/t/videos/g", videos)
+        async with serve(app) as port:
+            async with Client(Connection("127.0.0.1", port, "t", "g")) as client:
+                streamed = [video async for video in client.videos.iter()]
+                listed = await client.videos.all()
+
+        assert [v._video["mid"] for v in streamed] == ["a", "b"]
+        assert len(listed) == 2
+
+    asyncio.run(run())
+
+
+def test_events_reconnect_and_resubscribe():
+    async def run():
+        received = []
+        sessions = 0
+
+        async def socket(request):
+            nonlocal sessions
+            sessions += 1
+            ws = web.WebSocketResponse()
+            await ws.prepare(request)
+            await ws.send_str('0{"sid": "s", "pingInterval": 25000}')
+            await ws.send_str("40")
+            for _ in range(2):
+                received.append(json.loads((await ws.receive_str())[2:])[1])
+            if sessions == 1:
+                payload = {"f": "monitor_status", "id": "m", "ke": "g", "code": 2}
+            else:
+                payload = {
+                    "f": "detector_trigger",
+                    "id": "m",
+                    "details": {"reason": "motion"},
+                }
+            await ws.send_str("42" + json.dumps(["f", payload]))
+            await ws.close()
+            return ws
+
+        app = web.Application()
+        app.router.add_get("/socket.io/", socket)
+        async with serve(app) as port:
+            async with Client(Connection("127.0.0.1", port, "t", "g")) as client:
+                async with client.subscribe(["m"], reconnect_delay=0.01) as events:
+                    status = await events.__anext__()
+                    detection = await events.__anext__()
+
+        assert isinstance(status, MonitorStatusEvent) and status.code == 2
+        assert isinstance(detection, DetectionEvent) and detection.reason == "motion"
+        assert [r["f"] for r in received] == ["init", "monitor", "init", "monitor"]
+        assert received[0]["auth"] == "t" and received[1]["id"] == "m"
+
+    asyncio.run(run())
+
+
+def test_events_raise_unexpected_errors_to_the_consumer():
+    async def run():
+        async def socket(request):
+            ws = web.WebSocketResponse()
+            await ws.prepare(request)
+            # a handshake that is not an object
+            await ws.send_str("0[25000]")
+            await ws.receive()
+            return ws
+
+        app = web.Application()
+        app.router.add_get("/socket.io/", socket)
+        async with serve(app) as port:
+            async with Client(Connection("127.0.0.1", port, "t", "g")) as client:
+                async with client.subscribe(reconnect_delay=0.01) as events:
+                    with pytest.raises(AttributeError):
+                        await events.__anext__()
+                    with pytest.raises(StopAsyncIteration):
+                        await events.__anext__()
+
+    asyncio.run(run())
+
+
+def test_fake_server_round_trip():
+    async def run():
+        async with FakeShinobi(monitors=3, videos=1200, keys=2) as server:
+            async with Client(server.connection()) as client:
+                monitors = list(await client.monitors.async_all())
+                videos = [video async for video in client.videos.iter()]
+                added = await client.api.add({"ip": "10.0.0.1"})
+                keys = await client.api.all()
+
+        assert [m.id for m in monitors] == ["m00000", "m00001", "m00002"]
+        assert len(videos) == 1200 and videos[-1].monitor_id == "m00002"
+        assert added.code == "key2" and len(keys) == 3
+
+    asyncio.run(run())
+
+
+def test_key_changes_do_not_leak_into_shared_responses():
+    async def run():
+        async with FakeShinobi(keys=1) as server:
+            connection = server.connection(cache=ResponseCache(ttl=60))
+            async with Client(connection) as client:
+                first, second = await asyncio.gather(client.api.all(), client.api.all())
+                first[0].ip = "10.0.0.9"
+                first[0].details.get_logs = False
+                third = await client.api.all()
+        return first[0], second[0], third[0], server.requests
+
+    changed, other, again, requests = asyncio.run(run())
+    assert requests == 1
+    assert changed.ip == "10.0.0.9" and not changed.details.get_logs
+    for key in (other, again):
+        assert key.ip != "10.0.0.9" and key.details.get_logs
+
+
+def test_api_bulk_rotate_keeps_permissions():
+    async def run():
+        async with FakeShinobi(keys=0) as server:
+            async with Client(server.connection()) as client:
+                added = await client.api.add_many(
+                    [
+                        {"ip": "10.0.0.%d" % i, "details": Permission.GET_MONITORS}
+                        for i in range(20)
+                    ],
+                    rate=1000,
+                )
+                rotated = await client.api.rotate_many(
+                    [result.value for result in added], concurrency=4
+                )
+                deleted = await client.api.delete_many([{"code": "missing"}])
+                keys = await client.api.all()
+
+        assert all(result.ok for result in added + rotated + deleted)
+        assert sorted(k.code for k in keys) == sorted(r.value.code for r in rotated)
+        assert {r.value.ip for r in rotated} == {"10.0.0.%d" % i for i in range(20)}
+        assert all(k.permissions == Permission.GET_MONITORS for k in keys)
+        assert not keys[0].details.watch_stream and keys[0].details.get_monitors
+
+    asyncio.run(run())
+
+
+def test_api_rotate_reports_the_new_key_when_delete_fails():
+    async def run():
+        async def add(request):
+            return web.json_response({"ok": True, "api": {"code": "new", "ip": "1"}})
+
+        async def delete(request):
+            return web.Response(status=404)
+
+        app = web.Application()
+        app.router.add_post("/t/api/g/add", add)
+        app.router.add_post("/t/api/g/delete", delete)
+        async with serve(app) as port:
+            async with Client(Connection("127.0.0.1", port, "t", "g")) as client:
+                return await client.api.rotate_many([{"code": "old", "ip": "1"}])
+
+    [result] = asyncio.run(run())
+    assert isinstance(result.error, errors.RotateFailed)
+    assert result.error.new.code == "new"
+
+
+def test_trigger_pipeline_coalesces_and_drops():
+    async def run():
+        async with FakeShinobi(latency=0.01) as server:
+            async with Client(server.connection()) as client:
+                async with client.triggers(
+                    window=60, concurrency=2, queue_size=4
+                ) as triggers:
+                    results = [
+                        triggers.put("m%d" % (i % 6), {"confidence": i})
+                        for i in range(30)
+                    ]
+                    await triggers.async_flush()
+                    await triggers.async_put("m9")
+                stats = triggers.stats
+
+        return results, stats, server.triggers
+
+    results, stats, sent = asyncio.run(run())
+    # four monitors fit in the queue, m4 and m5 are dropped on every round
+    assert results.count(False) == 10
+    assert stats["accepted"] == 5 and stats["sent"] == 5 and stats["dropped"] == 10
+    assert stats["coalesced"] == 16 and stats["latency"]["count"] == 5
+    assert sorted(mid for mid, _ in sent) == ["m0", "m1", "m2", "m3", "m9"]
+    # queued triggers carry the data of the last duplicate
+    assert dict(sent)["m3"]["confidence"] == 27
+    assert dict(sent)["m9"]["reason"] == "motion"
+
+
+def test_trigger_pipeline_does_not_retry_failures():
+    async def run():
+        async with FakeShinobi(error_rate=1.0) as server:
+            async with Client(server.connection()) as client:
+                async with client.triggers() as triggers:
+                    for mid in ("m0", "m1", "m2"):
+                        triggers.put(mid)
+                stats = triggers.stats
+        return stats, server.requests
+
+    stats, requests = asyncio.run(run())
+    assert stats["failed"] == 3 and stats["sent"] == 0
+    assert requests == 3
+
+
+def test_trigger_pipeline_counts_rejected_triggers_as_failed():
+    async def run():
+        async with FakeShinobi() as server:
+            connection = Connection("127.0.0.1", server.port, "wrong", server.group)
+            async with Client(connection) as client:
+                async with client.triggers() as triggers:
+                    triggers.put("m0")
+                stats, error = triggers.stats, triggers.error
+        return stats, error, server.triggers
+
+    stats, error, sent = asyncio.run(run())
+    assert stats["failed"] == 1 and stats["sent"] == 0 and sent == []
+    assert isinstance(error, errors.NotOk)
+
+
+def test_logs_tail_pages_and_skips_seen_entries():
+    def log(second: int, mid: str = "m00000", msg: str = "ok") -> dict:
+        time = "2021-01-01T10:00:%02d.000Z" % second
+        return {"ke": "g", "mid": mid, "time": time, "info": '{"msg": "%s"}' % msg}
+
+    async def run():
+        async with FakeShinobi() as server:
+            server.logs = [log(s // 2, "m0000%d" % (s % 2)) for s in range(7)]
+            async with Client(server.connection()) as client:
+                one = await client.logs.all("m00001", limit=2)
+                streamed = [entry async for entry in client.logs.iter()]
+                tail = client.logs.tail(interval=0.01, limit=3)
+                first = [await tail.__anext__() for _ in range(7)]
+                server.logs += [log(3, "m00001", "late"), log(4)]
+                second = [await tail.__anext__() for _ in range(2)]
+                await tail.aclose()
+
+        return one, streamed, first, second
+
+    one, streamed, first, second = asyncio.run(run())
+    assert [entry.time.second for entry in one] == [2, 1]
+    assert len(streamed) == 7 and streamed[0].info == {"msg": "ok"}
+    assert [entry.time.second for entry in first] == [0, 0, 1, 1, 2, 2, 3]
+    assert [(e.monitor_id, e.info["msg"]) for e in second] == [
+        ("m00001", "late"),
+        ("m00000", "ok"),
+    ]
+
+
+def test_logs_accept_naive_times():
+    def log(second: int) -> dict:
+        time = "2021-01-01T10:00:%02d.000Z" % second
+        return {"ke": "g", "mid": "m00000", "time": time, "info": "ok"}
+
+    async def run():
+        start = datetime(2021, 1, 1, 10, 0, 2, tzinfo=timezone.utc)
+        # the same instant as a naive local time
+        start = start.astimezone().replace(tzinfo=None)
+        async with FakeShinobi() as server:
+            server.logs = [log(second) for second in range(8)]
+            async with Client(server.connection()) as client:
+                tail = client.logs.tail(start=start, interval=0.01, limit=2)
+                entries = [await tail.__anext__() for _ in range(6)]
+                await tail.aclose()
+                page = await client.logs.all(start=start, end=start)
+        return entries, page
+
+    entries, page = asyncio.run(run())
+    assert [entry.time.second for entry in entries] == [2, 3, 4, 5, 6, 7]
+    assert [entry.time.second for entry in page] == [2]
+
+
+def test_logs_raise_not_ok_when_rejected():
+    async def run():
+        async with FakeShinobi() as server:
+            connection = Connection("127.0.0.1", server.port, "wrong", server.group)
+            async with Client(connection) as client:
+                with pytest.raises(errors.NotOk):
+                    await client.logs.all()
+                with pytest.raises(errors.NotOk):
+                    [entry async for entry in client.logs.iter()]
+                with pytest.raises(errors.NotOk):
+                    await client.logs.tail().__anext__()
+
+    asyncio.run(run())
+
+
+def test_sync_client_reuses_one_loop_and_session():
+    async def start(server: FakeShinobi):
+        await server.__aenter__()
+
+    server = FakeShinobi(monitors=4, videos=10)
+    server_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=server_loop.run_forever, daemon=True)
+    thread.start()
+    asyncio.run_coroutine_threadsafe(start(server), server_loop).result()
+    try:
+        with SyncClient(server.connection(), timeout=10) as client:
+            assert len(client.monitors.all()) == 4
+            session = client.connection._session
+            monitors = client.monitors.get_many(["m00001", "m00003"])
+            assert [m.id for m in monitors] == ["m00001", "m00003"]
+            assert len(client.videos.all()) == 10
+            assert client.connection._session is session
+        assert session.closed
+    finally:
+        asyncio.run_coroutine_threadsafe(
+            server.__aexit__(None, None, None), server_loop
+        ).result()
+        server_loop.call_soon_threadsafe(server_loop.stop)
+        thread.join()
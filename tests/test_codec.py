@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from pyshinobicctvapi import codec
+from pyshinobicctvapi.codec import STDLIB, Codec, available, fastest, get_codec
+from pyshinobicctvapi.connection import Connection
+
+from .server import serve
+
+
+def test_get_codec_resolves_names_and_instances():
+    assert get_codec() is STDLIB and get_codec("json").name == "json"
+    custom = Codec("custom", STDLIB.loads, STDLIB.dumps)
+    assert get_codec(custom) is custom
+    with pytest.raises(ValueError):
+        get_codec("yaml")
+
+
+@pytest.mark.parametrize("name", sorted(available()))
+def test_available_codecs_round_trip(name):
+    value = {"mid": "a", "details": [1, 2.5, None, True], "name": "caméra"}
+    backend = get_codec(name)
+    assert backend.loads(backend.dumps(value)) == value
+    assert backend.loads(backend.dumps(value).decode("utf-8")) == value
+
+
+def test_missing_backends_fall_back_to_stdlib(monkeypatch):
+    def import_module(name):
+        raise ImportError(name)
+
+    monkeypatch.setattr(codec, "import_module", import_module)
+    assert list(available()) == ["json"]
+    assert fastest().name == "json"
+    with pytest.raises(ImportError):
+        get_codec("orjson")
+
+
+def test_connection_uses_its_codec_both_ways():
+    calls = []
+
+    def loads(data):
+        calls.append("loads")
+        return STDLIB.loads(data)
+
+    def dumps(obj):
+        calls.append("dumps")
+        return STDLIB.dumps(obj)
+
+    async def run():
+        async def echo(request):
+            return web.json_response({"ok": True, "echo": await request.json()})
+
+        app = web.Application()
+        app.router.add_post("/t/api/g/add", echo)
+        async with serve(app) as port:
+            async with Connection(
+                "127.0.0.1", port, "t", "g", codec=Codec("custom", loads, dumps)
+            ) as connection:
+                return await connection.post(
+                    connection.action_url("api", "add"), {"data": {"ip": "1"}}
+                )
+
+    assert asyncio.run(run())["echo"] == {"data": {"ip": "1"}}
+    assert calls == ["dumps", "loads"]
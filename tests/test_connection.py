@@ -1,5 +1,255 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import ClientResponseError, web
+
+from pyshinobicctvapi import errors
 from pyshinobicctvapi.connection import Connection
+from pyshinobicctvapi.metrics import Metrics
+from pyshinobicctvapi.retry import OPEN, CircuitBreaker, RetryPolicy
+from pyshinobicctvapi.store import FileSessionStore
+from pyshinobicctvapi.transport import Pool, TransportConfig
+
+from .server import serve
 
 
 def test_create():
-    assert not Connection("") is None
\ No newline at end of file
+    assert not Connection("") is None
+
+
+def test_concurrent_gets_are_coalesced():
+    async def run():
+        calls = 0
+
+        async def handler(request):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return web.json_response({"ok": True, "list": [1, 2]})
+
+        app = web.Application()
+        app.router.add_get("/t/api/g/list", handler)
+        async with serve(app) as port:
+            async with Connection("127.0.0.1", port, "t", "g") as connection:
+                url = connection.action_url("api", "list")
+                results = await asyncio.gather(
+                    *(connection.get(url, "list") for _ in range(10))
+                )
+
+        assert calls == 1
+        assert results == [[1, 2]] * 10
+
+    asyncio.run(run())
+
+
+def test_pool_is_shared_and_closed_with_last_connection():
+    async def run():
+        pool = Pool(TransportConfig(limit_per_host=2))
+        first = Connection("127.0.0.1", 80, "t", "g", pool=pool)
+        second = Connection("127.0.0.1", 80, "t", "g", pool=pool)
+        async with first, second:
+            assert first._session is second._session
+            session = first._session
+        assert session.closed
+
+    asyncio.run(run())
+
+
+def test_transient_errors_are_retried_and_trip_the_breaker():
+    async def run():
+        calls = 0
+
+        async def flaky(request):
+            nonlocal calls
+            calls += 1
+            if calls == 2:
+                return web.json_response({"list": []})
+            return web.Response(status=503)
+
+        app = web.Application()
+        app.router.add_get("/t/api/g/list", flaky)
+        async with serve(app) as port:
+            breaker = CircuitBreaker(failure_threshold=2, recovery_time=60)
+            retry = RetryPolicy(attempts=2, backoff=0.01)
+            async with Connection(
+                "127.0.0.1", port, "t", "g", retry=retry, breaker=breaker
+            ) as connection:
+                url = connection.action_url("api", "list")
+                assert await connection.get(url, "list") == []
+                assert calls == 2
+
+                with pytest.raises(ClientResponseError):
+                    await connection.get(url)
+                assert breaker.state == OPEN
+                with pytest.raises(errors.CircuitOpen):
+                    await connection.get(url)
+                assert calls == 4
+
+    asyncio.run(run())
+
+
+def test_restored_session_skips_login_and_recovers_when_rejected(tmp_path):
+    async def run():
+        logins = 0
+
+        async def login(request):
+            nonlocal logins
+            logins += 1
+            token = f"token{logins}"
+            return web.json_response(
+                {"ok": True, "$user": {"auth_token": token, "ke": "g"}}
+            )
+
+        async def keys(request):
+            if request.match_info["token"] != f"token{logins}":
+                return web.json_response({"ok": False, "msg": "Not Authorized"})
+            return web.json_response({"ok": True, "list": ["key"]})
+
+        app = web.Application()
+        app.router.add_post("/", login)
+        app.router.add_get("/{token}/api/g/list", keys)
+        store = FileSessionStore(str(tmp_path / "sessions.json"))
+        async with serve(app) as port:
+            async with Connection("127.0.0.1", port, store=store) as first:
+                await first.login("user@example.com", "secret")
+            assert (tmp_path / "sessions.json").stat().st_mode & 0o777 == 0o600
+
+            async with Connection("127.0.0.1", None, store=store) as second:
+                await second.login("user@example.com", "secret")
+                assert logins == 1
+                assert second.info.port == port
+
+                logins += 1  # the server forgets the saved token
+                url = second.action_url("api", "list")
+                assert await second.get(url, "list") == ["key"]
+                assert logins == 3
+                assert store.load("127.0.0.1", "user@example.com")["token"] == "token3"
+
+    asyncio.run(run())
+
+
+def test_concurrent_requests_share_one_relogin(tmp_path):
+    async def run():
+        logins = 0
+
+        async def login(request):
+            nonlocal logins
+            logins += 1
+            token = f"token{logins}"
+            await asyncio.sleep(0.05)
+            return web.json_response(
+                {"ok": True, "$user": {"auth_token": token, "ke": "g"}}
+            )
+
+        async def action(request):
+            if request.match_info["token"] != f"token{logins}":
+                return web.json_response({"ok": False, "msg": "Not Authorized"})
+            return web.json_response([request.match_info["action"]])
+
+        app = web.Application()
+        app.router.add_post("/", login)
+        app.router.add_get("/{token}/{action}/g", action)
+        store = FileSessionStore(str(tmp_path / "sessions.json"))
+        store.save("127.0.0.1", "user@example.com", None, "stale", "g")
+        async with serve(app) as port:
+            async with Connection("127.0.0.1", port, store=store) as connection:
+                await connection.login("user@example.com", "secret")
+                results = await asyncio.gather(
+                    *(
+                        connection.get(connection.action_url(action))
+                        for action in ("monitor", "api", "videos")
+                    )
+                )
+                streamed = [
+                    item
+                    async for item in connection.iter_array(
+                        connection.action_url("logs")
+                    )
+                ]
+
+            async with Connection("127.0.0.1", port, store=store) as restored:
+                store.save("127.0.0.1", "user@example.com", None, "stale", "g")
+                await restored.login("user@example.com", "secret")
+                restored_items = [
+                    item
+                    async for item in restored.iter_array(restored.action_url("logs"))
+                ]
+
+        return logins, results, streamed, restored_items
+
+    logins, results, streamed, restored_items = asyncio.run(run())
+    assert results == [["monitor"], ["api"], ["videos"]]
+    assert streamed == ["logs"] and restored_items == ["logs"]
+    assert logins == 2
+
+
+def test_metrics_are_labeled_by_action():
+    async def run():
+        async def monitors(request):
+            return web.json_response([{"mid": "a"}])
+
+        app = web.Application()
+        app.router.add_get("/t/monitor/g", monitors)
+        observed = []
+        metrics = Metrics(callback=lambda *args: observed.append(args))
+        async with serve(app) as port:
+            async with Connection(
+                "127.0.0.1", port, "t", "g", metrics=metrics
+            ) as connection:
+                await connection.get(connection.action_url("monitor"))
+                with pytest.raises(ClientResponseError):
+                    await connection.get(connection.action_url("videos"))
+
+        snapshot = metrics.snapshot()
+        monitor = snapshot["monitor"]
+        assert monitor["requests"] == 1 and monitor["in_flight"] == 0
+        assert monitor["bytes_received"] > 0
+        assert {"connect", "first_byte", "body", "decode", "total"} <= set(
+            monitor["latency"]
+        )
+        assert snapshot["videos"]["errors"] == {"404": 1}
+        assert ("monitor", "decode") in {(a, p) for a, p, _ in observed}
+
+    asyncio.run(run())
+
+
+def test_pooled_metrics_count_streams_until_closed():
+    async def run():
+        async def monitors(request):
+            return web.json_response([{"mid": "a"}])
+
+        async def stream(request):
+            resp = web.StreamResponse()
+            await resp.prepare(request)
+            await resp.write(b"x" * 100)
+            await asyncio.sleep(0.2)
+            return resp
+
+        app = web.Application()
+        app.router.add_get("/t/monitor/g", monitors)
+        app.router.add_get("/t/mjpeg/g/a", stream)
+        metrics = Metrics()
+        pool = Pool()
+        async with serve(app) as port:
+            with pytest.raises(ValueError):
+                async with aiohttp.ClientSession() as session:
+                    Connection("127.0.0.1", port, "t", "g", session, metrics=metrics)
+
+            first = Connection("127.0.0.1", port, "t", "g", pool=pool, metrics=metrics)
+            second = Connection("127.0.0.1", port, "t", "g", pool=pool, metrics=metrics)
+            async with first, second:
+                await first.get(first.action_url("monitor"))
+                resp = await second.open(second.action_url("mjpeg", "a"))
+                async with resp:
+                    await resp.content.read(10)
+                    streaming = metrics.snapshot()["mjpeg"]["in_flight"]
+                with pytest.raises(RuntimeError):
+                    pool.add_trace_config(aiohttp.TraceConfig())
+
+        snapshot = metrics.snapshot()
+        assert snapshot["monitor"]["requests"] == 1
+        assert "first_byte" in snapshot["monitor"]["latency"]
+        return streaming, snapshot["mjpeg"]["in_flight"]
+
+    assert asyncio.run(run()) == (1, 0)
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from pyshinobicctvapi.jsonstream import ArrayParser
+
+DOCUMENT = {
+    "isUTC": True,
+    "total": 3,
+    "skipped": {"nested": [1, 2]},
+    "videos": [{"mid": "a", "size": 12}, {"mid": "b", "size": 1.5}, 7],
+    "endIsStartTo": None,
+}
+
+
+@pytest.mark.parametrize("step", [1, 3, 64])
+def test_items_are_extracted_from_any_chunking(step):
+    text = json.dumps(DOCUMENT, indent=1)
+    parser = ArrayParser("videos")
+    items = []
+    for pos in range(0, len(text), step):
+        items += parser.feed(text[pos : pos + step])
+    items += parser.feed("", True)
+
+    assert items == DOCUMENT["videos"]
+    assert parser.done
+
+
+def test_top_level_array_and_truncation():
+    parser = ArrayParser()
+    assert parser.feed('[{"a": 1}, 12') == [{"a": 1}]
+    with pytest.raises(ValueError):
+        parser.feed("", True)
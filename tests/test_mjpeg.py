@@ -0,0 +1,176 @@
+import asyncio
+
+import pytest
+from aiohttp import ClientResponseError, web
+
+from pyshinobicctvapi.broadcast import MjpegBroadcaster
+from pyshinobicctvapi.connection import Connection
+from pyshinobicctvapi.mjpeg import FrameParser, boundary_from_content_type
+from pyshinobicctvapi.monitors import Manager
+from pyshinobicctvapi.retry import CircuitBreaker
+from pyshinobicctvapi.transport import TransportConfig
+
+from .fakeshinobi import FakeShinobi
+from .server import serve
+
+FRAMES = [
+    b"\xff\xd8one\xff\xd9",
+    b"\xff\xd8" + b"x" * 50 + b"\xff\xd9",
+    b"\xff\xd8\xff\xd9",
+]
+
+
+def multipart(with_length: bool) -> bytes:
+    body = b""
+    for frame in FRAMES:
+        body += b"--shinobi\r\nContent-Type: image/jpeg\r\n"
+        if with_length:
+            body += b"Content-Length: %d\r\n" % len(frame)
+        body += b"\r\n" + frame + b"\r\n"
+    return body + b"--shinobi\r\n"
+
+
+def parse(parser: FrameParser, data: bytes, step: int):
+    frames = []
+    for pos in range(0, len(data), step):
+        parser.feed(data[pos : pos + step])
+        frames += parser.frames()
+    return frames
+
+
+@pytest.mark.parametrize("with_length", [True, False])
+@pytest.mark.parametrize("step", [1, 7, 1000])
+def test_frames_split_on_boundary(with_length, step):
+    boundary = boundary_from_content_type(
+        "multipart/x-mixed-replace; boundary=--shinobi"
+    )
+    assert boundary == b"shinobi"
+    assert parse(FrameParser(boundary), multipart(with_length), step) == FRAMES
+
+
+def test_markers_decimation_and_size_limit():
+    data = multipart(False)
+    assert parse(FrameParser(every=2), data, 5) == [FRAMES[1]]
+
+    parser = FrameParser(b"shinobi", max_frame_size=20)
+    assert parse(parser, multipart(True), 3) == [FRAMES[0], FRAMES[2]]
+    assert parser.dropped == 1
+
+
+def test_broadcaster_shares_one_upstream():
+    async def run():
+        connections = 0
+
+        async def mjpeg(request):
+            nonlocal connections
+            connections += 1
+            resp = web.StreamResponse(
+                headers={"Content-Type": "multipart/x-mixed-replace; boundary=shinobi"}
+            )
+            await resp.prepare(request)
+            for _ in range(100):
+                await resp.write(multipart(True))
+                await asyncio.sleep(0.01)
+            return resp
+
+        app = web.Application()
+        app.router.add_get("/t/mjpeg/g/m", mjpeg)
+        async with serve(app) as port:
+            async with Connection("127.0.0.1", port, "t", "g") as connection:
+                broadcaster = MjpegBroadcaster(connection)
+                first = broadcaster.subscribe("/t/mjpeg/g/m")
+                second = broadcaster.subscribe("/t/mjpeg/g/m", queue_size=1)
+                assert broadcaster.active == 1
+
+                async with first, second:
+                    assert await first.__anext__() in FRAMES
+                    assert await second.__anext__() in FRAMES
+                assert broadcaster.active == 0
+                await broadcaster.async_close()
+
+        assert connections == 1
+
+    asyncio.run(run())
+
+
+def test_broadcaster_reopens_upstream_while_subscribed():
+    async def run():
+        connections = 0
+
+        async def mjpeg(request):
+            nonlocal connections
+            connections += 1
+            resp = web.StreamResponse(
+                headers={"Content-Type": "multipart/x-mixed-replace; boundary=shinobi"}
+            )
+            await resp.prepare(request)
+            # one burst of frames, then the upstream ends
+            await resp.write(multipart(True))
+            return resp
+
+        app = web.Application()
+        app.router.add_get("/t/mjpeg/g/m", mjpeg)
+        async with serve(app) as port:
+            async with Connection("127.0.0.1", port, "t", "g") as connection:
+                broadcaster = MjpegBroadcaster(connection, reconnect_delay=0.01)
+                async with broadcaster.subscribe("/t/mjpeg/g/m", queue_size=10) as sub:
+                    frames = [await sub.__anext__() for _ in range(7)]
+                missing = broadcaster.subscribe("/t/mjpeg/g/missing")
+                with pytest.raises(ClientResponseError):
+                    await missing.__anext__()
+                await broadcaster.async_close()
+
+        assert frames[:3] == FRAMES and connections >= 3
+        assert broadcaster.reconnects >= 2
+
+    asyncio.run(run())
+
+
+def test_broadcaster_waits_for_an_open_circuit():
+    async def run():
+        connections = 0
+
+        async def mjpeg(request):
+            nonlocal connections
+            connections += 1
+            if connections == 1:
+                return web.Response(status=503)
+            resp = web.StreamResponse(
+                headers={"Content-Type": "multipart/x-mixed-replace; boundary=shinobi"}
+            )
+            await resp.prepare(request)
+            await resp.write(multipart(True))
+            return resp
+
+        app = web.Application()
+        app.router.add_get("/t/mjpeg/g/m", mjpeg)
+        breaker = CircuitBreaker(failure_threshold=1, recovery_time=0.1)
+        async with serve(app) as port:
+            async with Connection(
+                "127.0.0.1", port, "t", "g", breaker=breaker
+            ) as connection:
+                broadcaster = MjpegBroadcaster(connection, reconnect_delay=0.01)
+                async with broadcaster.subscribe("/t/mjpeg/g/m") as sub:
+                    frame = await sub.__anext__()
+                await broadcaster.async_close()
+        return frame, connections
+
+    frame, connections = asyncio.run(run())
+    # the reconnects made while the circuit was open never reached the server
+    assert frame in FRAMES and connections == 2
+
+
+def test_stream_outlives_session_total_timeout():
+    async def run():
+        async with FakeShinobi(monitors=1, frame_rate=50) as server:
+            transport = TransportConfig(total_timeout=0.2)
+            async with server.connection(transport=transport) as connection:
+                monitor = next(iter(await Manager(connection).async_all()))
+                count = 0
+                async for _ in monitor.frames(read_timeout=5):
+                    count += 1
+                    if count == 25:
+                        break
+        return count
+
+    assert asyncio.run(run()) == 25
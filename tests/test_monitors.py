@@ -0,0 +1,202 @@
+import asyncio
+
+from aiohttp import web
+
+from pyshinobicctvapi import errors
+from pyshinobicctvapi.cache import ResponseCache
+from pyshinobicctvapi.connection import Connection
+from pyshinobicctvapi.hls import HlsFollower
+from pyshinobicctvapi.monitors import ADDED, CHANGED, MODE_STOP, REMOVED, Manager
+from pyshinobicctvapi.snapshots import SnapshotPoller
+
+from .fakeshinobi import FakeShinobi
+from .server import serve
+
+
+def test_registry_keeps_identity_and_reports_changes():
+    registry = Manager(Connection("localhost", 80, "t", "g")).registry()
+    events = []
+    registry.add_listener(events.append)
+
+    registry.apply([{"mid": "a", "mode": "start"}, {"mid": "b", "details": "{}"}])
+    first = registry["b"]
+    assert first.details is not None
+    assert [e.type for e in events] == [ADDED, ADDED]
+
+    events.clear()
+    result = registry.apply(
+        [{"mid": "b", "details": '{"x": 1}'}, {"mid": "c", "mode": "stop"}]
+    )
+    assert result == events
+    assert [(e.type, e.monitor.id) for e in events] == [
+        (CHANGED, "b"),
+        (ADDED, "c"),
+        (REMOVED, "a"),
+    ]
+    assert events[0].changed == {"details"}
+    assert registry["b"] is first
+    assert first.details._details == {"x": 1}
+
+    # reading details of a monitor listed without them changes nothing
+    assert registry["c"].details._details == {}
+    events.clear()
+    registry.apply([{"mid": "b", "details": '{"x": 1}'}, {"mid": "c", "mode": "stop"}])
+    assert events == []
+
+
+def test_snapshot_poller_skips_unchanged_images(tmp_path):
+    async def run():
+        async def snapshot(request):
+            mid = request.match_info["mid"]
+            if mid == "etag":
+                if request.headers.get("If-None-Match") == '"1"':
+                    return web.Response(status=304)
+                return web.Response(body=b"etag image", headers={"ETag": '"1"'})
+            return web.Response(body=b"plain image")
+
+        app = web.Application()
+        app.router.add_get("/t/jpeg/g/{mid}/s.jpg", snapshot)
+        received = []
+        async with serve(app) as port:
+            async with Connection("127.0.0.1", port, "t", "g") as connection:
+                manager = Manager(connection)
+                monitors = [
+                    manager._create({"mid": mid, "snapshot": f"/t/jpeg/g/{mid}/s.jpg"})
+                    for mid in ("etag", "plain")
+                ]
+                poller = SnapshotPoller(
+                    monitors,
+                    callback=lambda m, data: received.append((m.id, data)),
+                    directory=str(tmp_path),
+                )
+                first = await poller.async_poll_once()
+                second = await poller.async_poll_once()
+
+        assert first == {"etag": True, "plain": True}
+        assert second == {"etag": False, "plain": False}
+        assert sorted(received) == [("etag", b"etag image"), ("plain", b"plain image")]
+        assert (tmp_path / "plain.jpg").read_bytes() == b"plain image"
+        assert not poller.errors
+
+    asyncio.run(run())
+
+
+def test_snapshot_poller_schedules_monitors_independently():
+    async def run():
+        polls = {"fast": 0, "hung": 0}
+
+        async def snapshot(request):
+            mid = request.match_info["mid"]
+            polls[mid] += 1
+            if mid == "hung":
+                await asyncio.sleep(1)
+            return web.Response(body=b"image %d" % polls[mid])
+
+        app = web.Application()
+        app.router.add_get("/t/jpeg/g/{mid}/s.jpg", snapshot)
+        async with serve(app) as port:
+            async with Connection("127.0.0.1", port, "t", "g") as connection:
+                manager = Manager(connection)
+                monitors = [
+                    manager._create({"mid": mid, "snapshot": f"/t/jpeg/g/{mid}/s.jpg"})
+                    for mid in ("hung", "fast")
+                ]
+                poller = SnapshotPoller(monitors, interval=0.02, timeout=0.3)
+                task = asyncio.ensure_future(poller.run())
+                await asyncio.sleep(0.4)
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        return polls, poller.errors
+
+    polls, errors = asyncio.run(run())
+    assert polls["fast"] >= 5 and polls["hung"] <= 2
+    assert isinstance(errors["hung"], asyncio.TimeoutError)
+
+
+def test_set_modes_bypasses_and_invalidates_cache():
+    async def run():
+        async with FakeShinobi(monitors=30) as server:
+            async with server.connection(cache=ResponseCache(ttl=60)) as connection:
+                manager = Manager(connection)
+                before = list(await manager.async_all())
+                results = await manager.async_stop_many(
+                    before[:20] + ["missing"], rate=500, concurrency=8
+                )
+                again = await manager.async_set_modes(["m00000"], MODE_STOP)
+                after = list(await manager.async_all())
+
+        return before, results, again, after, server.requests
+
+    before, results, again, after, requests = asyncio.run(run())
+    assert all(r.ok and r.value["cmd_at"] == MODE_STOP for r in results[:20])
+    assert isinstance(results[-1].error, errors.NotOk)
+    assert again[0].ok and again[0].elapsed > 0
+    # two listings plus 22 mode changes, none served from the cache
+    assert requests == 24
+    assert [m.mode for m in after[:20]] == [MODE_STOP] * 20
+
+
+def test_hls_follower_yields_every_segment_in_order():
+    async def run():
+        async with FakeShinobi(monitors=1, hls_segments=10) as server:
+            async with server.connection() as connection:
+                monitor = next(iter(await Manager(connection).async_all()))
+                async with monitor.hls(interval=0.005, buffer_size=2) as follower:
+                    segments = [segment async for segment in follower]
+        return segments, follower.skipped, server.hls_polls
+
+    segments, skipped, polls = asyncio.run(run())
+    # starts three segments from the live edge of the first playlist
+    assert [s.sequence for s in segments] == list(range(10))
+    assert segments[4].data == b"segment 4" and segments[4].duration == 2.0
+    assert skipped == 0 and polls >= 14
+
+
+def test_hls_follower_handles_restarts_and_missing_segments():
+    def playlist(first: int, count: int, ended: bool = False) -> str:
+        lines = ["#EXTM3U", "#EXT-X-TARGETDURATION:2"]
+        lines.append("#EXT-X-MEDIA-SEQUENCE:%d" % first)
+        for sequence in range(first, first + count):
+            lines += ["#EXTINF:2.000,", "%d.ts" % sequence]
+        return "\n".join(lines + (["#EXT-X-ENDLIST"] if ended else [])) + "\n"
+
+    # starts at the live edge, then the stream restarts from sequence 0
+    playlists = [
+        playlist(5, 2),
+        playlist(5, 3),
+        playlist(0, 2),
+        playlist(0, 3, ended=True),
+    ]
+    fetched = []
+
+    async def run():
+        polls = 0
+
+        async def m3u8(request):
+            nonlocal polls
+            polls += 1
+            return web.Response(text=playlists[min(polls, len(playlists)) - 1])
+
+        async def segment(request):
+            sequence = request.match_info["sequence"]
+            fetched.append(sequence)
+            if sequence == "1":
+                return web.Response(status=404)
+            return web.Response(body=sequence.encode())
+
+        app = web.Application()
+        app.router.add_get("/t/hls/g/m/s.m3u8", m3u8)
+        app.router.add_get("/t/hls/g/m/{sequence}.ts", segment)
+        async with serve(app) as port:
+            async with Connection("127.0.0.1", port, "t", "g") as connection:
+                follower = HlsFollower(
+                    connection, "/t/hls/g/m/s.m3u8", live_edge=0, interval=0.005
+                )
+                async with follower:
+                    segments = [segment.data async for segment in follower]
+        return segments, follower.skipped
+
+    segments, skipped = asyncio.run(run())
+    assert segments == [b"7", b"0", b"2"] and skipped == 1
+    # a missing segment is not retried
+    assert fetched.count("1") == 1
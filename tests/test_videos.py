@@ -0,0 +1,308 @@
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from aiohttp import ClientResponseError, web
+
+from pyshinobicctvapi.connection import Connection
+from pyshinobicctvapi.download import async_download
+from pyshinobicctvapi.index import RecordingIndex
+from pyshinobicctvapi.videos import Manager, Video, windows
+from pyshinobicctvapi.videotable import VideoTable
+
+from .server import serve
+
+
+def test_windows_cover_range():
+    start = datetime(2021, 1, 1)
+    end = start + timedelta(hours=2, minutes=30)
+
+    by_length = windows(start, end, timedelta(hours=1))
+    assert [w[1] - w[0] for w in by_length] == [
+        timedelta(hours=1),
+        timedelta(hours=1),
+        timedelta(minutes=30),
+    ]
+    assert windows(start, end, chunks=5)[-1][1] == end
+    assert len(windows(start, end, expected=4500, per_window=1000)) == 5
+
+    for bad in ({"window": timedelta(0)}, {"window": timedelta(-1)}, {"chunks": 0}):
+        with pytest.raises(ValueError):
+            windows(start, end, **bad)
+    with pytest.raises(ValueError):
+        windows(start, start + timedelta(microseconds=3), chunks=10)
+
+
+def test_video_times_are_parsed():
+    video = Video({"mid": "a", "time": "2021-01-01T10:00:00.000Z"})
+    assert video.start == datetime.fromisoformat("2021-01-01T10:00:00+00:00")
+    assert video.end is None
+
+
+def test_chunked_listing_sorts_mixed_time_formats():
+    local = datetime(2021, 1, 1, 10, 30, tzinfo=timezone.utc)
+    local = local.astimezone().replace(tzinfo=None)
+    listed = [
+        {"mid": "a", "filename": "3", "time": "2021-01-01T12:00:00+01:00"},
+        {"mid": "a", "filename": "1", "time": "2021-01-01T10:00:00Z"},
+        {"mid": "a", "filename": "4", "time": "2021-01-01T11:30:00Z"},
+        {"mid": "a", "filename": "2", "time": local.isoformat()},
+    ]
+
+    async def run():
+        async def videos(request):
+            return web.json_response({"videos": listed})
+
+        app = web.Application()
+        app.router.add_get("/t/videos/g", videos)
+        async with serve(app) as port:
+            async with Connection("127.0.0.1", port, "t", "g") as connection:
+                start = datetime(2021, 1, 1, 10)
+                return await Manager(connection).all_chunked(
+                    start, start + timedelta(hours=2)
+                )
+
+    merged = asyncio.run(run())
+    assert [video.filename for video in merged] == ["1", "2", "3", "4"]
+
+
+def test_video_table_filters_and_aggregates():
+    table = VideoTable.from_videos(
+        [
+            {
+                "mid": "a",
+                "time": "2021-01-01T10:00:00Z",
+                "end": "2021-01-01T10:15:00Z",
+                "size": 10,
+            },
+            {
+                "mid": "b",
+                "time": "2021-01-01T10:10:00Z",
+                "end": "2021-01-01T10:20:00Z",
+                "size": 20,
+            },
+            Video(
+                {
+                    "mid": "a",
+                    "time": "2021-01-01T11:00:00Z",
+                    "end": "2021-01-01T11:15:00Z",
+                    "size": 30,
+                }
+            ),
+        ]
+    )
+
+    assert len(table) == 3
+    assert table.count_by_monitor() == {"a": 2, "b": 1}
+    assert table.size_by_monitor() == {"a": 40, "b": 20}
+    assert table.total_duration() == 40 * 60
+
+    morning = table.filter(
+        monitors=["a"], end=datetime.fromisoformat("2021-01-01T10:30:00+00:00")
+    )
+    assert [row.filename for row in morning] == [""]
+    assert morning[0].size == 10
+    assert morning[0].start == datetime.fromisoformat("2021-01-01T10:00:00+00:00")
+
+    # appending to a derived table leaves its parent alone
+    morning.append({"mid": "c", "time": "2021-01-01T10:40:00Z"})
+    assert table.monitor_ids == ["a", "b"] and morning.monitor_ids[-1] == "c"
+    assert len(table.filter(monitors=["c"])) == 0
+
+
+def test_recording_index_point_range_and_gaps():
+    def rec(mid: str, start: str, end: str) -> dict:
+        return {"mid": mid, "time": f"2021-01-01T{start}Z", "end": f"2021-01-01T{end}Z"}
+
+    def at(time: str) -> datetime:
+        return datetime.fromisoformat(f"2021-01-01T{time}+00:00")
+
+    index = RecordingIndex(
+        [
+            rec("a", "10:00:00", "10:15:00"),
+            rec("a", "10:15:02", "10:30:00"),
+            # long recording overlapping the short ones after it
+            rec("b", "10:00:00", "11:00:00"),
+            rec("b", "10:05:00", "10:06:00"),
+        ]
+    )
+    # inserted out of order
+    index.add(Video(rec("a", "09:00:00", "09:30:00")))
+    table = VideoTable.from_videos([rec("c", "10:20:00", "10:40:00")])
+    from_table = RecordingIndex.from_table(table)
+
+    assert len(index) == 5 and len(from_table) == 1
+    found = index.at(at("10:14:00"), ["a", "b", "c"])
+    assert sorted(found) == ["a", "b"] and len(found["b"]) == 1
+    assert len(index.at(at("10:05:30"))["b"]) == 2
+    assert index.between(at("09:10:00"), at("10:00:00"))["a"][0].start == at("09:00:00")
+    assert index.covers(at("10:15:01"), ["a", "b"]) == {"a": False, "b": True}
+    assert from_table.at(at("10:30:00"))["c"][0].monitor_id == "c"
+
+    gaps = index.gaps(at("09:00:00"), at("11:00:00"), ["a", "b", "c"], min_gap=5)
+    assert gaps["a"] == [
+        (at("09:30:00").timestamp(), at("10:00:00").timestamp()),
+        (at("10:30:00").timestamp(), at("11:00:00").timestamp()),
+    ]
+    assert gaps["b"] == [(at("09:00:00").timestamp(), at("10:00:00").timestamp())]
+    assert gaps["c"] == [(at("09:00:00").timestamp(), at("11:00:00").timestamp())]
+
+
+def test_recording_index_matches_scan_with_overlaps():
+    rng = random.Random(7)
+    recordings = [{"mid": "a", "time": 0.0, "end": 10000.0}]
+    for _ in range(500):
+        start = rng.uniform(0, 10000)
+        recordings.append(
+            {"mid": "a", "time": start, "end": start + rng.expovariate(0.01)}
+        )
+    rng.shuffle(recordings)
+    index = RecordingIndex()
+    for recording in recordings:
+        index._add("a", recording["time"], recording["end"], recording)
+
+    for _ in range(200):
+        start = rng.uniform(-100, 10100)
+        end = start + rng.choice([0, rng.uniform(0, 300)])
+        expected = [r for r in recordings if r["time"] <= end and r["end"] >= start]
+        expected.sort(key=lambda r: r["time"])
+        assert index.between(start, end).get("a", []) == expected
+
+
+def test_download_resumes_and_segments(tmp_path):
+    payload = bytes(range(256)) * 40
+    source = tmp_path / "source.mp4"
+    source.write_bytes(payload)
+
+    async def run():
+        async def video(request):
+            return web.FileResponse(source)
+
+        app = web.Application()
+        app.router.add_get("/t/videos/g/m/{name}", video)
+        async with serve(app) as port:
+            async with Connection("127.0.0.1", port, "t", "g") as connection:
+                manager = Manager(connection)
+                videos = [
+                    Video(
+                        {"mid": "m", "filename": name, "href": f"/t/videos/g/m/{name}"}
+                    )
+                    for name in ("a.mp4", "b.mp4")
+                ]
+
+                resumed = tmp_path / "m_a.mp4"
+                (tmp_path / "m_a.mp4.part").write_bytes(payload[:1000])
+                seen = []
+                await manager.download(
+                    videos[0],
+                    directory=str(tmp_path),
+                    progress=lambda done, total: seen.append((done, total)),
+                )
+                assert resumed.read_bytes() == payload
+                assert seen[0][0] > 1000 and seen[-1] == (len(payload), len(payload))
+
+                results = await manager.download_many(
+                    videos, str(tmp_path), segments=4, min_segment_size=100
+                )
+                assert results == [str(resumed), str(tmp_path / "m_b.mp4")]
+                assert (tmp_path / "m_b.mp4").read_bytes() == payload
+
+                # interrupted segmented download, resumed by a plain one
+                target = tmp_path / "c.mp4"
+                part = tmp_path / "c.mp4.part"
+                part.write_bytes(payload[:2000] + bytes(len(payload) - 2000))
+                (tmp_path / "c.mp4.part.json").write_text(
+                    json.dumps(
+                        {
+                            "size": len(payload),
+                            "segments": [[0, 5000, 2000], [5000, len(payload), 0]],
+                        }
+                    )
+                )
+                url = "/t/videos/g/m/c.mp4"
+                await async_download(connection, url, str(target))
+                assert target.read_bytes() == payload
+                assert not (tmp_path / "c.mp4.part.json").exists()
+
+                # a partial file longer than the remote one is not taken as complete
+                part.write_bytes(payload + b"extra")
+                await async_download(connection, url, str(target))
+                assert target.read_bytes() == payload
+
+    asyncio.run(run())
+
+
+def test_download_restarts_changed_files_and_stops_failed_segments(tmp_path):
+    payload = bytes(range(256)) * 40
+    drops = 1
+    fail_from = None
+
+    async def video(request):
+        nonlocal drops
+        if drops:
+            # connection lost before the headers
+            drops -= 1
+            request.transport.close()
+            return web.Response()
+        ranged = request.http_range
+        if request.headers.get("If-Range", '"v2"') != '"v2"':
+            ranged = slice(None, None)
+        if ranged.start is None:
+            return web.Response(body=payload, headers={"ETag": '"v2"'})
+        start = ranged.start
+        stop = len(payload) if ranged.stop is None else ranged.stop
+        if fail_from is not None and start >= fail_from:
+            return web.Response(status=404)
+        resp = web.StreamResponse(
+            status=206,
+            headers={
+                "ETag": '"v2"',
+                "Content-Range": f"bytes {start}-{stop - 1}/{len(payload)}",
+            },
+        )
+        await resp.prepare(request)
+        for pos in range(start, stop, 100):
+            await resp.write(payload[pos : min(pos + 100, stop)])
+            await asyncio.sleep(0.001)
+        return resp
+
+    async def run():
+        nonlocal fail_from
+        app = web.Application()
+        app.router.add_get("/t/videos/g/m/a.mp4", video)
+        url = "/t/videos/g/m/a.mp4"
+        target = tmp_path / "a.mp4"
+        part = tmp_path / "a.mp4.part"
+        state = tmp_path / "a.mp4.part.json"
+        async with serve(app) as port:
+            async with Connection("127.0.0.1", port, "t", "g") as connection:
+                # partial of an older version of the file
+                part.write_bytes(b"old" * 100)
+                state.write_text(json.dumps({"validator": '"v1"'}))
+                await async_download(connection, url, str(target))
+                assert target.read_bytes() == payload and not state.exists()
+
+                fail_from = 5000
+                with pytest.raises(ClientResponseError):
+                    await async_download(
+                        connection, url, str(target), segments=2, min_segment_size=1
+                    )
+                saved = json.loads(state.read_text())
+                data = part.read_bytes()
+                await asyncio.sleep(0.05)
+                # no segment kept writing after the state was saved
+                assert part.read_bytes() == data
+                assert saved["validator"] == '"v2"'
+                [first, second] = saved["segments"]
+                assert first[2] < first[1]
+                assert data[: first[2]] == payload[: first[2]]
+                assert not any(data[first[2] : first[1]])
+                assert second[2] == 0
+
+                fail_from = None
+                await async_download(connection, url, str(target))
+                assert target.read_bytes() == payload and not state.exists()
+
+    asyncio.run(run())